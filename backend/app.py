@@ -1,97 +1,95 @@
 import json
+import queue
 import base64
 import zipfile
 import io
 import difflib
-import pdfkit
+import functools
+import hashlib
 import logging
-import tempfile
-import requests 
 import os
 import threading
 import subprocess 
 import shutil
+import time
 import uuid
-import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from email.utils import formatdate
 from typing import List
-import subprocess
-import tempfile
-from docx2pdf import convert
-import pypandoc
-import PyPDF2
-import fitz  # PyMuPDF
-import pandas as pd
-import pytesseract
-from PIL import Image
-from PyPDF2 import PdfMerger
-from docx import Document as DocxDocument
-from docx2pdf import convert as docx2pdf
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-from pdf2docx import Converter
-from pdf2image import convert_from_path
-from pptx import Presentation
+from werkzeug.datastructures import ImmutableMultiDict, MultiDict
+from werkzeug.exceptions import ClientDisconnected
 from werkzeug.utils import secure_filename
-from fpdf import FPDF
-from openai import OpenAI
-import tiktoken
-from docx import Document
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from docx import Document
-from reportlab.lib.pagesizes import LETTER
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import LETTER
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
+from dotenv import load_dotenv
+
+from utils.lazy_imports import lazy_import, lazy_module, lazy_object, loaded_modules
+from utils.workspaces import WORKSPACE_ROOT, QuotaExceeded, WorkspaceManager
+from utils.zip_stream import ZipStream
+
+# Heavy libraries are imported on first use by the routes that need them, so
+# cheap routes (/health, /merge, ...) don't pay the ML/office cold start.
+pdfkit = lazy_module("pdfkit")
+PyPDF2 = lazy_module("PyPDF2")
+fitz = lazy_module("fitz")  # PyMuPDF
+pd = lazy_module("pandas")
+pytesseract = lazy_module("pytesseract")
+Image = lazy_module("PIL.Image")
+canvas = lazy_module("reportlab.pdfgen.canvas")
+PdfMerger = lazy_import("PyPDF2", "PdfMerger")
+PdfReader = lazy_import("PyPDF2", "PdfReader")
+PdfWriter = lazy_import("PyPDF2", "PdfWriter")
+DocxDocument = lazy_import("docx", "Document")
+docx2pdf = lazy_import("docx2pdf", "convert")
+Converter = lazy_import("pdf2docx", "Converter")
+convert_from_path = lazy_import("pdf2image", "convert_from_path")
+convert_from_bytes = lazy_import("pdf2image", "convert_from_bytes")
+Presentation = lazy_import("pptx", "Presentation")
+FPDF = lazy_import("fpdf", "FPDF")
+
 # Import all PDF processing functions
-from pdf_tools.compare_pdf import compare_pdfs
-from pdf_tools.compress import compress_pdf
-from pdf_tools.crop_image import crop_image
-from pdf_tools.crop_pdf import crop_pdf
-from pdf_tools.edit_pdf import edit_pdf
-from pdf_tools.excel_to_pdf import excel_to_pdf
-from pdf_tools.extract_pages import extract_pages_from_pdf, parse_page_range
+compare_pdfs = lazy_import("pdf_tools.compare_pdf", "compare_pdfs")
+compress_pdf = lazy_import("pdf_tools.compress", "compress_pdf")
+crop_image = lazy_import("pdf_tools.crop_image", "crop_image")
+edit_pdf = lazy_import("pdf_tools.edit_pdf", "edit_pdf")
+excel_to_pdf = lazy_import("pdf_tools.excel_to_pdf", "excel_to_pdf")
+parse_page_range = lazy_import("pdf_tools.extract_pages", "parse_page_range")
 # from pdf_tools.extract_text import extract_text_from_pdf
+extract_document_text = lazy_import("chat_ai.extractors", "extract_text")
 
-from pdf_tools.html_to_pdf import html_to_pdf
-from pdf_tools.jpg_to_pdf import jpg_to_pdf
-from pdf_tools.ocr_pdf import ocr_pdf
-from pdf_tools.optimize import optimize_pdf
+html_to_pdf = lazy_import("pdf_tools.html_to_pdf", "html_to_pdf")
+jpg_to_pdf = lazy_import("pdf_tools.jpg_to_pdf", "jpg_to_pdf")
+ocr_pdf = lazy_import("pdf_tools.ocr_pdf", "ocr_pdf")
 # from pdf_tools.organize_pdf import organize_pdf
-from pdf_tools.page_numbers import add_page_numbers
-from pdf_tools.pdf_security import encrypt_pdf, decrypt_pdf
-from pdf_tools.pdf_to_jpg import pdf_to_images
-from pdf_tools.pdf_to_pptx import convert_pdf_to_pptx
-from pdf_tools.pdf_to_word_excel import pdf_to_word, pdf_to_excel
-from pdf_tools.pptx_to_pdf import convert_pptx_to_pdf
-from pdf_tools.redact_pdf import redact_pdf
-from pdf_tools.remove_pages import remove_pages_from_pdf
-from pdf_tools.repair_pdf import repair_pdf
-from pdf_tools.rotate import rotate_pdf
-from pdf_tools.scan_pdf import scan_pdf
-from pdf_tools.sign_pdf import sign_pdf_basic
-from pdf_tools.sign_pdf_cert import sign_pdf_with_cert
-from pdf_tools.split import split_pdf_pages
-from pdf_tools.unlock_pdf import unlock_pdf
-from pdf_tools.watermark import add_watermark
-# from pdf_tools.word_to_pdf import word_to_pdf
-from flask import Flask, request, jsonify, send_file
-from pdf2image import convert_from_bytes
-from dotenv import load_dotenv
-import time
+encrypt_pdf = lazy_import("pdf_tools.pdf_security", "encrypt_pdf")
+pdf_to_images = lazy_import("pdf_tools.pdf_to_jpg", "pdf_to_images")
+convert_pdf_to_pptx = lazy_import("pdf_tools.pdf_to_pptx", "convert_pdf_to_pptx")
+pdf_to_word = lazy_import("pdf_tools.pdf_to_word_excel", "pdf_to_word")
+pdf_to_excel = lazy_import("pdf_tools.pdf_to_word_excel", "pdf_to_excel")
+convert_pptx_to_pdf = lazy_import("pdf_tools.pptx_to_pdf", "convert_pptx_to_pdf")
+redact_pdf = lazy_import("pdf_tools.redact_pdf", "redact_pdf")
+remove_pages_from_pdf = lazy_import("pdf_tools.remove_pages", "remove_pages_from_pdf")
+scan_pdf = lazy_import("pdf_tools.scan_pdf", "scan_pdf")
+sign_pdf_basic = lazy_import("pdf_tools.sign_pdf", "sign_pdf_basic")
+sign_pdf_with_cert = lazy_import("pdf_tools.sign_pdf_cert", "sign_pdf_with_cert")
+add_watermark = lazy_import("pdf_tools.watermark", "add_watermark")
+word_to_pdf = lazy_import("pdf_tools.word_to_pdf", "word_to_pdf")
+# Every CPU-heavy tool behind one signature, for the job queue's process pool
+tool_operations = lazy_module("pdf_tools.operations")
+tool_pipeline = lazy_module("pdf_tools.pipeline")
 
 
 
 # Configure Flask app
 # load_dotenv()
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": ["http://localhost:5173", "http://127.0.0.1:5173"]}})
-app.config['UPLOAD_FOLDER'] = "Uploads"
-app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB limit
+CORS(app, resources={r"/*": {"origins": ["http://localhost:5173", "http://127.0.0.1:5173"]}},
+     expose_headers=["Location", "Upload-Offset", "Upload-Length", "Upload-Expires", "Tus-Resumable",
+                     "X-File-Id", "X-Cache", "Server-Timing"])
+# Every request and job works in its own directory under WORKSPACE_ROOT (utils.workspaces)
+app.config['UPLOAD_FOLDER'] = WORKSPACE_ROOT
+app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB limit; bigger files go through /uploads
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(levelname)s: %(message)s')
 logger = app.logger
 
@@ -101,8 +99,6 @@ POPPLER_PATH = r"C:\Users\takd2\Release-25.07.0-0 (1)\poppler-25.07.0\Library\bi
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png', 'docx', 'xlsx', 'xls', 'pptx', 'html', 'txt', 'csv'}
-UPLOAD_FOLDER = os.path.join(os.getcwd(), "Uploads")
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)  
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 if not os.access(app.config['UPLOAD_FOLDER'], os.W_OK):
@@ -114,6 +110,52 @@ def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# 🔹 One isolated scratch directory per request / job, under a global disk quota
+workspace_manager = lazy_object(lambda: WorkspaceManager())
+TOOL_JOB_WORKSPACE_TTL = 6 * 3600  # background jobs may queue and run for a long time
+
+
+def request_workspace() -> str:
+    """This request's private scratch directory, removed when the request ends."""
+    if "workspace" not in g:
+        # Counts the whole request body: what its uploads may write here
+        g.workspace = workspace_manager.create("req", size_hint=request.content_length or 0)
+    return g.workspace.path
+
+
+@app.teardown_request
+def release_request_workspace(exc=None):
+    workspace = g.pop("workspace", None)
+    if workspace is not None:
+        workspace_manager.release(workspace)
+
+
+@app.errorhandler(QuotaExceeded)
+def workspace_quota_exceeded(e):
+    return jsonify({"success": False, "error": "Server is out of scratch space, try again later"}), 507
+
+
+@app.before_request
+def check_workspace_quota():
+    # Refuse file uploads up front: most routes turn a failure inside them into a 500
+    if request.method == "POST" and request.mimetype == "multipart/form-data":
+        workspace_manager.check_quota()
+
+
+def upload_size(file) -> int:
+    """Size in bytes of an uploaded file, without reading it (0 if unknown)."""
+    stored = getattr(file, "stored", None)  # a file_id reference to the file store
+    if stored is not None:
+        return stored.size
+    try:
+        position = file.stream.tell()
+        size = file.stream.seek(0, os.SEEK_END)
+        file.stream.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
 def save_file(file, temp_dir: str, prefix: str = "") -> str:
     """Save uploaded file with a unique filename in a temporary directory."""
     filename = secure_filename(file.filename)
@@ -124,69 +166,10 @@ def save_file(file, temp_dir: str, prefix: str = "") -> str:
     logger.debug(f"Saved file: {file_path}")
     return file_path
 
-def extract_text_from_pdf(pdf_file_path: str) -> str:
-    """Extract text from a PDF file using PyMuPDF."""
-    try:
-        text = ""
-        with fitz.open(pdf_file_path) as doc:
-            for page in doc:
-                text += page.get_text()
-        return text
-    except Exception as e:
-        logger.error(f"Error extracting text from {pdf_file_path}: {str(e)}")
-        raise
-
-def text_from_excel(file_path):
-    try:
-        df = pd.read_excel(file_path)
-        text = "\n".join(df.astype(str).agg(" ".join, axis=1))
-        return text
-    except Exception as e:
-        logger.error(f"Error extracting text from Excel {file_path}: {str(e)}")
-        raise
-
-def extract_text_from_word(file_path):
-    try:
-        doc = DocxDocument(file_path)
-        text = "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
-        return text
-    except Exception as e:
-        logger.error(f"Error extracting text from Word {file_path}: {str(e)}")
-        raise
-
-def extract_text_from_pptx(file_path):
+def extract_file_text(file_path, file_type):
+    """All text of an uploaded file, through the same streaming extractors as chat ingestion."""
     try:
-        prs = Presentation(file_path)
-        text = []
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text.strip():
-                    text.append(shape.text)
-        return "\n".join(text)
-    except Exception as e:
-        logger.error(f"Error extracting text from PPTX {file_path}: {str(e)}")
-        raise
-
-def extract_text(file_path, file_type):
-    try:
-        if file_type == "pdf":
-            return extract_text_from_pdf(file_path)
-        elif file_type in ["xlsx", "xls"]:
-            return extract_text_from_excel(file_path)
-        elif file_type == "docx":
-            return extract_text_from_word(file_path)
-        elif file_type == "pptx":
-            return extract_text_from_pptx(file_path)
-        elif file_type in ["jpg", "png", "jpeg"]:
-            return pytesseract.image_to_string(Image.open(file_path))
-        elif file_type in ["txt", "html"]:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        elif file_type == "csv":
-            df = pd.read_csv(file_path)
-            return df.to_string()
-        else:
-            raise ValueError(f"Unsupported file type: {file_type}")
+        return extract_document_text(file_path, file_type)
     except Exception as e:
         logger.error(f"Text extraction failed for {file_path}: {str(e)}")
         raise
@@ -265,40 +248,76 @@ def perform_ocr(file_path, file_type):
         raise
 
 
-# Core LangChain utilities
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.documents import Document
-
-# Community integrations (external tools, databases, vectorstores, etc.)
-import os
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-import google.generativeai as genai
-# If you are using Google Gemini
-import google.generativeai as genai
+# Chat stack (LangChain, FAISS, Gemini) — all loaded on the first chat request
+ingest_document = lazy_import("chat_ai.ingest", "ingest_document")
+chat_extractors = lazy_module("chat_ai.extractors")
+JobRegistry = lazy_import("utils.jobs", "JobRegistry")
+genai = lazy_module("google.generativeai")
+get_embedding_service = lazy_import("chat_ai.embeddings", "get_embedding_service")
+IndexRegistry = lazy_import("chat_ai.index_registry", "IndexRegistry")
+hash_file = lazy_import("chat_ai.index_registry", "hash_file")
+is_valid_collection_name = lazy_import("chat_ai.index_registry", "is_valid_collection_name")
+is_valid_doc_id = lazy_import("chat_ai.index_registry", "is_valid_doc_id")
+get_llm_provider = lazy_import("chat_ai.llm", "get_llm_provider")
+llm_gateways = lazy_module("chat_ai.llm_gateway")
+AnswerCache = lazy_import("chat_ai.answer_cache", "AnswerCache")
+build_context = lazy_import("chat_ai.context_builder", "build_context")
+search_stores = lazy_import("chat_ai.multi_search", "search_stores")
+count_tokens = lazy_import("chat_ai.context_builder", "count_tokens")
 
 
 # 🔑 Load Gemini API Key from .env
-from dotenv import load_dotenv
 load_dotenv()
-genai.configure(api_key=os.getenv("NEW_KEY_FROM_STUDENT_PLAN"))
 
-#  Load embeddings (must match what you used when saving FAISS)
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
 
-# 🔹 Load FAISS vectorstore from disk
+def create_chat_model():
+    genai.configure(api_key=os.getenv("NEW_KEY_FROM_STUDENT_PLAN"))
+    return genai.GenerativeModel("gemini-2.5-pro")
+
+
+#  Shared embedding service (same all-MiniLM-L6-v2 model the FAISS indexes were built with)
+embeddings = lazy_object(lambda: get_embedding_service())
+
+# 🔹 Per-document FAISS indexes, keyed by the SHA-256 of the uploaded PDF
 VECTORSTORE_PATH = "faiss_index"
-if os.path.exists(VECTORSTORE_PATH):
-    vectorstore = FAISS.load_local(VECTORSTORE_PATH, embeddings, allow_dangerous_deserialization=True)
-else:
-    vectorstore = None   # Will remain None until a PDF is uploaded and processed
+INDEX_MEMORY_BUDGET = int(os.getenv("INDEX_MEMORY_BUDGET_MB", "512")) * 1024 * 1024
+index_registry = lazy_object(
+    lambda: IndexRegistry(embeddings, root=VECTORSTORE_PATH, memory_budget=INDEX_MEMORY_BUDGET)
+)
+
+# 🔹 Background jobs (chat ingestion, heavy pdf_tools operations) polled through /jobs/<job_id>
+job_registry = lazy_object(lambda: JobRegistry(release_workdir=workspace_manager.release))
+jobs = lazy_module("utils.jobs")
+
+# 🔹 Tool inputs up to this size run inline; bigger ones go to the process pool
+TOOL_SYNC_MAX_BYTES = int(os.getenv("TOOL_SYNC_MAX_KB", "1024")) * 1024
+
+# 🔹 Uploads and tool outputs by SHA-256: upload once, chain operations by file_id
+file_stores = lazy_module("utils.file_store")
+file_store = lazy_object(lambda: file_stores.FileStore())
 
-chat_model = genai.GenerativeModel("gemini-2.5-pro")
+# 🔹 Deterministic tool outputs by (input hash, operation, version, params), LRU-bounded on disk
+result_caches = lazy_module("utils.result_cache")
+result_cache = lazy_object(lambda: result_caches.ResultCache())
+
+# 🔹 Resumable (tus-style) uploads of up to MAX_UPLOAD_MB, spooled to disk and finished into the file store
+resumable_uploads = lazy_module("utils.resumable_uploads")
+upload_manager = lazy_object(
+    lambda: resumable_uploads.UploadManager(os.path.join(file_store.root, "uploads"))
+)
+TUS_VERSION = "1.0.0"
+
+chat_model = lazy_object(create_chat_model)
+# 🔹 Every upstream LLM call goes through the gateway: coalescing, fair queueing, retries
+llm_gateway = lazy_object(lambda: llm_gateways.LLMGateway(get_llm_provider(chat_model)))
+
+# 🔹 Exact + semantic answer cache per document / collection index
+answer_cache = lazy_object(lambda: AnswerCache())
+
+# 🔹 Prompt context is capped by tokens, not by a fixed number of chunks
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+CHAT_CONTEXT_CANDIDATES = int(os.getenv("CHAT_CONTEXT_CANDIDATES", "8"))
+MAX_CHAT_DOCUMENTS = int(os.getenv("CHAT_MAX_DOCUMENTS", "500"))
 
 # Extract text from PDF
 def extract_pdf_text(pdf_file):
@@ -308,11 +327,10 @@ def extract_pdf_text(pdf_file):
         text += page.extract_text() + "\n"
     return text
 
-# Upload PDF & create embeddings
+# Upload a document (PDF, spreadsheet, CSV, Word, slides, text, HTML or image) & create embeddings
 @app.route("/upload-pdf", methods=["POST"])
+@app.route("/upload-document", methods=["POST"])
 def upload_pdf():
-    global vectorstore
-
     if "file" not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
 
@@ -320,76 +338,924 @@ def upload_pdf():
     if file.filename == "":
         return jsonify({"error": "Empty filename"}), 400
 
-    pdf_path = os.path.join("uploads", file.filename)
-    file.save(pdf_path)
+    kind = chat_extractors.file_type(file.filename)
+    if kind not in chat_extractors.CHAT_FILE_TYPES:
+        return jsonify({"error": f"Unsupported file type: {kind or 'unknown'}"}), 400
 
-    # Ensure file saved properly
-    if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) == 0:
-        return jsonify({"error": "File not saved correctly"}), 400
+    # Optionally append the document to a named multi-document collection
+    collection = request.form.get("collection")
+    if collection and not is_valid_collection_name(collection):
+        return jsonify({"error": "Invalid collection name"}), 400
+
+    workspace = workspace_manager.create("ingest", ttl=TOOL_JOB_WORKSPACE_TTL, size_hint=upload_size(file))
+    pdf_path = save_file(file, workspace.path, "chat_")
+    handed_off = False
 
-    # Validate PDF first
     try:
-        import fitz
-        with fitz.open(pdf_path) as doc:
-            if doc.page_count == 0:
-                return jsonify({"error": "PDF has no pages"}), 400
+        # Ensure file saved properly
+        if not os.path.exists(pdf_path) or os.path.getsize(pdf_path) == 0:
+            return jsonify({"error": "File not saved correctly"}), 400
+
+        # Same bytes → same document id → reuse the existing index
+        document_id = hash_file(pdf_path)
+        if index_registry.exists(document_id):
+            # Appending copies the document's vectors, no re-embedding
+            if collection:
+                index_registry.add_to_collection(collection, document_id)
+            return jsonify({
+                "message": "Document already processed",
+                "document_id": document_id,
+                "collection": collection,
+                "cached": True
+            })
+
+        # Validate PDF first; other formats are checked while they stream
+        if kind == "pdf":
+            try:
+                with fitz.open(pdf_path) as doc:
+                    if doc.page_count == 0:
+                        return jsonify({"error": "PDF has no pages"}), 400
+            except Exception:
+                return jsonify({"error": "Invalid or corrupted PDF"}), 400
+
+        # ✅ Parse → chunk → embed runs in the background; poll /jobs/<job_id>
+        job = job_registry.submit("ingest", run_ingestion, pdf_path, document_id, kind, collection)
+        handed_off = True
+        return jsonify({
+            "message": "Document accepted for processing",
+            "file_type": kind,
+            "document_id": document_id,
+            "collection": collection,
+            "cached": False,
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}"
+        }), 202
+    except Exception as e:
+        return jsonify({"error": f"Processing failed: {str(e)}"}), 500
+    finally:
+        if not handed_off:
+            workspace_manager.release(workspace)
+
+
+def run_ingestion(job, pdf_path, document_id, kind, collection):
+    """Background body of an /upload-pdf job; owns (and releases) the upload's workspace."""
+    try:
+        return ingest_document(job, pdf_path, document_id, index_registry, kind=kind, collection=collection)
+    finally:
+        workspace_manager.release(os.path.dirname(pdf_path))
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_registry.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job_id"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cancel a queued or running job; running tools stop after their current page."""
+    job = job_registry.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job_id"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def get_job_result(job_id):
+    job = job_registry.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job_id"}), 404
+    if job.status == jobs.FAILED and job.invalid_input:
+        return jsonify({"error": job.error, "status": job.status}), 400
+    if job.status != jobs.DONE:
+        return jsonify({"error": f"Job is {job.status}", "status": job.status}), 409
+    if job.output_path is None:
+        return jsonify(job.result)
+    stored = file_store.get(job.result["file_id"])
+    if stored is None:
+        return jsonify({"error": "Result is no longer available"}), 410
+    return send_stored_file(stored, download_name=job.result["filename"], as_attachment=True)
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    Run any pdf_tools operation in the background: ``operation`` (e.g.
+    ``ocr-pdf``), ``file`` and the operation's usual form fields.
+    """
+    operation = request.form.get("operation")
+    if operation not in tool_operations.OPERATIONS:
+        return jsonify({"error": "Unknown operation", "operations": sorted(tool_operations.OPERATIONS)}), 400
+    file = request.files.get("file")
+    if not file or file.filename == "":
+        return jsonify({"error": "No file uploaded"}), 400
+
+    workdir, input_path = save_tool_input(file)
+    params = {k: v for k, v in request.form.items() if k not in ("operation", "async")}
+    try:
+        cache_key, cache_status, cached = lookup_tool_result(operation, input_path, params)
     except Exception:
-        return jsonify({"error": "Invalid or corrupted PDF"}), 400
+        workspace_manager.release(workdir)
+        raise
+    if cached is not None:
+        workspace_manager.release(workdir)
+        result, stored = cached
+        return job_accepted(job_registry.add_finished(operation, result, output_path=stored.path))
+    return job_accepted(submit_tool_job(operation, workdir, input_path, params, cache_key))
+
+
+@app.route("/tools/cache-stats", methods=["GET"])
+def tool_cache_stats():
+    return jsonify(result_cache.stats())
+
 
-    # Process with LangChain
+# 🔹 One operation over many files, streamed back as a ZIP as each one finishes
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+
+@app.route("/batch", methods=["POST"])
+def batch_tool():
+    """
+    Run ``operation`` (any pdf_tools operation, as for ``POST /jobs``) on
+    every file in ``files`` (or ``file_ids``, for batches bigger than one
+    request body may be: upload them first), with the operation's usual
+    form fields applied to each. At most ``concurrency`` files of the batch
+    (default and cap ``BATCH_MAX_CONCURRENCY``) are in the process pool at
+    once, so one big batch can't take every worker.
+
+    The response is a ZIP streamed in completion order: each output is
+    added as soon as it is ready, and ``manifest.json`` at the end lists
+    every input with its output name, ``file_id`` and cache status, or the
+    error it failed with. A failed file doesn't stop the batch.
+    """
+    operation = request.form.get("operation")
+    if operation not in tool_operations.OPERATIONS:
+        return jsonify({"error": "Unknown operation", "operations": sorted(tool_operations.OPERATIONS)}), 400
+    files = [f for f in request.files.getlist("files") if f and f.filename]
+    if not files:
+        return jsonify({"error": "No files uploaded"}), 400
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({"error": f"At most {BATCH_MAX_FILES} files per batch"}), 400
+    try:
+        concurrency = int(request.form.get("concurrency", BATCH_MAX_CONCURRENCY))
+    except ValueError:
+        return jsonify({"error": "Invalid concurrency"}), 400
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    params = {k: v for k, v in request.form.items() if k not in ("operation", "concurrency", "file_ids")}
+
+    # Inputs are saved now, while the request body is readable; each gets its own job workspace
+    items = []
     try:
-        loader = PyPDFLoader(pdf_path)
-        documents = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        texts = text_splitter.split_documents(documents)
+        for file in files:
+            workdir, input_path = save_tool_input(file)
+            items.append({"input": file.filename, "workdir": workdir, "input_path": input_path})
+    except Exception:
+        for item in items:
+            workspace_manager.release(item["workdir"])
+        raise
 
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        vectorstore = FAISS.from_documents(texts, embeddings)
-        vectorstore.save_local("faiss_index")
+    bypass = cache_bypassed()
+    done = queue.Queue()
+    cancelled = threading.Event()
+    running = {}  # item index -> job
 
-        return jsonify({"message": "PDF uploaded and processed successfully"})
-    except Exception as e:
-        return jsonify({"error": f"Processing failed: {str(e)}"}), 500
+    def work(index):
+        item = items[index]
+        try:
+            if cancelled.is_set():
+                raise jobs.JobCancelled()
+            outcome = run_batch_item(operation, item, params, bypass, lambda job: running.__setitem__(index, job))
+        except Exception as e:
+            if not isinstance(e, (jobs.InvalidInput, jobs.JobCancelled)):
+                logger.error(f"Batch {operation} failed for {item['input']}: {e}")
+            outcome = e
+        finally:
+            running.pop(index, None)
+            workspace_manager.release(item["workdir"])
+        done.put((index, outcome))
+
+    def generate():
+        archive = ZipStream()
+        manifest = []
+        started = time.time()
+        pending = list(range(len(items)))
+        # Threads here only wait on pool jobs; the pool does the work
+        workers = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+        try:
+            for index in pending:
+                workers.submit(work, index)
+            for _ in pending:
+                index, outcome = done.get()
+                entry = {"input": items[index]["input"]}
+                if isinstance(outcome, Exception):
+                    entry.update(status="failed", error=batch_error(outcome))
+                else:
+                    result, stored, cache_status = outcome
+                    name = archive.unique_name(secure_filename(result["filename"]) or "output")
+                    try:
+                        yield from archive.add_file(stored.path, name)
+                    except OSError as e:  # the blob went away; the rest of the archive is still good
+                        logger.warning(f"Batch {operation}: could not add {name}: {e}")
+                        entry.update(status="failed", error="Output could not be read")
+                    else:
+                        entry.update(status="done", output=name, file_id=result["file_id"], cache=cache_status)
+                manifest.append((index, entry))
+        finally:
+            cancelled.set()  # a client that went away stops the rest of the batch
+            for job in list(running.values()):
+                job_registry.cancel(job.id)
+            workers.shutdown(wait=False, cancel_futures=True)
+            for item in items:
+                workspace_manager.release(item["workdir"])
+
+        manifest = [entry for _, entry in sorted(manifest, key=lambda m: m[0])]
+        failed = sum(1 for entry in manifest if entry["status"] == "failed")
+        yield from archive.add_bytes("manifest.json", json.dumps({
+            "operation": operation,
+            "params": {k: v for k, v in params.items() if k not in ("password",)},
+            "succeeded": len(manifest) - failed,
+            "failed": failed,
+            "elapsed_seconds": round(time.time() - started, 3),
+            "files": manifest,
+        }, indent=2))
+        yield archive.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="batch_{operation}.zip"', "X-Accel-Buffering": "no"},
+    )
+
+
+def batch_error(e):
+    """What a batch manifest says about a failed file: the reason if it's the client's, never server paths."""
+    if isinstance(e, jobs.InvalidInput):
+        return str(e)
+    if isinstance(e, jobs.JobCancelled):
+        return "Cancelled"
+    return "Processing failed"
+
+
+def run_batch_item(operation, item, params, bypass, on_submit):
+    """
+    One file of a batch, on a batch thread: answered from the result cache
+    or run in the process pool. Returns ``(result, stored_file, cache_status)``;
+    the caller releases the item's workspace.
+    """
+    cache_key, cache_status, cached = lookup_tool_result(operation, item["input_path"], params, bypass)
+    if cached is not None:
+        result, stored = cached
+        return result, stored, cache_status
+    job = submit_tool_job(operation, item["workdir"], item["input_path"], params, cache_key)
+    on_submit(job)
+    job.wait()
+    if job.invalid_input:
+        raise jobs.InvalidInput(job.error)
+    if job.status == jobs.CANCELLED:
+        raise jobs.JobCancelled()
+    if job.status != jobs.DONE:
+        raise RuntimeError(job.error or f"Job {job.status}")
+    stored = file_store.get(job.result["file_id"])
+    if stored is None:  # evicted from the file store before we got to it
+        raise RuntimeError("Output is no longer in the file store")
+    return job.result, stored, cache_status
+
+
+def wants_async():
+    """The client asked for a job instead of the file (``?async=1`` or ``Prefer: respond-async``)."""
+    return (request.args.get("async") == "1" or request.form.get("async") == "1"
+            or "respond-async" in request.headers.get("Prefer", ""))
+
+
+def save_tool_input(file):
+    """Save an upload into a fresh job workspace under its sanitized original name."""
+    workdir = workspace_manager.create("job", ttl=TOOL_JOB_WORKSPACE_TTL, size_hint=upload_size(file)).path
+    input_path = os.path.join(workdir, secure_filename(file.filename) or "input")
+    file.save(input_path)
+    return workdir, input_path
+
+
+def submit_tool_job(operation, workdir, input_path, params, cache_key=None):
+    return job_registry.submit_process(
+        operation, tool_operations.run, operation, input_path, os.path.join(workdir, "out"), params,
+        workdir=workdir, on_done=functools.partial(store_job_output, cache_key=cache_key),
+    )
+
+
+def store_job_output(job, result, cache_key=None):
+    """Move a finished tool job's output into the file store, before the registry releases its workdir."""
+    result, stored = store_tool_output(result, cache_key)
+    return dict(result, path=stored.path)
+
+
+def store_tool_output(result, cache_key=None):
+    """
+    Put an operation's output (``{"path", "filename", "mimetype"}``) into the
+    file store and, under ``cache_key``, the result cache. Returns the
+    result as the client sees it (``file_id`` instead of ``path``, plus the
+    operation's ``timings`` if it reports them) and the stored file.
+    """
+    stored, _ = file_store.put_path(result["path"], result["filename"], result["mimetype"])
+    if cache_key is not None:
+        result_cache.put(cache_key, stored.path, stored.file_id, result["filename"], result["mimetype"])
+    client_result = {"file_id": stored.file_id, "filename": result["filename"], "mimetype": result["mimetype"]}
+    if "timings" in result:
+        client_result["timings"] = result["timings"]
+    return client_result, stored
+
+
+def server_timing(timings):
+    """``Server-Timing`` header value for an operation's ``[{"name", "ms"}, ...]`` timings, in order."""
+    return ", ".join(f"{i}-{t['name']};dur={t['ms']}" for i, t in enumerate(timings))
+
+
+def cache_bypassed():
+    """``X-Cache-Bypass: 1`` or ``Cache-Control: no-cache`` recomputes (and re-caches) a tool result."""
+    return (request.headers.get("X-Cache-Bypass") == "1"
+            or "no-cache" in request.headers.get("Cache-Control", ""))
+
+
+def lookup_tool_result(operation, input_path, params, bypass=None):
+    """
+    Check the result cache for this run. Returns ``(cache_key, status,
+    cached)``: the key to cache a fresh result under (None for operations
+    that aren't cacheable), ``HIT``/``MISS``/``BYPASS`` (None if not
+    cacheable), and on a hit ``(result, stored_file)`` as from
+    ``store_tool_output``. ``bypass`` defaults to ``cache_bypassed()``;
+    pass it explicitly outside the request context.
+    """
+    spec = tool_operations.cache_spec(operation, params)
+    if spec is None:
+        return None, None, None
+    cache_key = result_caches.make_key(file_stores.hash_path(input_path), operation, *spec)
+    if bypass is None:
+        bypass = cache_bypassed()
+    if bypass:
+        result_cache.record_bypass()
+        return cache_key, "BYPASS", None
+    cached = result_cache.get(cache_key)
+    if cached is None:
+        return cache_key, "MISS", None
+    # The store may have expired its copy; the cache's own copy brings it back
+    stored = file_store.get(cached.file_id)
+    if stored is None:
+        try:
+            stored = file_store.put_path(cached.path, cached.filename, cached.mimetype)[0]
+        except OSError:  # the cache evicted it too since get(): just run the operation again
+            return cache_key, "MISS", None
+    result = {"file_id": stored.file_id, "filename": cached.filename, "mimetype": cached.mimetype}
+    return cache_key, "HIT", (result, stored)
+
+
+def job_accepted(job):
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result",
+    }), 202
+
+
+def run_tool(operation, workdir, input_path, params=None, download_name=None, as_attachment=True):
+    """
+    Run a pdf_tools operation for a route and send its output file.
+
+    - a repeat of an earlier run (same input bytes, operation and params):
+      answered from the result cache, unless bypassed (``cache_bypassed``)
+    - ``?async=1`` / ``Prefer: respond-async``: queue it, answer 202 with the job
+    - small inputs (``TOOL_SYNC_MAX_BYTES``): run inline, no process hop
+    - anything else: run in the process pool while this request waits, so
+      the CPU work never holds this process's GIL or starves cheap routes
+
+    The output is sent from the file store (``X-Cache`` tells whether it was
+    cached); ``workdir`` (from ``save_tool_input``) is removed before the
+    response goes out.
+    """
+    params = params or {}
+    try:
+        cache_key, cache_status, cached = lookup_tool_result(operation, input_path, params)
+        if cached is not None:
+            workspace_manager.release(workdir)
+            result, stored = cached
+            if wants_async():
+                return job_accepted(job_registry.add_finished(operation, result, output_path=stored.path))
+        elif wants_async():
+            return job_accepted(submit_tool_job(operation, workdir, input_path, params, cache_key))
+        elif os.path.getsize(input_path) <= TOOL_SYNC_MAX_BYTES:
+            output = tool_operations.run(operation, input_path, os.path.join(workdir, "out"), params)
+            result, stored = store_tool_output(output, cache_key)
+        else:
+            job = submit_tool_job(operation, workdir, input_path, params, cache_key)
+            job.wait()
+            if job.invalid_input:  # the same InvalidInput an inline run raises
+                raise jobs.InvalidInput(job.error)
+            if job.status != jobs.DONE:
+                raise RuntimeError(job.error or f"Job {job.status}")
+            result = job.result
+            stored = file_store.get(result["file_id"])
+    except Exception:
+        workspace_manager.release(workdir)
+        raise
+    workspace_manager.release(workdir)
+
+    response = send_stored_file(stored, download_name=download_name or result["filename"],
+                                mimetype=result["mimetype"], as_attachment=as_attachment)
+    if cache_status:
+        response.headers["X-Cache"] = cache_status
+    if result.get("timings"):
+        response.headers["Server-Timing"] = server_timing(result["timings"])
+    return response
+
+
+def send_stored(path_or_file, download_name=None, mimetype=None, as_attachment=False):
+    """
+    ``send_file`` for a tool's output: the file (a path or a file object)
+    goes into the file store first, and its ``file_id`` is returned in the
+    ``X-File-Id`` header so the next operation can take it without
+    another upload.
+    """
+    if download_name is None and isinstance(path_or_file, (str, os.PathLike)):
+        download_name = os.path.basename(path_or_file)
+    if isinstance(path_or_file, (str, os.PathLike)):
+        stored, _ = file_store.put_path(path_or_file, download_name, mimetype)
+    else:
+        stored, _ = file_store.put_stream(path_or_file, download_name, mimetype)
+    return send_stored_file(stored, download_name=download_name, mimetype=mimetype, as_attachment=as_attachment)
+
+
+def send_stored_file(stored, download_name=None, mimetype=None, as_attachment=False):
+    response = send_file(stored.path, as_attachment=as_attachment,
+                         download_name=download_name or stored.filename, mimetype=mimetype or stored.mimetype)
+    response.headers["X-File-Id"] = stored.file_id
+    return response
+
+
+# 🔹 Routes read their inputs from request.files; these form/query fields
+#    name stored files to use instead (file_ids: repeated or comma-separated)
+FILE_ID_FIELDS = {
+    "file_id": "file",
+    "file1_id": "file1",
+    "file2_id": "file2",
+    "watermark_id": "watermark",
+    "file_ids": "files",
+}
+
+
+@app.before_request
+def resolve_file_ids():
+    """Let every tool route take ``file_id=...`` (etc.) instead of a multipart upload."""
+    if request.method != "POST" or request.path.startswith("/files"):
+        return None
+    requested = {}
+    for key, field in FILE_ID_FIELDS.items():
+        values = request.args.getlist(key) + request.form.getlist(key)
+        file_ids = [v.strip() for value in values for v in value.split(",") if v.strip()]
+        if file_ids:
+            requested[field] = file_ids
+    if not requested:
+        return None
+
+    files = MultiDict(request.files)
+    for field, file_ids in requested.items():
+        if field in files:
+            continue  # an actual upload wins
+        for file_id in file_ids:
+            if not file_stores.is_valid_file_id(file_id):
+                return jsonify({"error": f"Invalid file_id: {file_id}"}), 400
+            stored = file_store.get(file_id)
+            if stored is None:
+                return jsonify({"error": f"Unknown file_id: {file_id}"}), 404
+            files.add(field, file_stores.StoredUpload(file_store, stored))
+    request.files = ImmutableMultiDict(files)
+    return None
+
+
+@app.route("/files", methods=["POST"])
+def upload_files():
+    """Store one (``file``) or more (``files``) uploads; identical content is stored once."""
+    uploads = request.files.getlist("file") + request.files.getlist("files")
+    uploads = [f for f in uploads if f and f.filename]
+    if not uploads:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    stored_files = []
+    created_any = False
+    for upload in uploads:
+        stored, created = file_store.put_stream(upload.stream, secure_filename(upload.filename) or None,
+                                                upload.mimetype or None)
+        created_any = created_any or created
+        stored_files.append(dict(stored.to_dict(), deduplicated=not created))
+
+    if request.files.getlist("files"):
+        return jsonify({"files": stored_files}), 201 if created_any else 200
+    return jsonify(stored_files[0]), 201 if created_any else 200
+
+
+@app.route("/files/<file_id>", methods=["GET"])
+def download_file(file_id):
+    stored = file_store.get(file_id)
+    if stored is None:
+        return jsonify({"error": "Unknown file_id"}), 404
+    return send_stored_file(stored, as_attachment=True)
+
+
+@app.route("/files/<file_id>/meta", methods=["GET"])
+def file_metadata(file_id):
+    stored = file_store.get(file_id)
+    if stored is None:
+        return jsonify({"error": "Unknown file_id"}), 404
+    return jsonify(stored.to_dict())
+
+
+@app.route("/files/<file_id>", methods=["DELETE"])
+def delete_stored_file(file_id):
+    if not file_store.delete(file_id):
+        return jsonify({"error": "Unknown file_id"}), 404
+    return jsonify({"deleted": file_id})
+
+
+def tus_response(status=204, body="", **headers):
+    response = Response(body, status=status)
+    response.headers["Tus-Resumable"] = TUS_VERSION
+    response.headers["Cache-Control"] = "no-store"
+    for name, value in headers.items():
+        response.headers[name.replace("_", "-")] = str(value)
+    return response
+
+
+def upload_headers(upload):
+    headers = {
+        "Upload_Offset": upload.offset,
+        "Upload_Length": upload.length,
+        "Upload_Expires": formatdate(upload.expires_at, usegmt=True),
+    }
+    if upload.file_id:
+        headers["X_File_Id"] = upload.file_id
+    return headers
+
+
+@app.route("/uploads", methods=["OPTIONS"])
+def uploads_options():
+    return tus_response(
+        Tus_Version=TUS_VERSION,
+        Tus_Extension="creation,checksum,termination,expiration",
+        Tus_Max_Size=upload_manager.max_bytes,
+        Tus_Checksum_Algorithm=",".join(resumable_uploads.CHECKSUM_ALGORITHMS),
+    )
+
+
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    """
+    Start a resumable upload (tus creation): ``Upload-Length`` and optional
+    ``Upload-Metadata`` (``filename``, ``filetype``, ``sha256`` of the whole
+    file). Send the bytes with ``PATCH`` to the returned ``Location``.
+    """
+    try:
+        length = int(request.headers.get("Upload-Length", ""))
+        metadata = resumable_uploads.parse_metadata(request.headers.get("Upload-Metadata"))
+        upload = upload_manager.create(length, metadata)
+    except ValueError:
+        return tus_response(400, "Upload-Length required")
+    except resumable_uploads.UploadError as e:
+        return tus_response(e.status, str(e))
+    return tus_response(201, Location=f"/uploads/{upload.id}", **upload_headers(upload))
+
+
+@app.route("/uploads/<upload_id>", methods=["HEAD"])
+def upload_offset(upload_id):
+    """How much of an upload arrived: resume with a ``PATCH`` at ``Upload-Offset``."""
+    upload = upload_manager.get(upload_id)
+    if upload is None:
+        return tus_response(404)
+    return tus_response(200, **upload_headers(upload))
+
+
+@app.route("/uploads/<upload_id>", methods=["PATCH"])
+def append_upload(upload_id):
+    """
+    Append ``application/offset+octet-stream`` bytes at ``Upload-Offset``,
+    optionally verified by ``Upload-Checksum: sha256 <base64>``. The chunk
+    may be anything up to the rest of the file. The last one moves the file
+    into the file store: its id comes back in ``X-File-Id``.
+    """
+    upload = upload_manager.get(upload_id)
+    if upload is None:
+        return tus_response(404)
+    if request.mimetype != "application/offset+octet-stream":
+        return tus_response(415, "Content-Type must be application/offset+octet-stream")
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+        checksum = request.headers.get("Upload-Checksum")
+        checksum = resumable_uploads.parse_checksum(checksum) if checksum else None
+    except ValueError:
+        return tus_response(400, "Upload-Offset required")
+    except resumable_uploads.UploadError as e:
+        return tus_response(e.status, str(e))
+
+    # The chunk is streamed to disk, so it may be far bigger than MAX_CONTENT_LENGTH
+    request.max_content_length = upload.length - offset if offset <= upload.length else 0
+    try:
+        upload_manager.append(upload, request.stream, offset, checksum)
+    except resumable_uploads.UploadError as e:
+        return tus_response(e.status, str(e), **upload_headers(upload))
+    except ClientDisconnected:
+        logger.info(f"Upload {upload_id} interrupted at offset {upload.offset}")
+        return tus_response(400, "Connection lost", **upload_headers(upload))
+
+    if upload.offset == upload.length:
+        file_id = upload_manager.digest(upload)
+        expected = upload.metadata.get("sha256")
+        if expected and expected.lower() != file_id:
+            upload_manager.delete(upload_id)
+            return tus_response(460, "Checksum of the complete file does not match")
+        stored, _ = file_store.adopt(upload.data_path, file_id, secure_filename(upload.metadata.get("filename", "")),
+                                     upload.metadata.get("filetype"))
+        upload_manager.complete(upload, stored.file_id)
+    return tus_response(204, **upload_headers(upload))
+
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+def delete_upload(upload_id):
+    if not upload_manager.delete(upload_id):
+        return tus_response(404)
+    return tus_response(204)
+
+
+@app.route("/collections/<name>/documents/<document_id>", methods=["DELETE"])
+def remove_collection_document(name, document_id):
+    if not is_valid_collection_name(name) or not is_valid_doc_id(document_id):
+        return jsonify({"error": "Invalid collection name or document_id"}), 400
+
+    removed = index_registry.remove_from_collection(name, document_id)
+    answer_cache.invalidate(f"collection:{name}")
+    if not removed:
+        return jsonify({"error": "Document not found in collection"}), 404
+    return jsonify({"success": True, "removed_chunks": removed})
+
+
+def parse_chat_targets(data):
+    """
+    Read the search targets of a /chat request body: ``document_ids`` (or a
+    single ``document_id``), ``collection`` and optional metadata
+    ``filters`` (``page_from`` / ``page_to``, 0-based and inclusive, and
+    ``doc_type``). Returns ``(document_ids, collection, filters, None)`` or
+    ``(None, None, None, (error_json, status))``.
+    """
+    document_ids = data.get("document_ids")
+    if document_ids is None:
+        document_ids = [data["document_id"]] if data.get("document_id") else []
+    if not isinstance(document_ids, list) or not all(is_valid_doc_id(d) for d in document_ids):
+        return None, None, None, ({"error": "Invalid document_id"}, 400)
+    if len(document_ids) > MAX_CHAT_DOCUMENTS:
+        return None, None, None, ({"error": f"At most {MAX_CHAT_DOCUMENTS} documents per question"}, 400)
+
+    collection = data.get("collection")
+    if collection and not is_valid_collection_name(collection):
+        return None, None, None, ({"error": "Invalid collection name"}, 400)
+
+    raw_filters = data.get("filters") or {}
+    if not isinstance(raw_filters, dict) or set(raw_filters) - {"page_from", "page_to", "doc_type"}:
+        return None, None, None, ({"error": "filters accepts page_from, page_to and doc_type"}, 400)
+    filters = {}
+    for key in ("page_from", "page_to"):
+        value = raw_filters.get(key)
+        if value is not None:
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                return None, None, None, ({"error": f"{key} must be a non-negative integer"}, 400)
+            filters[key] = value
+    if raw_filters.get("doc_type") is not None:
+        if not isinstance(raw_filters["doc_type"], str):
+            return None, None, None, ({"error": "doc_type must be a string"}, 400)
+        filters["doc_type"] = raw_filters["doc_type"].lower()
+
+    return list(dict.fromkeys(document_ids)), collection, filters, None
+
+
+def resolve_chat_indexes(document_ids=None, collection=None, filters=None):
+    """
+    Return ``(vectorstores, cache_scope, filters, None)`` for the indexes a
+    chat request targets, ``([], None, None, None)`` for general chat, or
+    ``(None, None, None, (error_json, status))``.
+    """
+    filters = dict(filters or {})
+
+    if collection:
+        vectorstore = index_registry.get_collection(collection)
+        if vectorstore is None:
+            return None, None, None, ({"error": "Unknown collection"}, 404)
+        # Document ids narrow the search down to those members of the collection
+        if document_ids:
+            filters["doc_ids"] = document_ids
+        stores, scope = [vectorstore], f"collection:{collection}"
+
+    # ✅ Document ids given: search exactly those documents' indexes
+    elif document_ids:
+        stores = [index_registry.get(document_id) for document_id in document_ids]
+        missing = [d for d, store in zip(document_ids, stores) if store is None]
+        if missing:
+            return None, None, None, ({"error": "Unknown document_id, upload the PDF first", "missing": missing}, 404)
+        if len(document_ids) == 1:
+            scope = f"doc:{document_ids[0]}"
+        else:
+            scope = "docs:" + hashlib.sha256(",".join(sorted(document_ids)).encode()).hexdigest()[:16]
+    else:
+        return [], None, None, None
+
+    if filters:
+        scope += "|" + json.dumps(filters, sort_keys=True)
+    return stores, scope, filters or None, None
+
+
+def prepare_chat(query, document_ids=None, collection=None, filters=None):
+    """
+    Resolve a chat request to either a cached answer or the Gemini prompt to
+    send, grounding it in the top chunks across ``document_ids`` (searched in
+    parallel) or of ``collection`` when given.
 
+    Returns ``(turn, None)`` or ``(None, (error_json, status))``. ``turn`` has
+    ``response`` and ``cached`` ("exact" / "semantic") on a cache hit, and
+    ``prompt`` otherwise; pass it to ``remember_answer`` once answered.
+    """
+    stores, scope, filters, error = resolve_chat_indexes(document_ids, collection, filters)
+    if error:
+        return None, error
+
+    if not stores:
+        return {"prompt": f"General Chat:\n\nQuestion: {query}", "cached": False}, None
+
+    # ✅ Same question asked before on these versions of the indexes → no embedding at all
+    version = "|".join(store.version for store in stores)
+    answer = answer_cache.get_exact(scope, version, query)
+    if answer is not None:
+        return {"response": answer, "cached": "exact"}, None
+
+    # ✅ Close enough to an earlier question → reuse its answer, skip search + Gemini
+    query_vector = embeddings.embed_query(query)
+    answer = answer_cache.get_similar(scope, version, query_vector)
+    if answer is not None:
+        return {"response": answer, "cached": "semantic"}, None
+
+    # ✅ Fetch a few extra candidates and keep as many as fit the token budget
+    hits = search_stores(stores, query_vector, k=CHAT_CONTEXT_CANDIDATES, filters=filters)
+    docs = [doc for doc, _ in hits]
+    context = build_context(docs, budget=CHAT_CONTEXT_TOKENS)
+    docs_text = context["text"]
+
+    # ✅ Build prompt
+    if docs_text:
+        prompt = f"Answer the question based only on the following PDF content:\n\n{docs_text}\n\nQuestion: {query}"
+    else:
+        prompt = f"General Chat:\n\nQuestion: {query}"
+
+    usage = {
+        "context_tokens": context["tokens"],
+        "context_budget": context["budget"],
+        "prompt_tokens": count_tokens(prompt),
+        "chunks_used": context["used"],
+        "chunks_dropped": context["dropped"],
+    }
+    logger.info(f"Chat context for {scope}: {usage}")
+    return {
+        "prompt": prompt,
+        "cached": False,
+        "usage": usage,
+        "cache_key": (scope, version, query, query_vector),
+    }, None
+
+
+def remember_answer(turn, answer):
+    """Store a freshly generated answer for document/collection chats."""
+    if turn.get("cache_key") and answer:
+        scope, version, query, query_vector = turn["cache_key"]
+        answer_cache.put(scope, version, query, query_vector, answer)
 
 
 @app.route("/chat", methods=["POST"])
 def chat():
-    global vectorstore
-    data = request.json
+    data = request.json or {}
     query = data.get("message")
 
     if not query:
         return jsonify({"error": "No message provided"}), 400
 
-    docs_text = ""
+    document_ids, collection, filters, error = parse_chat_targets(data)
+    if not error:
+        turn, error = prepare_chat(query, document_ids, collection, filters)
+    if error:
+        return jsonify(error[0]), error[1]
 
-    # ✅ If PDF index exists, use it
-    if vectorstore is None and os.path.exists("faiss_index"):
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        vectorstore = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
+    if turn["cached"]:
+        return jsonify({"response": turn["response"], "cached": turn["cached"]})
 
-    if vectorstore:
-        docs = vectorstore.similarity_search(query, k=3)
-        docs_text = "\n\n".join([d.page_content for d in docs])
+    # ✅ Gemini call (shared model object, through the gateway)
+    try:
+        output_text = llm_gateway.generate(turn["prompt"], client=request.remote_addr)
+    except llm_gateways.GatewayBusy as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    remember_answer(turn, output_text)
 
-    # ✅ Build prompt
-    if docs_text:
-        prompt = f"Answer the question based only on the following PDF content:\n\n{docs_text}\n\nQuestion: {query}"
+    return jsonify({"response": output_text, "cached": False, "usage": turn.get("usage")})
+
+
+@app.route("/chat/cache-stats", methods=["GET"])
+def chat_cache_stats():
+    return jsonify(answer_cache.stats())
+
+
+@app.route("/chat/llm-stats", methods=["GET"])
+def chat_llm_stats():
+    return jsonify(llm_gateway.stats())
+
+
+@app.route("/chat/index-stats", methods=["GET"])
+def chat_index_stats():
+    """
+    Index type, size and recall against exact search of one document's or
+    collection's index (``?document_id=`` or ``?collection=``); add
+    ``measure=1`` to re-measure recall now instead of reporting the last run.
+    """
+    document_id = request.args.get("document_id")
+    collection = request.args.get("collection")
+    if collection:
+        if not is_valid_collection_name(collection):
+            return jsonify({"error": "Invalid collection name"}), 400
+        vectorstore = index_registry.get_collection(collection)
+    elif document_id:
+        if not is_valid_doc_id(document_id):
+            return jsonify({"error": "Invalid document_id"}), 400
+        vectorstore = index_registry.get(document_id)
     else:
-        prompt = f"General Chat:\n\nQuestion: {query}"
+        return jsonify(index_registry.stats())
+    if vectorstore is None:
+        return jsonify({"error": "Unknown document_id or collection"}), 404
 
-    # ✅ Gemini call
-    model = genai.GenerativeModel("gemini-2.5-pro")
-    response = model.generate_content(prompt)
+    if request.args.get("measure") == "1":
+        vectorstore.measure_recall()
+    return jsonify(vectorstore.describe())
+
+
+def sse_event(event, payload):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
-    output_text = ""
-    if hasattr(response, "text"):
-        output_text = response.text
-    elif hasattr(response, "candidates") and response.candidates:
-        output_text = response.candidates[0].content.parts[0].text
-    
-    return jsonify({"response": output_text})
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Same as /chat but relays the answer as SSE ``token`` events while Gemini
+    generates it, followed by a ``done`` event with the full text.
+    """
+    data = request.json or {}
+    query = data.get("message")
+
+    if not query:
+        return jsonify({"error": "No message provided"}), 400
+
+    document_ids, collection, filters, error = parse_chat_targets(data)
+    if not error:
+        turn, error = prepare_chat(query, document_ids, collection, filters)
+    if error:
+        return jsonify(error[0]), error[1]
+
+    cancel_event = threading.Event()
+    client = request.remote_addr
+
+    def generate():
+        if turn["cached"]:
+            yield sse_event("token", {"text": turn["response"]})
+            yield sse_event("done", {"response": turn["response"], "cached": turn["cached"]})
+            return
+
+        parts = []
+        tokens = llm_gateway.stream(turn["prompt"], cancel_event=cancel_event, client=client)
+        try:
+            for token in tokens:
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+            answer = "".join(parts)
+            # Only complete answers are cached, never ones cut short by a disconnect
+            remember_answer(turn, answer)
+            yield sse_event("done", {"response": answer, "cached": False, "usage": turn.get("usage")})
+        except GeneratorExit:
+            # Client disconnected: stop the upstream generation too
+            logger.debug("Chat stream cancelled by client")
+            raise
+        except Exception as e:
+            logger.error(f"Chat stream failed: {str(e)}")
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            cancel_event.set()
+            tokens.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # Convert File
 @app.route("/convert", methods=["POST", "OPTIONS"])
@@ -409,32 +1275,32 @@ def convert_file():
         return jsonify({"success": False, "error": "Invalid file or target format."}), 400
 
     try:
-        with tempfile.TemporaryDirectory(dir=app.config['UPLOAD_FOLDER']) as temp_dir:
-            file_path = save_file(file, temp_dir)
-            file_type = file.filename.rsplit('.', 1)[1].lower()
-            output_filename = f"converted_{secure_filename(file.filename)}.{target_format}"
-            output_path = os.path.join(temp_dir, output_filename)
-
-            if file_type == "pdf":
-                if target_format == "docx":
-                    output_path = pdf_to_word(file_path)
-                elif target_format == "xlsx":
-                    output_path = pdf_to_excel(file_path)
-                elif target_format == "pptx":
-                    output_path = pdf_to_pptx(file_path)
-                elif target_format == "jpg":
-                    output_paths = pdf_to_jpg(file_path)
-                    output_path = output_paths[0]
-            elif file_type in ["docx", "xlsx", "xls", "pptx", "jpg", "png", "jpeg", "html", "txt", "csv"]:
-                if target_format == "pdf":
-                    output_path = convert_to_pdf(file_path, file_type, output_path)
-                else:
-                    return jsonify({"success": False, "error": "Unsupported conversion."}), 400
+        temp_dir = request_workspace()
+        file_path = save_file(file, temp_dir)
+        file_type = file.filename.rsplit('.', 1)[1].lower()
+        output_filename = f"converted_{secure_filename(file.filename)}.{target_format}"
+        output_path = os.path.join(temp_dir, output_filename)
+
+        if file_type == "pdf":
+            if target_format == "docx":
+                output_path = pdf_to_word(file_path, output_folder=temp_dir)
+            elif target_format == "xlsx":
+                output_path = pdf_to_excel(file_path, output_folder=temp_dir)
+            elif target_format == "pptx":
+                output_path = pdf_to_pptx(file_path)
+            elif target_format == "jpg":
+                output_paths = pdf_to_jpg(file_path)
+                output_path = output_paths[0]
+        elif file_type in ["docx", "xlsx", "xls", "pptx", "jpg", "png", "jpeg", "html", "txt", "csv"]:
+            if target_format == "pdf":
+                output_path = convert_to_pdf(file_path, file_type, output_path)
             else:
-                return jsonify({"success": False, "error": "Unsupported file type."}), 400
+                return jsonify({"success": False, "error": "Unsupported conversion."}), 400
+        else:
+            return jsonify({"success": False, "error": "Unsupported file type."}), 400
 
-            logger.debug(f"Converted {file.filename} to {target_format}")
-            return send_file(output_path, download_name=output_filename, as_attachment=True)
+        logger.debug(f"Converted {file.filename} to {target_format}")
+        return send_stored(output_path, download_name=output_filename, as_attachment=True)
     except Exception as e:
         logger.error(f"Conversion failed for {file.filename}: {str(e)}")
         return jsonify({"success": False, "error": f"Conversion failed: {str(e)}"}), 500
@@ -449,20 +1315,20 @@ def merge_pdfs():
             return jsonify({"error": "No files uploaded"}), 400
 
         merger = PdfMerger()
-        temp_dir = os.path.join(UPLOAD_FOLDER, f"tmp_{uuid.uuid4().hex}")
-        os.makedirs(temp_dir, exist_ok=True)  # ✅ ensure temp directory exists
+        temp_dir = request_workspace()
 
         output_path = os.path.join(temp_dir, f"merged_{uuid.uuid4()}.pdf")
 
-        for f in files:
-            file_path = os.path.join(temp_dir, f.filename)
+        # Numbered: two uploads with the same name must not overwrite each other
+        for i, f in enumerate(files):
+            file_path = os.path.join(temp_dir, f"{i}_{secure_filename(f.filename)}")
             f.save(file_path)
             merger.append(file_path)
 
         merger.write(output_path)
         merger.close()
 
-        return send_file(output_path, as_attachment=True)
+        return send_stored(output_path, as_attachment=True)
 
     except Exception as e:
         print(f"[ERROR] Merging failed: {e}")
@@ -485,28 +1351,15 @@ def split_pdf():
     if not allowed_file(file.filename):
         return jsonify({"success": False, "error": "File type not allowed", "allowed": list(ALLOWED_EXTENSIONS)}), 400
 
-    # create unique temp dir inside Uploads/
-    temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"temp_{uuid.uuid4().hex}")
-    os.makedirs(temp_dir, exist_ok=True)
-
     try:
-        # Save input file into this temp folder
-        input_path = save_file(file, temp_dir, "split_")
-
-        # Perform split
-        output_path = split_pdf_pages(input_path, pages, temp_dir)
-
-        logger.debug(f"Split PDF {file.filename} into {output_path}")
-        return send_file(output_path, as_attachment=True, download_name=f"split_{file.filename}")
+        workdir, input_path = save_tool_input(file)
+        logger.debug(f"Splitting PDF {file.filename}")
+        return run_tool("split", workdir, input_path, {"pages": pages}, download_name=f"split_{file.filename}")
 
     except Exception as e:
         logger.error(f"Splitting failed for {file.filename}: {str(e)}")
         return jsonify({"success": False, "error": f"Splitting failed: {str(e)}"}), 500
 
-    finally:
-        # cleanup temp directory after use
-        shutil.rmtree(temp_dir, ignore_errors=True)
-
 # Page Count
 @app.route("/page-count", methods=["POST", "OPTIONS"])
 def page_count():
@@ -521,13 +1374,13 @@ def page_count():
         return jsonify({"success": False, "error": "Valid PDF file required."}), 400
 
     try:
-        with tempfile.TemporaryDirectory(dir=app.config['UPLOAD_FOLDER']) as temp_dir:
-            input_path = save_file(file, temp_dir, "page_count_")
-            with open(input_path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                page_count = len(reader.pages)
+        temp_dir = request_workspace()
+        input_path = save_file(file, temp_dir, "page_count_")
+        with open(input_path, 'rb') as f:
+            reader = PyPDF2.PdfReader(f)
+            page_count = len(reader.pages)
 
-            return jsonify({"success": True, "pageCount": page_count})
+        return jsonify({"success": True, "pageCount": page_count})
     except Exception as e:
         logger.error(f"Page count failed: {str(e)}")
         return jsonify({"success": False, "error": f"Failed to get page count: {str(e)}"}), 400
@@ -545,44 +1398,11 @@ def remove_pages():
         return jsonify({"error": "Invalid file or pages"}), 400
 
     try:
-        reader = PdfReader(file)
-        total_pages = len(reader.pages)
-        print(f"📄 PDF has {total_pages} pages")
+        # Spooled to disk, never read into memory; out-of-range pages are ignored
         print(f"🗑 Pages requested to remove: {pages_to_remove}")
-
-        # Parse pages string -> list of integers
-        pages_to_remove_set = set()
-        for part in pages_to_remove.split(","):
-            part = part.strip()
-            if not part:
-                continue
-            if "-" in part:
-                start, end = part.split("-")
-                pages_to_remove_set.update(range(int(start), int(end) + 1))
-            else:
-                pages_to_remove_set.add(int(part))
-
-        # Validate pages (ignore invalid numbers)
-        valid_pages = {p for p in pages_to_remove_set if 1 <= p <= total_pages}
-        print(f"✅ Valid pages to remove: {valid_pages}")
-
-        writer = PdfWriter()
-
-        # Add pages except those in valid_pages
-        for i in range(total_pages):
-            if (i + 1) not in valid_pages:
-                writer.add_page(reader.pages[i])
-
-        output = io.BytesIO()
-        writer.write(output)
-        output.seek(0)
-
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="removed_pages.pdf",
-            mimetype="application/pdf",
-        )
+        workdir, input_path = save_tool_input(file)
+        return run_tool("remove-pages", workdir, input_path, {"pages": pages_to_remove},
+                        download_name="removed_pages.pdf")
 
     except Exception as e:
         print("❌ Error removing pages:", e)  # <-- Full error in backend console
@@ -595,16 +1415,10 @@ def extract_pages_route():
         file = request.files["file"]
         pages_str = request.form.get("pages")
 
-        # Save uploaded file
-        temp_dir = tempfile.mkdtemp(dir=UPLOAD_FOLDER)
-        file_path = os.path.join(temp_dir, secure_filename(file.filename))
-        file.save(file_path)
-
-        # Extract pages
-        extracted_path = extract_pages_from_pdf(file_path, pages_str, temp_dir)
-
-        print(f"[INFO] 📦 Sending extracted PDF: {extracted_path}")
-        return send_file(extracted_path, as_attachment=True)
+        # Save uploaded file and extract pages
+        workdir, file_path = save_tool_input(file)
+        logger.info(f"Extracting pages {pages_str} of {file.filename}")
+        return run_tool("extract-pages", workdir, file_path, {"pages": pages_str})
 
     except Exception as e:
         print(f"[ERROR] Page extraction failed: {e}")
@@ -628,17 +1442,10 @@ def rotate_pdf_route():
         except ValueError:
             return jsonify({"error": "Angle must be an integer"}), 400
 
-        # Save uploaded file
-        upload_dir = os.path.join("Uploads", f"tmp_{uuid.uuid4().hex[:8]}")
-        os.makedirs(upload_dir, exist_ok=True)
-        input_path = os.path.join(upload_dir, file.filename)
-        file.save(input_path)
-
-        # Rotate PDF
-        output_path = rotate_pdf(input_path, pages_str, angle, upload_dir)
-
-        print(f"[INFO] 📦 Sending rotated PDF: {output_path}")
-        return send_file(output_path, as_attachment=True)
+        # Save uploaded file and rotate PDF
+        workdir, input_path = save_tool_input(file)
+        logger.info(f"Rotating {file.filename}")
+        return run_tool("rotate", workdir, input_path, {"pages": pages_str, "angle": angle})
 
     except Exception as e:
         print(f"[ERROR] Rotation failed: {e}")
@@ -683,9 +1490,8 @@ def add_watermark(input_pdf, watermark_path):
             page.merge_page(watermark_page)  # overlay watermark
             pdf_writer.add_page(page)
 
-        # ✅ always use safe temporary output path
-        fd, output_path = tempfile.mkstemp(suffix="_watermarked.pdf", dir="Uploads")
-        os.close(fd)
+        # ✅ next to the input, in the request's own workspace
+        output_path = os.path.join(os.path.dirname(input_pdf), "watermarked.pdf")
         with open(output_path, "wb") as f_output:
             pdf_writer.write(f_output)
 
@@ -704,11 +1510,11 @@ def watermark_pdf():
         file = request.files["file"]
         watermark = request.files["watermark"]
 
-        # ✅ Create unique temp dir
-        temp_dir = tempfile.mkdtemp(dir="Uploads")
+        # ✅ Request workspace; prefixed so the two uploads can't collide
+        temp_dir = request_workspace()
 
-        pdf_path = os.path.join(temp_dir, file.filename)
-        watermark_path = os.path.join(temp_dir, watermark.filename)
+        pdf_path = os.path.join(temp_dir, f"input_{secure_filename(file.filename)}")
+        watermark_path = os.path.join(temp_dir, f"watermark_{secure_filename(watermark.filename)}")
 
         file.save(pdf_path)
         watermark.save(watermark_path)
@@ -717,7 +1523,7 @@ def watermark_pdf():
         output_path = add_watermark(pdf_path, watermark_path)
 
         print(f"[INFO] ✅ Sending watermarked PDF: {output_path}")
-        return send_file(output_path, as_attachment=True)
+        return send_stored(output_path, as_attachment=True)
 
     except Exception as e:
         print(f"[ERROR] Watermarking failed: {str(e)}")
@@ -736,31 +1542,16 @@ def add_page_numbers_route():
         start_page = int(request.form.get("start_page", 1))
         number_format = request.form.get("number_format", "1")
 
-        # Create a unique temp dir for this upload
-        temp_dir = tempfile.mkdtemp(dir="Uploads")
-
-        # Sanitize filename (replace spaces & special chars)
-        original_filename = file.filename
-        safe_filename = "".join(c if c.isalnum() or c in "._-" else "_" for c in original_filename)
-
-        pdf_path = os.path.join(temp_dir, safe_filename)
-        file.save(pdf_path)
-
-        # ✅ output file path (not directory!)
-        output_path = os.path.join(temp_dir, f"numbered_{safe_filename}")
+        # Save upload (sanitized name) into its own job directory
+        workdir, pdf_path = save_tool_input(file)
 
         # Call PDF tool
-        from pdf_tools.page_numbers import add_page_numbers
-        result_path = add_page_numbers(
-            pdf_path,
-            output_path,         # fixed
-            position=position,
-            font_size=font_size,
-            start_page=start_page,
-            number_format=number_format
-        )
-
-        return send_file(result_path, as_attachment=True)
+        return run_tool("page-numbers", workdir, pdf_path, {
+            "position": position,
+            "font_size": font_size,
+            "start_page": start_page,
+            "number_format": number_format,
+        })
 
     except Exception as e:
         app.logger.error(f"[ERROR] Failed to add page numbers to {file.filename}: {e}")
@@ -780,18 +1571,12 @@ def compress_pdf_route():
         if not pdf_file.filename.endswith(".pdf"):
             return jsonify({"success": False, "error": "Only PDF files allowed"}), 400
 
-        # save input temporarily
-        input_path = os.path.join(app.config["UPLOAD_FOLDER"], pdf_file.filename)
-        pdf_file.save(input_path)
-
-        # output path
-        output_path = os.path.join(app.config["UPLOAD_FOLDER"], f"compressed_{pdf_file.filename}")
-
-        # call compression
-        from pdf_tools.compress import compress_pdf
-        compress_pdf(input_path, output_path, image_quality=50)
+        # save input into its own job directory
+        workdir, input_path = save_tool_input(pdf_file)
 
-        return send_file(output_path, as_attachment=True, download_name=f"compressed_{pdf_file.filename}")
+        # call compression (process pool for big files)
+        return run_tool("compress", workdir, input_path, {"image_quality": 50},
+                        download_name=f"compressed_{pdf_file.filename}")
 
     except Exception as e:
         import traceback
@@ -800,6 +1585,47 @@ def compress_pdf_route():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+# 🔹 Several operations in one request: the PDF is parsed once and saved once
+@app.route("/pipeline", methods=["POST"])
+def pipeline_route():
+    """
+    ``steps``: ordered JSON list, e.g. ``[{"op": "rotate", "angle": 90},
+    {"op": "watermark", "text": "DRAFT"}, {"op": "page-numbers"},
+    {"op": "compress", "image_quality": 60}]``. An optional ``watermark``
+    file (or ``watermark_id``) is used by a watermark step without text.
+    Per-step timings come back in the ``Server-Timing`` header, or in the
+    job result with ``?async=1``.
+    """
+    pdf_file = request.files.get("file")
+    if not pdf_file or not pdf_file.filename.lower().endswith(".pdf"):
+        return jsonify({"success": False, "error": "A PDF file is required"}), 400
+    try:
+        steps = tool_pipeline.parse_steps(request.form.get("steps", ""))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    workdir, input_path = save_tool_input(pdf_file)
+    try:
+        params = {"steps": json.dumps(steps, sort_keys=True)}
+        watermark = request.files.get("watermark")
+        if watermark:
+            os.makedirs(os.path.join(workdir, "watermark"))
+            watermark_path = os.path.join(workdir, "watermark", secure_filename(watermark.filename) or "watermark.pdf")
+            watermark.save(watermark_path)
+            params.update(watermark_path=watermark_path, watermark_sha256=file_stores.hash_path(watermark_path))
+    except Exception:
+        workspace_manager.release(workdir)
+        raise
+
+    try:
+        return run_tool("pipeline", workdir, input_path, params,
+                        download_name=f"processed_{secure_filename(pdf_file.filename)}")
+    except jobs.InvalidInput as e:  # a step's params don't fit this document (page out of range, ...)
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Pipeline failed for {pdf_file.filename}: {str(e)}")
+        return jsonify({"success": False, "error": f"Pipeline failed: {str(e)}"}), 500
+
 
 # Optimize PDF
 @app.route("/optimize", methods=["POST", "OPTIONS"])
@@ -818,56 +1644,25 @@ def optimize_pdf_route():
         return jsonify({"success": False, "error": "File type not allowed", "allowed": list(ALLOWED_EXTENSIONS)}), 400
 
     try:
-        with tempfile.TemporaryDirectory(dir=app.config['UPLOAD_FOLDER']) as temp_dir:
-            pdf_path = save_file(pdf_file, temp_dir, "optimize_")
-            output_path = optimize_pdf(pdf_path, temp_dir)
-
-            logger.debug(f"Optimized {pdf_file.filename}")
-            return send_file(output_path, as_attachment=True, download_name=f"optimized_{pdf_file.filename}")
+        workdir, pdf_path = save_tool_input(pdf_file)
+        logger.debug(f"Optimizing {pdf_file.filename}")
+        return run_tool("optimize", workdir, pdf_path, download_name=f"optimized_{pdf_file.filename}")
     except Exception as e:
         logger.error(f"Optimization failed for {pdf_file.filename}: {str(e)}")
         return jsonify({"success": False, "error": f"Optimization failed: {str(e)}"}), 500
 
-def delete_file_later(path, delay=10):
-    def delete_task():
-        time.sleep(delay)
-        try:
-            os.remove(path)
-            print(f"[INFO] Deleted temp file: {path}")
-        except Exception as e:
-            print(f"[WARN] Could not delete temp file: {e}")
-    threading.Thread(target=delete_task, daemon=True).start()
-
-
 @app.route("/pdf-to-images", methods=["POST"])
 def pdf_to_images():
     if "file" not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
 
     pdf_file = request.files["file"]
-    pdf_bytes = pdf_file.read()
 
     try:
-        poppler_path = r"C:\Users\takd2\Release-25.07.0-0 (1)\poppler-25.07.0\Library\bin"
-        print(f"[DEBUG] Using Poppler path: {poppler_path}")
-
-        images = convert_from_bytes(pdf_bytes, poppler_path=poppler_path)
-        print(f"[DEBUG] Converted {len(images)} pages")
-
-        # Save to temp
-        temp_dir = tempfile.gettempdir()
-        zip_path = os.path.join(temp_dir, f"pdf_images_{uuid.uuid4().hex}.zip")
-        print(f"[DEBUG] Writing zip to: {zip_path}")
-
-        with zipfile.ZipFile(zip_path, "w") as zipf:
-            for i, img in enumerate(images):
-                img_path = os.path.join(temp_dir, f"page_{i+1}.jpg")
-                img.save(img_path, "JPEG")
-                zipf.write(img_path, f"page_{i+1}.jpg")
-                os.remove(img_path)
-
-        delete_file_later(zip_path, delay=30)
-        return send_file(zip_path, as_attachment=True, download_name="pdf_images.zip")
+        # Pages are rendered with PyMuPDF (200 dpi, pdf2image's default) and zipped
+        workdir, pdf_path = save_tool_input(pdf_file)
+        return run_tool("pdf-to-images", workdir, pdf_path, {"dpi": request.form.get("dpi", "200")},
+                        download_name="pdf_images.zip")
 
     except Exception as e:
         import traceback
@@ -886,23 +1681,15 @@ def pdf_to_word():
     pdf_file = request.files["file"]
 
     # Save uploaded PDF
-    os.makedirs("uploads", exist_ok=True)
-    pdf_path = os.path.join("uploads", pdf_file.filename)
-    pdf_file.save(pdf_path)
+    workdir, pdf_path = save_tool_input(pdf_file)
 
-    # Convert PDF -> Word
-    word_path = pdf_path.replace(".pdf", ".docx")
+    # Convert PDF -> Word and send back the converted file
     try:
-        cv = Converter(pdf_path)
-        cv.convert(word_path, start=0, end=None)  # full document
-        cv.close()
+        return run_tool("pdf-to-word", workdir, pdf_path)
     except Exception as e:
         print("❌ Conversion failed:", e)
         return jsonify({"error": str(e)}), 500
 
-    # Send back converted Word file
-    return send_file(word_path, as_attachment=True)
-
 
 @app.route("/pdf-to-excel", methods=["POST", "OPTIONS"])
 def convert_pdf_to_excel():
@@ -922,16 +1709,12 @@ def convert_pdf_to_excel():
         return jsonify({"success": False, "error": "File type not allowed", "allowed": ["pdf"]}), 400
 
     try:
-        with tempfile.TemporaryDirectory(dir=app.config['UPLOAD_FOLDER']) as temp_dir:
-            file_path = save_file(file, temp_dir, "pdf_to_excel_")
-            excel_path = pdf_to_excel(file_path)
-
-            logger.debug(f"Converted {file.filename} to Excel")
-            return send_file(
-                excel_path,
-                as_attachment=True,
-                download_name=f"converted_{file.filename.rsplit('.', 1)[0]}.xlsx"
-            )
+        workdir, file_path = save_tool_input(file)
+        logger.debug(f"Converting {file.filename} to Excel")
+        return run_tool(
+            "pdf-to-excel", workdir, file_path,
+            download_name=f"converted_{file.filename.rsplit('.', 1)[0]}.xlsx"
+        )
     except Exception as e:
         logger.error(f"PDF to Excel failed for {file.filename}: {str(e)}")
         return jsonify({"success": False, "error": f"Conversion failed: {str(e)}"}), 500
@@ -955,12 +1738,12 @@ def encrypt_pdf_route():
         return jsonify({"success": False, "error": "File type not allowed", "allowed": list(ALLOWED_EXTENSIONS)}), 400
 
     try:
-        with tempfile.TemporaryDirectory(dir=app.config['UPLOAD_FOLDER']) as temp_dir:
-            file_path = save_file(file, temp_dir, "encrypt_")
-            encrypted_path = encrypt_pdf(file_path, password)
+        temp_dir = request_workspace()
+        file_path = save_file(file, temp_dir, "encrypt_")
+        encrypted_path = encrypt_pdf(file_path, password, temp_dir)
 
-            logger.debug(f"Encrypted {file.filename}")
-            return send_file(encrypted_path, as_attachment=True, download_name=f"encrypted_{file.filename}")
+        logger.debug(f"Encrypted {file.filename}")
+        return send_stored(encrypted_path, as_attachment=True, download_name=f"encrypted_{file.filename}")
     except Exception as e:
         logger.error(f"Encryption failed for {file.filename}: {str(e)}")
         return jsonify({"success": False, "error": f"Encryption failed: {str(e)}"}), 500
@@ -983,12 +1766,10 @@ def decrypt_pdf_route():
         return jsonify({"success": False, "error": "File type not allowed", "allowed": list(ALLOWED_EXTENSIONS)}), 400
 
     try:
-        with tempfile.TemporaryDirectory(dir=app.config['UPLOAD_FOLDER']) as temp_dir:
-            file_path = save_file(file, temp_dir, "decrypt_")
-            decrypted_path = decrypt_pdf(file_path, password)
-
-            logger.debug(f"Decrypted {file.filename}")
-            return send_file(decrypted_path, as_attachment=True, download_name=f"decrypted_{file.filename}")
+        workdir, file_path = save_tool_input(file)
+        logger.debug(f"Decrypting {file.filename}")
+        return run_tool("decrypt-pdf", workdir, file_path, {"password": password},
+                        download_name=f"decrypted_{file.filename}")
     except Exception as e:
         logger.error(f"Decryption failed for {file.filename}: {str(e)}")
         return jsonify({"success": False, "error": f"Decryption failed: {str(e)}"}), 500
@@ -1006,12 +1787,10 @@ def pdf_to_pptx():
     if file.filename == "":
         return jsonify({"error": "Empty filename"}), 400
 
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(file_path)
+    workdir, file_path = save_tool_input(file)
 
     try:
-        pptx_path = convert_pdf_to_pptx(file_path)
-        return send_file(pptx_path, as_attachment=True)
+        return run_tool("pdf-to-pptx", workdir, file_path)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1033,13 +1812,12 @@ def pptx_to_pdf_api():
         return jsonify({"success": False, "error": "File type not allowed. Only PPTX is supported."}), 400
 
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pptx", dir=UPLOAD_FOLDER) as tmp_pptx:
-            file.save(tmp_pptx.name)
-            pptx_path = tmp_pptx.name
+        temp_dir = request_workspace()
+        pptx_path = save_file(file, temp_dir)
 
-        pdf_path = convert_pptx_to_pdf(pptx_path)
+        pdf_path = convert_pptx_to_pdf(pptx_path, output_folder=temp_dir)
 
-        return send_file(pdf_path, as_attachment=True, download_name=f"{os.path.splitext(file.filename)[0]}.pdf")
+        return send_stored(pdf_path, as_attachment=True, download_name=f"{os.path.splitext(file.filename)[0]}.pdf")
 
     except Exception as e:
         logger.error(f"Conversion failed for {file.filename}: {str(e)}")
@@ -1050,40 +1828,7 @@ def pptx_to_pdf_api():
 # Word to PDF
 
 
-# Define folders (must exist!)
-UPLOAD_FOLDER = "uploads"
-OUTPUT_FOLDER = "converted"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-
-# Path to LibreOffice (adjust if needed)
-# Windows default:
-LIBREOFFICE_PATH = r"C:\Program Files\LibreOffice\program\soffice.exe"
-# Linux/macOS default:
-# LIBREOFFICE_PATH = "/usr/bin/libreoffice"
-
-
-def word_to_pdf(input_path, output_folder):
-    """
-    Convert Word file (doc/docx) to PDF using LibreOffice headless mode.
-    """
-    try:
-        result = subprocess.run([
-            LIBREOFFICE_PATH, "--headless", "--convert-to", "pdf",
-            "--outdir", output_folder, input_path
-        ], capture_output=True, text=True, check=True)
-
-        print("✅ LibreOffice STDOUT:", result.stdout)
-        print("⚠️ LibreOffice STDERR:", result.stderr)
-
-        filename = os.path.splitext(os.path.basename(input_path))[0] + ".pdf"
-        return os.path.join(output_folder, filename)
-
-    except subprocess.CalledProcessError as e:
-        print("❌ LibreOffice failed")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        raise
+# LibreOffice conversion lives in pdf_tools.word_to_pdf (LIBREOFFICE_PATH)
 
 
 @app.route("/word-to-pdf", methods=["POST", "OPTIONS"])
@@ -1100,15 +1845,11 @@ def convert_word_to_pdf():
         return jsonify({"error": "Only .doc or .docx files are allowed"}), 400
 
     # Save uploaded file
-    input_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(input_path)
+    workdir, input_path = save_tool_input(file)
 
     try:
-        # Convert to PDF
-        output_path = word_to_pdf(input_path, OUTPUT_FOLDER)
-
-        # Send PDF back to client
-        return send_file(output_path, as_attachment=True)
+        # Convert to PDF and send it back to the client
+        return run_tool("word-to-pdf", workdir, input_path)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1126,19 +1867,15 @@ def convert_excel_to_pdf():
         return jsonify({"success": False, "error": "File type not allowed"}), 400
 
     try:
-        # Ensure permanent upload folder exists
-        os.makedirs("uploads", exist_ok=True)
-
-        # Save file to uploads with unique name
-        filename = f"{uuid.uuid4()}_{file.filename}"
-        filepath = os.path.abspath(os.path.join("uploads", filename))
-        file.save(filepath)
+        # Save file into the request workspace
+        temp_dir = request_workspace()
+        filepath = os.path.abspath(save_file(file, temp_dir))
 
         # Convert to PDF
-        pdf_path = excel_to_pdf(filepath, output_folder="uploads")
+        pdf_path = excel_to_pdf(filepath, output_folder=temp_dir)
 
-        return send_file(pdf_path, as_attachment=True,
-                         download_name=f"{file.filename.rsplit('.', 1)[0]}.pdf")
+        return send_stored(pdf_path, as_attachment=True,
+                           download_name=f"{file.filename.rsplit('.', 1)[0]}.pdf")
 
     except Exception as e:
         logger.error(f"Excel to PDF failed for {file.filename}: {str(e)}")
@@ -1148,6 +1885,7 @@ def convert_excel_to_pdf():
 # Edit PDF
 @app.route("/edit-pdf", methods=["POST"])
 def edit_pdf():
+    workdir = None
     try:
         file = request.files.get("file")
         if not file:
@@ -1163,8 +1901,9 @@ def edit_pdf():
 
         add_image_file = request.files.get("image")
 
-        pdf_bytes = file.read()
-        pdf_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        # Opened from disk: PyMuPDF pages the file in instead of holding a copy
+        workdir, pdf_path = save_tool_input(file)
+        pdf_doc = fitz.open(pdf_path, filetype="pdf")
 
         # Add image if provided
         img_reader = None
@@ -1196,17 +1935,18 @@ def edit_pdf():
                 rect = fitz.Rect(100, 200, 300, 400)
                 page.insert_image(rect, stream=add_image_file.read())
 
-        # Save to BytesIO
-        output_pdf = BytesIO()
-        pdf_doc.save(output_pdf)
+        output_path = os.path.join(workdir, "edited.pdf")
+        pdf_doc.save(output_path)
         pdf_doc.close()
-        output_pdf.seek(0)
 
-        return send_file(output_pdf, as_attachment=True, download_name="edited.pdf", mimetype="application/pdf")
+        return send_stored(output_path, as_attachment=True, download_name="edited.pdf", mimetype="application/pdf")
 
     except Exception as e:
         print("Error editing PDF:", e)
         return jsonify({"error": "Failed to edit PDF"}), 500
+    finally:
+        if workdir:
+            workspace_manager.release(workdir)
 
 @app.route("/sign-pdf", methods=["POST"])
 def sign_pdf():
@@ -1214,8 +1954,9 @@ def sign_pdf():
         return jsonify({"error": "No file provided"}), 400
 
     pdf_file = request.files["file"]
-    input_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4()}_input.pdf")
-    output_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4()}_basic_signed.pdf")
+    temp_dir = request_workspace()
+    input_path = os.path.join(temp_dir, "input.pdf")
+    output_path = os.path.join(temp_dir, "basic_signed.pdf")
     pdf_file.save(input_path)
 
     try:
@@ -1231,7 +1972,7 @@ def sign_pdf():
         with open(output_path, "wb") as f:
             writer.write(f)
 
-        return send_file(output_path, as_attachment=True, download_name="signed.pdf")
+        return send_stored(output_path, as_attachment=True, download_name="signed.pdf")
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1250,9 +1991,10 @@ def sign_with_cert():
     if not password:
         return jsonify({"error": "Password required for certificate"}), 400
 
-    input_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4()}_input.pdf")
-    cert_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4()}_cert.p12")
-    output_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4()}_cert_signed.pdf")
+    temp_dir = request_workspace()
+    input_path = os.path.join(temp_dir, "input.pdf")
+    cert_path = os.path.join(temp_dir, "cert.p12")
+    output_path = os.path.join(temp_dir, "cert_signed.pdf")
 
     pdf_file.save(input_path)
     cert_file.save(cert_path)
@@ -1264,11 +2006,13 @@ def sign_with_cert():
         with open(input_path, "rb") as inf, open(output_path, "wb") as outf:
             PdfSigner(meta, signer=signer).sign_pdf(inf, output=outf)
 
-        return send_file(output_path, as_attachment=True, download_name="signed.pdf")
+        return send_stored(output_path, as_attachment=True, download_name="signed.pdf")
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-PDFKIT_CONFIG = pdfkit.configuration(wkhtmltopdf=r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe")
+PDFKIT_CONFIG = lazy_object(
+    lambda: pdfkit.configuration(wkhtmltopdf=r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe")
+)
 
 @app.route("/html-to-pdf", methods=["POST", "OPTIONS"])
 def html_to_pdf():
@@ -1289,25 +2033,17 @@ def html_to_pdf():
         else:
             return jsonify({"success": False, "error": "No HTML content or URL provided"}), 400
 
-        # Save PDF to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+        # Save PDF into the request workspace
+        tmp_file_path = os.path.join(request_workspace(), "converted.pdf")
+        with open(tmp_file_path, "wb") as tmp_file:
             tmp_file.write(html_content)
-            tmp_file_path = tmp_file.name
 
         # Send PDF to client
-        return send_file(tmp_file_path, as_attachment=True, download_name="converted.pdf")
+        return send_stored(tmp_file_path, as_attachment=True, download_name="converted.pdf")
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-    finally:
-        # Cleanup temporary file after response is sent
-        if 'tmp_file_path' in locals() and os.path.exists(tmp_file_path):
-            try:
-                os.remove(tmp_file_path)
-            except Exception:
-                pass
-
 # Unlock PDF
 @app.route("/unlock-pdf", methods=["POST", "OPTIONS"])
 def unlock_pdf_route():
@@ -1326,12 +2062,10 @@ def unlock_pdf_route():
         return jsonify({"success": False, "error": "File type not allowed", "allowed": list(ALLOWED_EXTENSIONS)}), 400
 
     try:
-        with tempfile.TemporaryDirectory(dir=app.config['UPLOAD_FOLDER']) as temp_dir:
-            input_path = save_file(file, temp_dir, "unlock_")
-            output_path = unlock_pdf(input_path, password)
-
-            logger.debug(f"Unlocked {file.filename}")
-            return send_file(output_path, as_attachment=True, download_name=f"unlocked_{file.filename}")
+        workdir, input_path = save_tool_input(file)
+        logger.debug(f"Unlocking {file.filename}")
+        return run_tool("unlock-pdf", workdir, input_path, {"password": password},
+                        download_name=f"unlocked_{file.filename}")
     except Exception as e:
         logger.error(f"Unlocking failed for {file.filename}: {str(e)}")
         return jsonify({"success": False, "error": f"Unlocking failed: {str(e)}"}), 500
@@ -1364,9 +2098,10 @@ def organize_pdf():
     file = request.files['file']
     page_order_str = request.form.get('pageOrder', '')
 
+    workdir, input_path = save_tool_input(file)
     try:
-        # Read the uploaded PDF
-        reader = PdfReader(file)
+        # Read the uploaded PDF from disk
+        reader = PdfReader(input_path)
         writer = PdfWriter()
         total_pages = len(reader.pages)
 
@@ -1377,19 +2112,20 @@ def organize_pdf():
         for page_num in pages_to_keep:
             writer.add_page(reader.pages[page_num])
 
-        # Save to a BytesIO object
-        output_stream = io.BytesIO()
-        writer.write(output_stream)
-        output_stream.seek(0)
+        output_path = os.path.join(workdir, "organized.pdf")
+        with open(output_path, "wb") as f:
+            writer.write(f)
 
-        return send_file(
-            output_stream,
+        return send_stored(
+            output_path,
             as_attachment=True,
             download_name="organized.pdf",
             mimetype="application/pdf"
         )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        workspace_manager.release(workdir)
 # Repair PDF
 @app.route("/repair-pdf", methods=["POST", "OPTIONS"])
 def repair_pdf_route():
@@ -1407,12 +2143,9 @@ def repair_pdf_route():
         return jsonify({"success": False, "error": "File type not allowed", "allowed": list(ALLOWED_EXTENSIONS)}), 400
 
     try:
-        with tempfile.TemporaryDirectory(dir=app.config['UPLOAD_FOLDER']) as temp_dir:
-            input_path = save_file(file, temp_dir, "repair_")
-            output_path = repair_pdf(input_path)
-
-            logger.debug(f"Repaired {file.filename}")
-            return send_file(output_path, as_attachment=True, download_name=f"repaired_{file.filename}")
+        workdir, input_path = save_tool_input(file)
+        logger.debug(f"Repairing {file.filename}")
+        return run_tool("repair-pdf", workdir, input_path, download_name=f"repaired_{file.filename}")
     except Exception as e:
         logger.error(f"Repair failed for {file.filename}: {str(e)}")
         return jsonify({"success": False, "error": f"Repair failed: {str(e)}"}), 500
@@ -1439,14 +2172,12 @@ def compare_pdf():
     file1 = request.files["file1"]
     file2 = request.files["file2"]
 
-    # Save uploaded files properly
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as f1:
-        file1.save(f1.name)
-        file1_path = f1.name
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as f2:
-        file2.save(f2.name)
-        file2_path = f2.name
+    # Save uploaded files into the request workspace
+    temp_dir = request_workspace()
+    file1_path = os.path.join(temp_dir, "file1.pdf")
+    file2_path = os.path.join(temp_dir, "file2.pdf")
+    file1.save(file1_path)
+    file2.save(file2_path)
 
     # Now read after files are fully written
     text1 = extract_text(file1_path)
@@ -1478,32 +2209,9 @@ def redact_pdf():
         if not file or not keywords.strip():
             return jsonify({"error": "PDF file and keywords are required"}), 400
 
-        # Save uploaded file
-        temp_dir = tempfile.mkdtemp(dir=app.config["UPLOAD_FOLDER"])
-        input_path = os.path.join(temp_dir, file.filename)
-        file.save(input_path)
-
-        output_path = os.path.join(
-            temp_dir, f"redacted_{os.path.splitext(file.filename)[0]}.pdf"
-        )
-
-        # Process with PyMuPDF
-        doc = fitz.open(input_path)
-        words_to_redact = [k.strip() for k in keywords.split(",") if k.strip()]
-
-        for page in doc:
-            for word in words_to_redact:
-                areas = page.search_for(word)
-                for rect in areas:
-                    # Add redaction annotation
-                    page.add_redact_annot(rect, fill=(0, 0, 0))  # black box
-
-            page.apply_redactions()
-
-        doc.save(output_path)
-        doc.close()
-
-        return send_file(output_path, as_attachment=True, download_name="redacted.pdf")
+        # Save uploaded file; PyMuPDF redacts every keyword hit with a black box
+        workdir, input_path = save_tool_input(file)
+        return run_tool("redact-pdf", workdir, input_path, {"keywords": keywords}, download_name="redacted.pdf")
 
     except Exception as e:
         print(f"[ERROR] Redaction failed: {e}")
@@ -1517,24 +2225,12 @@ def redact_pdf():
 def ocr_pdf_route():
     try:
         file = request.files["file"]
-        input_dir = "Uploads"
-        os.makedirs(input_dir, exist_ok=True)
-        pdf_path = os.path.join(input_dir, file.filename)
-        file.save(pdf_path)
-
-        os.makedirs("Outputs", exist_ok=True)
-        base_name = os.path.splitext(file.filename)[0]
-
-        # Run OCR → text
-        text_output = os.path.join("Outputs", f"{base_name}_ocr.txt")
-        pdf_output = os.path.join("Outputs", f"{base_name}_searchable.pdf")
+        workdir, pdf_path = save_tool_input(file)
 
-        result_text = ocr_pdf(pdf_path, text_output)  # your updated function
+        # Run OCR → text, page by page in the tool process pool
         # Optional: make searchable PDF (overlay OCR text on original)
         # generate_searchable_pdf(pdf_path, text_output, pdf_output)
-
-        # Decide what to send
-        return send_file(text_output, mimetype="text/plain")
+        return run_tool("ocr-pdf", workdir, pdf_path, as_attachment=False)
 
     except Exception as e:
         app.logger.error(f"OCR failed for {file.filename}: {e}")
@@ -1575,19 +2271,12 @@ def crop_pdf_route():
             except Exception:
                 return jsonify({"error": "Invalid crop coordinates"}), 400
 
-        # Save uploaded file
+        # Save uploaded file and crop
         filename = secure_filename(file.filename)
-        temp_dir = tempfile.mkdtemp(dir=UPLOAD_FOLDER)
-        input_path = os.path.join(temp_dir, filename)
-        file.save(input_path)
-
-        # Process crop
-        output_path = crop_pdf(input_path, crop_box, temp_dir)
-
-        return send_file(output_path, as_attachment=True, download_name=f"cropped_{filename}")
+        workdir, input_path = save_tool_input(file)
+        return run_tool("crop-pdf", workdir, input_path, dict(zip(("x0", "y0", "x1", "y1"), crop_box)),
+                        download_name=f"cropped_{filename}")
 
-    except PDFProcessingError as e:
-        return jsonify({"error": str(e)}), 500
     except Exception as e:
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
@@ -1620,12 +2309,12 @@ def crop_image_route():
         except (ValueError, TypeError):
             return jsonify({"success": False, "error": "Crop coordinates must be numeric"}), 400
 
-        with tempfile.TemporaryDirectory(dir=app.config['UPLOAD_FOLDER']) as temp_dir:
-            filepath = save_file(file, temp_dir, "crop_image_")
-            output_path = crop_image(filepath, (left, upper, right, lower))
+        temp_dir = request_workspace()
+        filepath = save_file(file, temp_dir, "crop_image_")
+        output_path = crop_image(filepath, (left, upper, right, lower), temp_dir)
 
-            logger.debug(f"Cropped image {file.filename}")
-            return send_file(output_path, as_attachment=True, download_name=f"cropped_{file.filename}")
+        logger.debug(f"Cropped image {file.filename}")
+        return send_stored(output_path, as_attachment=True, download_name=f"cropped_{file.filename}")
     except Exception as e:
         logger.error(f"Image cropping failed for {file.filename}: {str(e)}")
         return jsonify({"success": False, "error": f"Cropping failed: {str(e)}"}), 500
@@ -1641,18 +2330,19 @@ def jpg_to_pdf_route():
     if not files:
         return jsonify({"error": "Empty file list"}), 400
 
+    temp_dir = request_workspace()
     image_paths = []
-    for file in files:
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
+    for i, file in enumerate(files):
+        filename = f"{i}_{secure_filename(file.filename)}"
+        file_path = os.path.join(temp_dir, filename)
         file.save(file_path)
         image_paths.append(file_path)  # ✅ add each image path
 
     # Convert to one PDF
-    pdf_path = jpg_to_pdf(image_paths)
+    pdf_path = jpg_to_pdf(image_paths, output_folder=temp_dir)
 
     # Return merged PDF
-    return send_file(pdf_path, as_attachment=True, download_name="converted.pdf")
+    return send_stored(pdf_path, as_attachment=True, download_name="converted.pdf")
 
 
 
@@ -1679,9 +2369,20 @@ def health_check():
         "status": status,
         "version": "1.0.0",
         "timestamp": datetime.utcnow().isoformat(),
-        "checks": checks
+        "checks": checks,
+        "workspaces": workspace_manager.stats()
     }), 200 if status == "healthy" else 500
 
+# Import-time budget (cold-start regression tracking)
+@app.route("/debug/import-budget", methods=["GET"])
+def import_budget():
+    """
+    Heavy modules this worker has lazily loaded so far, with their import
+    cost. Per-subsystem cold-start measurements spawn interpreters, so they
+    are only available from the CLI: ``python -m utils.import_budget``.
+    """
+    return jsonify({"success": True, "lazy_loaded_ms": loaded_modules()})
+
 # Home Endpoint
 @app.route("/", methods=["GET", "OPTIONS"])
 def home():
@@ -1924,6 +2625,65 @@ def home():
             "parameters": {"file": "Image file (JPG, PNG)", "left": "Left coordinate", "top": "Top coordinate",
                            "right": "Right coordinate", "bottom": "Bottom coordinate"}
         },
+        "submit_job": {
+            "method": "POST",
+            "path": "/jobs",
+            "description": "Run a PDF tool in the background (heavy routes also accept ?async=1)",
+            "parameters": {"operation": "Tool name, e.g. ocr-pdf, compress, pdf-to-word", "file": "Input file",
+                           "...": "The tool's usual form fields"}
+        },
+        "job_status": {
+            "method": "GET",
+            "path": "/jobs/<job_id>",
+            "description": "Status, per-page progress and ETA of a background job",
+            "parameters": {}
+        },
+        "job_result": {
+            "method": "GET",
+            "path": "/jobs/<job_id>/result",
+            "description": "Download the output of a finished job",
+            "parameters": {}
+        },
+        "cancel_job": {
+            "method": "DELETE",
+            "path": "/jobs/<job_id>",
+            "description": "Cancel a queued or running job",
+            "parameters": {}
+        },
+        "tool_cache_stats": {
+            "method": "GET",
+            "path": "/tools/cache-stats",
+            "description": "Hits, misses and bytes saved by the tool result cache (send X-Cache-Bypass: 1 "
+                           "to recompute a result)",
+            "parameters": {}
+        },
+        "upload_files": {
+            "method": "POST",
+            "path": "/files",
+            "description": "Store files once by content; tool routes then take file_id (file1_id, file2_id, "
+                           "watermark_id, file_ids) instead of an upload, and return X-File-Id for their output",
+            "parameters": {"file": "Any file", "files": "Several files"}
+        },
+        "resumable_upload": {
+            "method": "POST",
+            "path": "/uploads",
+            "description": "Start a resumable (tus 1.0) upload of up to MAX_UPLOAD_MB; PATCH /uploads/<id> "
+                           "appends at Upload-Offset, HEAD tells where to resume, the last chunk returns X-File-Id",
+            "parameters": {"Upload-Length": "Header: total size in bytes",
+                           "Upload-Metadata": "Header: filename, filetype, sha256 (base64 values)"}
+        },
+        "download_file": {
+            "method": "GET",
+            "path": "/files/<file_id>",
+            "description": "Download a stored file (/files/<file_id>/meta for its metadata)",
+            "parameters": {}
+        },
+        "delete_file": {
+            "method": "DELETE",
+            "path": "/files/<file_id>",
+            "description": "Remove a stored file",
+            "parameters": {}
+        },
         "health": {
             "method": "GET",
             "path": "/health",
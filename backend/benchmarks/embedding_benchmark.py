@@ -0,0 +1,102 @@
+"""
+Chunks/sec of the chat embedding backends, and how closely the ONNX
+vectors match the PyTorch ones the existing indexes were built with.
+
+Compares langchain's ``HuggingFaceEmbeddings`` (sentence-transformers on
+PyTorch) with ``chat_ai.onnx_embeddings.OnnxEncoder`` in float32 and int8.
+Run from the backend directory after exporting the ONNX model:
+
+    python -m benchmarks.embedding_benchmark
+    python -m benchmarks.embedding_benchmark --pdf sample.pdf --threads 4 --json
+    python -m benchmarks.embedding_benchmark --tolerance 0.99   # exit 1 if any vector drifts more
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+from chat_ai.embeddings import EMBEDDING_ONNX_DIR, MODEL_NAME
+from chat_ai.onnx_embeddings import OnnxEncoder, cosine_agreement
+
+WORDS = (
+    "invoice total amount due payment contract party agreement clause term date page section "
+    "report revenue quarter growth table figure summary appendix signature notice liability"
+).split()
+
+
+def synthetic_chunks(count, seed=0):
+    # Mixed lengths, like real splitter output (short headings to full 1000-char chunks)
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 180))) for _ in range(count)]
+
+
+def pdf_chunks(path, count):
+    from chat_ai.pdf_loader import load_pdf_chunks
+    return [c.page_content for c in load_pdf_chunks(path)][:count]
+
+
+def time_backend(embed, texts, repeats):
+    embed(texts[:8])  # warm-up: model load, first-run graph optimizations
+    best, vectors = None, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        vectors = embed(texts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return np.asarray(vectors, dtype=np.float32), best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embedding backend throughput and compatibility")
+    parser.add_argument("--pdf", help="Embed chunks of this PDF instead of synthetic text")
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0 = all cores)")
+    parser.add_argument("--onnx-dir", default=EMBEDDING_ONNX_DIR)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.99,
+                        help="Minimum cosine similarity to the PyTorch vectors")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    texts = pdf_chunks(args.pdf, args.chunks) if args.pdf else synthetic_chunks(args.chunks)
+
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    hf = HuggingFaceEmbeddings(model_name=MODEL_NAME, encode_kwargs={"batch_size": args.batch_size})
+    backends = {"huggingface": hf.embed_documents}
+    for name, quantized in (("onnx-fp32", False), ("onnx-int8", True)):
+        encoder = OnnxEncoder(args.onnx_dir, quantized=quantized, threads=args.threads)
+        backends[name] = lambda t, e=encoder: e.encode(t, batch_size=args.batch_size)
+
+    results, reference, failed = [], None, False
+    for name, embed in backends.items():
+        vectors, seconds = time_backend(embed, texts, args.repeats)
+        row = {"backend": name, "chunks_per_sec": round(len(texts) / seconds, 1), "seconds": round(seconds, 3)}
+        if reference is None:
+            reference = vectors
+        else:
+            agreement = cosine_agreement(reference, vectors)
+            row.update(cosine_min=round(agreement["min"], 5), cosine_mean=round(agreement["mean"], 5))
+            failed |= agreement["min"] < args.tolerance
+        results.append(row)
+
+    if args.json:
+        print(json.dumps({"chunks": len(texts), "tolerance": args.tolerance, "results": results}, indent=2))
+    else:
+        print(f"{len(texts)} chunks, batch size {args.batch_size}, onnx threads {args.threads or 'all'}")
+        print(f"{'backend':<14}{'chunks/s':>10}{'speedup':>9}{'cos min':>10}{'cos mean':>10}")
+        base = results[0]["chunks_per_sec"]
+        for r in results:
+            print(f"{r['backend']:<14}{r['chunks_per_sec']:>10.1f}{r['chunks_per_sec'] / base:>8.2f}x"
+                  f"{r.get('cosine_min', 1.0):>10.4f}{r.get('cosine_mean', 1.0):>10.4f}")
+    if failed:
+        print(f"ONNX vectors drift below cosine {args.tolerance}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Recall@k vs latency vs memory for the chat vectorstore index types.
+
+Every index is built with ``chat_ai.vectorstore.create_index`` (the same
+factory the app uses) and compared with exact flat search as ground truth.
+Vectors are either synthetic (clustered, unit-normalized like MiniLM
+output) or the stored embeddings of an existing index directory. Run from
+the backend directory:
+
+    python -m benchmarks.index_benchmark
+    python -m benchmarks.index_benchmark --store faiss_index/collections/reports --json
+    python -m benchmarks.index_benchmark --vectors 100000 --nprobe 4 --nprobe 16 --nprobe 64
+    python -m benchmarks.index_benchmark --type hnsw --ef-search 16 --ef-search 64 --ef-search 128
+"""
+import argparse
+import json
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from chat_ai import vectorstore
+
+
+def synthetic_vectors(count, dim, clusters=200, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.35 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def stored_vectors(path):
+    """Live embeddings of the current version of the store at ``path``."""
+    if not vectorstore.ChunkStore.exists(path):
+        sys.exit(f"No index at {path}")
+    store = vectorstore.ChunkStore(path, embeddings=None)
+    try:
+        with store.snapshot() as snapshot:
+            vectors = snapshot.live_vectors()[1] if snapshot is not None else None
+    finally:
+        store.close()
+    if vectors is None:
+        sys.exit(f"{path} holds no vectors")
+    return vectors
+
+
+def make_queries(vectors, count, seed=1):
+    # Perturbed corpus vectors: close to real questions hitting real chunks
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), count)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def recall_at_k(found, truth, k):
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def measure(index, queries, k):
+    """Search one query at a time, like a chat request does."""
+    found, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0].tolist())
+    latencies.sort()
+    return found, {
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+    }
+
+
+def run(vectors, queries, k, index_types, nprobes, ef_searches):
+    ids = np.arange(len(vectors), dtype=np.int64)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    truth = truth.tolist()
+
+    results = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = vectorstore.create_index(vectors, index_type)
+        index.add_with_ids(vectors, ids)
+        build_s = time.perf_counter() - start
+        description = vectorstore.index_description(index_type, vectors.shape[1], len(vectors))
+        size = len(faiss.serialize_index(index))
+
+        ivf = faiss.try_extract_index_ivf(index)
+        hnsw = vectorstore.try_extract_hnsw(index)
+        if ivf is not None:
+            settings = [("nprobe", n) for n in nprobes]
+        elif hnsw is not None:
+            settings = [("ef_search", ef) for ef in ef_searches]
+        else:
+            settings = [(None, None)]
+        for param, value in settings:
+            if param == "nprobe":
+                ivf.nprobe = value
+            elif param == "ef_search":
+                hnsw.efSearch = value
+            found, latency = measure(index, queries, k)
+            results.append({
+                "index_type": index_type,
+                "factory": description,
+                "nprobe": value if param == "nprobe" else None,
+                "ef_search": value if param == "ef_search" else None,
+                f"recall@{k}": round(recall_at_k(found, truth, k), 4),
+                **latency,
+                "index_bytes": size,
+                "bytes_per_vector": round(size / len(vectors), 1),
+                "build_s": round(build_s, 2),
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chat index recall/latency/memory benchmark")
+    parser.add_argument("--store", help="Use the embeddings of this index directory instead of synthetic ones")
+    parser.add_argument("--vectors", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic vector size (MiniLM: 384)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--type", action="append", dest="types", choices=["flat", "sq8", "hnsw", "ivfpq"],
+                        help="Index type to measure (repeatable, default: all)")
+    parser.add_argument("--nprobe", action="append", type=int, help="IVF lists probed (repeatable)")
+    parser.add_argument("--ef-search", action="append", type=int, help="HNSW efSearch (repeatable)")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    vectors = stored_vectors(args.store) if args.store else synthetic_vectors(args.vectors, args.dim)
+    queries = make_queries(vectors, args.queries)
+    results = run(
+        vectors, queries, args.k, args.types or ["flat", "sq8", "hnsw", "ivfpq"],
+        args.nprobe or [4, 16, 64], args.ef_search or [16, 64, 128],
+    )
+
+    if args.json:
+        print(json.dumps({"vectors": len(vectors), "dim": vectors.shape[1], "k": args.k, "results": results}, indent=2))
+        return 0
+
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}")
+    print(f"{'factory':<18}{'probe/ef':>9}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}{'B/vec':>9}{'build s':>9}")
+    for r in results:
+        setting = r["nprobe"] or r["ef_search"] or "-"
+        print(f"{r['factory']:<18}{setting:>9}{r[f'recall@{args.k}']:>9.3f}{r['p50_ms']:>9.3f}"
+              f"{r['p95_ms']:>9.3f}{r['bytes_per_vector']:>9.1f}{r['build_s']:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
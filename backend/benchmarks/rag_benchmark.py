@@ -0,0 +1,331 @@
+"""
+End-to-end RAG benchmark: upload -> ingest -> index -> /chat, offline.
+
+Generates synthetic PDFs (text-heavy, table-heavy and scanned-looking:
+page images over an invisible OCR text layer), uploads each through the
+real ``/upload-pdf`` route into one collection and then fires unique
+questions at ``/chat`` at several concurrency levels. Embeddings are a
+deterministic hashing bag-of-words (``--embeddings service`` uses the real
+model) and the LLM is ``FakeLLMProvider``, so two runs on the same machine
+only differ by the code under test. Run from the backend directory:
+
+    python -m benchmarks.rag_benchmark
+    python -m benchmarks.rag_benchmark --pages 200 --concurrency 1 --concurrency 8 --output before.json
+    python -m benchmarks.rag_benchmark --pages 200 --concurrency 1 --concurrency 8 --baseline before.json
+
+Measured: ingestion pages/sec and chunks/sec, index (re)build time, index
+memory and file size, and /chat latency p50/p95/p99 and throughput per
+concurrency level. ``--output`` writes everything as JSON; ``--baseline``
+prints the relative change of the headline numbers against an earlier file.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from chat_ai import vectorstore
+
+CORPUS_KINDS = ("text", "table", "scanned")
+COLLECTION = "rag-benchmark"
+
+WORDS = (
+    "invoice total amount due payment contract party agreement clause term date page section "
+    "report revenue quarter growth table figure summary appendix signature notice liability "
+    "warranty delivery supplier customer region budget forecast margin audit policy schedule "
+    "renewal penalty interest balance account transfer approval review statement obligation"
+).split()
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic, model-free embeddings: hashed bag of words, normalized.
+    Texts sharing words end up close, so retrieval still does real work.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dim] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _sentence(rng, low=6, high=18):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+    return " ".join(words).capitalize() + "."
+
+
+def _text_page(page, rng, number):
+    page.insert_text((56, 60), f"Section {number}: {rng.choice(WORDS)} {rng.choice(WORDS)}", fontsize=14)
+    body = "\n\n".join(" ".join(_sentence(rng) for _ in range(rng.randint(3, 6))) for _ in range(6))
+    page.insert_textbox(fitz.Rect(56, 80, 540, 790), body, fontsize=10)
+
+
+def _table_page(page, rng, number, rows=30, columns=("item", "quantity", "unit price", "total", "region")):
+    page.insert_text((56, 50), f"Table {number}: {rng.choice(WORDS)} by {rng.choice(WORDS)}", fontsize=12)
+    left, top, width, height = 56, 64, 96, 23
+    for c, name in enumerate(columns):
+        page.insert_text((left + c * width + 3, top + 15), name, fontsize=9)
+    for r in range(1, rows + 1):
+        quantity, price = rng.randint(1, 500), rng.randint(1, 9999) / 100
+        cells = (f"{rng.choice(WORDS)}-{r}", str(quantity), f"{price:.2f}", f"{quantity * price:.2f}", rng.choice(WORDS))
+        for c, cell in enumerate(cells):
+            page.insert_text((left + c * width + 3, top + r * height + 15), cell, fontsize=9)
+    for r in range(rows + 2):
+        page.draw_line((left, top + r * height), (left + len(columns) * width, top + r * height), width=0.5)
+    for c in range(len(columns) + 1):
+        page.draw_line((left + c * width, top), (left + c * width, top + (rows + 1) * height), width=0.5)
+
+
+def _scanned_page(page, number, dpi=100):
+    # Render a text page to a grayscale image, then lay it over an invisible
+    # text layer, like a scanner's OCR output
+    scratch = fitz.open()
+    _text_page(scratch.new_page(), random.Random(number), number)
+    pixmap = scratch[0].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    text = scratch[0].get_text()
+    scratch.close()
+    page.insert_image(page.rect, pixmap=pixmap)
+    page.insert_textbox(fitz.Rect(56, 60, 540, 790), text, fontsize=10, render_mode=3)
+
+
+def generate_pdf(path, kind, pages, seed=0):
+    """Write a ``pages``-page synthetic PDF of ``kind`` (one of ``CORPUS_KINDS``)."""
+    rng = random.Random(f"{kind}-{seed}")
+    with fitz.open() as doc:
+        for number in range(pages):
+            page = doc.new_page()  # A4-ish default
+            if kind == "text":
+                _text_page(page, rng, number)
+            elif kind == "table":
+                _table_page(page, rng, number)
+            elif kind == "scanned":
+                _scanned_page(page, number)
+            else:
+                raise ValueError(f"Unknown corpus kind: {kind}")
+        doc.save(path, garbage=3, deflate=True)
+    return os.path.getsize(path)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+
+def ingest(app_module, path, kind):
+    """Upload ``path`` through /upload-pdf into the benchmark collection and wait for its job."""
+    client = app_module.app.test_client()
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = client.post("/upload-pdf", data={"file": (f, f"{kind}.pdf"), "collection": COLLECTION})
+    accept_ms = (time.perf_counter() - start) * 1000
+    if response.status_code != 202:
+        raise RuntimeError(f"Upload of {kind} corpus failed: {response.status_code} {response.get_json()}")
+
+    job = app_module.job_registry.get(response.get_json()["job_id"])
+    while not job.finished:
+        time.sleep(0.01)
+    if job.error:
+        raise RuntimeError(f"Ingestion of {kind} corpus failed: {job.error}")
+    seconds = job.finished_at - job.created_at
+
+    document_id = job.result["document_id"]
+    store = app_module.index_registry.get(document_id)
+    start = time.perf_counter()
+    store.rebuild()
+    build_s = time.perf_counter() - start
+    info = store.describe()
+    index_file = os.path.join(store.path, vectorstore.VERSIONS_DIR, info["version"], vectorstore.INDEX_FILE)
+
+    return {
+        "kind": kind,
+        "document_id": document_id,
+        "pdf_bytes": os.path.getsize(path),
+        "pages": job.result["pages"],
+        "chunks": job.result["chunks"],
+        "accept_ms": round(accept_ms, 1),
+        "ingest_s": round(seconds, 3),
+        "pages_per_sec": round(job.result["pages"] / seconds, 1),
+        "chunks_per_sec": round(job.result["chunks"] / seconds, 1),
+        "index": info["index"],
+        "index_build_s": round(build_s, 3),
+        "index_memory_bytes": store.nbytes(),
+        "index_file_bytes": os.path.getsize(index_file) if os.path.exists(index_file) else None,
+    }
+
+
+def run_queries(app_module, concurrency, count, seed=0):
+    """``count`` unique /chat questions on the benchmark collection, ``concurrency`` at a time."""
+    rng = random.Random(f"queries-{concurrency}-{seed}")
+    questions = [
+        f"Question {i}: what does the {rng.choice(WORDS)} {rng.choice(WORDS)} say about {rng.choice(WORDS)}?"
+        for i in range(count)
+    ]
+    local = threading.local()
+
+    def ask(question):
+        if not hasattr(local, "client"):
+            local.client = app_module.app.test_client()
+        start = time.perf_counter()
+        response = local.client.post("/chat", json={"message": question, "collection": COLLECTION})
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(ask, questions))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(ms for ms, status in results if status == 200)
+    return {
+        "concurrency": concurrency,
+        "queries": count,
+        "errors": sum(1 for _, status in results if status != 200),
+        "qps": round(len(latencies) / wall, 1),
+        "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    import faiss
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "faiss": faiss.__version__,
+        "pymupdf": fitz.VersionBind,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def setup_app(root, embeddings_kind, token_delay_ms):
+    """Import the app and point it at a scratch index root, the chosen embeddings and the fake LLM."""
+    import app as app_module
+    from chat_ai.answer_cache import AnswerCache
+    from chat_ai.index_registry import IndexRegistry
+    from chat_ai.llm import FakeLLMProvider
+    from chat_ai.llm_gateway import LLMGateway
+
+    embeddings = HashEmbeddings() if embeddings_kind == "hash" else app_module.get_embedding_service()
+    app_module.embeddings = embeddings
+    app_module.index_registry = IndexRegistry(embeddings, root=os.path.join(root, "faiss_index"))
+    app_module.llm_gateway = LLMGateway(FakeLLMProvider(token_delay=token_delay_ms / 1000.0))
+    # Every question is unique; a semantic hit would skip the LLM and skew latencies
+    app_module.answer_cache = AnswerCache(similarity_threshold=2.0)
+    return app_module
+
+
+HEADLINES = {
+    "corpora": ("kind", ("pages_per_sec", "chunks_per_sec", "index_build_s", "index_memory_bytes")),
+    "queries": ("concurrency", ("qps", "p50_ms", "p95_ms", "p99_ms")),
+}
+
+
+def compare(results, baseline):
+    print(f"\nChange against baseline {baseline['environment'].get('commit')} ({baseline['environment']['timestamp']})")
+    for section, (key, metrics) in HEADLINES.items():
+        before = {row[key]: row for row in baseline.get(section, [])}
+        for row in results[section]:
+            old = before.get(row[key])
+            if old is None:
+                continue
+            changes = []
+            for metric in metrics:
+                if old.get(metric) and row.get(metric) is not None:
+                    changes.append(f"{metric} {row[metric]} ({(row[metric] - old[metric]) / old[metric]:+.1%})")
+            print(f"  {section[:-1] if section == 'queries' else 'corpus'} {row[key]}: " + ", ".join(changes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end ingestion and chat benchmark")
+    parser.add_argument("--pages", type=int, default=100, help="Pages per synthetic PDF")
+    parser.add_argument("--corpus", action="append", dest="corpora", choices=CORPUS_KINDS,
+                        help="Corpus kind to generate (repeatable, default: all)")
+    parser.add_argument("--queries", type=int, default=200, help="Questions per concurrency level")
+    parser.add_argument("--concurrency", action="append", type=int, help="Concurrent chat clients (repeatable)")
+    parser.add_argument("--embeddings", choices=["hash", "service"], default="hash",
+                        help="Deterministic hashing embeddings, or the app's embedding service")
+    parser.add_argument("--llm-token-delay-ms", type=float, default=0.0, help="Fake LLM delay between tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with the results of an earlier --output file")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {
+        "environment": environment(),
+        "config": {
+            "pages": args.pages, "queries": args.queries, "embeddings": args.embeddings,
+            "llm_token_delay_ms": args.llm_token_delay_ms, "seed": args.seed,
+        },
+        "corpora": [],
+        "queries": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="rag-benchmark-") as root:
+        app_module = setup_app(root, args.embeddings, args.llm_token_delay_ms)
+        for kind in args.corpora or CORPUS_KINDS:
+            path = os.path.join(root, f"{kind}.pdf")
+            generate_pdf(path, kind, args.pages, args.seed)
+            results["corpora"].append(ingest(app_module, path, kind))
+        for concurrency in args.concurrency or [1, 4, 16]:
+            results["queries"].append(run_queries(app_module, concurrency, args.queries, args.seed))
+    results["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{args.pages} pages per corpus, {args.embeddings} embeddings, fake LLM")
+        print(f"{'corpus':<9}{'pages':>7}{'chunks':>8}{'pages/s':>9}{'chunks/s':>10}{'index':>7}{'build s':>9}{'mem KB':>9}")
+        for r in results["corpora"]:
+            print(f"{r['kind']:<9}{r['pages']:>7}{r['chunks']:>8}{r['pages_per_sec']:>9.1f}{r['chunks_per_sec']:>10.1f}"
+                  f"{r['index']:>7}{r['index_build_s']:>9.3f}{r['index_memory_bytes'] / 1024:>9.1f}")
+        print(f"{'clients':<9}{'queries':>8}{'errors':>8}{'qps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for r in results["queries"]:
+            print(f"{r['concurrency']:<9}{r['queries']:>8}{r['errors']:>8}{r['qps']:>8.1f}"
+                  f"{r['p50_ms'] or 0:>9.2f}{r['p95_ms'] or 0:>9.2f}{r['p99_ms'] or 0:>9.2f}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
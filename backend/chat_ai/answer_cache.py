@@ -0,0 +1,146 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+ANSWER_CACHE_MAX_SCOPES = int(os.getenv("ANSWER_CACHE_MAX_SCOPES", "1024"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+class _Entry:
+    __slots__ = ("vector", "answer", "created")
+
+    def __init__(self, vector, answer):
+        self.vector = vector
+        self.answer = answer
+        self.created = time.monotonic()
+
+
+class AnswerCache:
+    """
+    Two-level chat answer cache, scoped per index (document or collection).
+
+    Level 1 is an exact match on the normalized query, checked before the
+    query is even embedded. Level 2 compares the query embedding with those
+    of earlier questions on the same index and reuses the answer when the
+    cosine similarity is at least ``similarity_threshold``.
+
+    Each scope is an LRU of at most ``max_entries`` answers that expire after
+    ``ttl`` seconds. A scope remembers the index version it was filled
+    against; looking it up with a different version (the index changed)
+    drops it.
+    """
+
+    def __init__(self, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 max_scopes=ANSWER_CACHE_MAX_SCOPES, similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_scopes = max_scopes
+        self.similarity_threshold = similarity_threshold
+        self._scopes = OrderedDict()  # scope -> (version, OrderedDict[normalized query -> _Entry])
+        self._lock = threading.Lock()
+        self._stats = {
+            "exact_hits": 0, "semantic_hits": 0, "misses": 0,
+            "evictions": 0, "expirations": 0, "invalidations": 0,
+        }
+
+    def _entries(self, scope, version, create=False):
+        current = self._scopes.get(scope)
+        if current is not None and current[0] != version:
+            del self._scopes[scope]
+            self._stats["invalidations"] += 1
+            current = None
+        if current is None:
+            if not create:
+                return None
+            current = (version, OrderedDict())
+            self._scopes[scope] = current
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+        self._scopes.move_to_end(scope)
+        return current[1]
+
+    def _expired(self, entry):
+        return self.ttl and time.monotonic() - entry.created > self.ttl
+
+    def get_exact(self, scope, version, query):
+        """Level 1: answer cached for the same normalized question, or None."""
+        key = normalize_query(query)
+        with self._lock:
+            entries = self._entries(scope, version)
+            entry = entries.get(key) if entries is not None else None
+            if entry is not None and self._expired(entry):
+                del entries[key]
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                return None
+            entries.move_to_end(key)
+            self._stats["exact_hits"] += 1
+            return entry.answer
+
+    def get_similar(self, scope, version, query_vector):
+        """Level 2: answer of the most similar earlier question above the threshold."""
+        query_vector = _unit(query_vector)
+        with self._lock:
+            entries = self._entries(scope, version)
+            best_key, best_score = None, self.similarity_threshold
+            if entries:
+                for key in [k for k, e in entries.items() if self._expired(e)]:
+                    del entries[key]
+                    self._stats["expirations"] += 1
+                if entries:
+                    keys = list(entries.keys())
+                    matrix = np.stack([entries[k].vector for k in keys])
+                    scores = matrix @ query_vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= best_score:
+                        best_key, best_score = keys[best], float(scores[best])
+
+            if best_key is None:
+                self._stats["misses"] += 1
+                return None
+            entries.move_to_end(best_key)
+            self._stats["semantic_hits"] += 1
+            return entries[best_key].answer
+
+    def put(self, scope, version, query, query_vector, answer):
+        key = normalize_query(query)
+        with self._lock:
+            entries = self._entries(scope, version, create=True)
+            entries[key] = _Entry(_unit(query_vector), answer)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, scope):
+        with self._lock:
+            if self._scopes.pop(scope, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["scopes"] = len(self._scopes)
+            stats["entries"] = sum(len(entries) for _, entries in self._scopes.values())
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["exact_hits"] + stats["semantic_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
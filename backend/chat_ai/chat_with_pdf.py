@@ -1,9 +1,18 @@
 from langchain.text_splitter import CharacterTextSplitter
-from langchain.embeddings import SentenceTransformerEmbeddings
 from langchain.vectorstores import FAISS
-from langchain.chains.question_answering import load_qa_chain
 from langchain.docstore.document import Document
 from langchain.llms import HuggingFaceHub
+from chat_ai.context_builder import build_context
+from chat_ai.embeddings import get_embedding_service
+
+# flan-t5-base only reads 512 input tokens; leave room for the instructions
+CONTEXT_TOKEN_BUDGET = 400
+
+QA_PROMPT = (
+    "Use the following pieces of context to answer the question at the end. "
+    "If you don't know the answer, just say that you don't know, don't try to make up an answer.\n\n"
+    "{context}\n\nQuestion: {question}\nHelpful Answer:"
+)
 
 # You can replace HuggingFaceHub with any LangChain-supported LLM
 def ask_pdf_question(pdf_text, question):
@@ -11,19 +20,21 @@ def ask_pdf_question(pdf_text, question):
     docs = [Document(page_content=pdf_text)]
     splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
     chunks = splitter.split_documents(docs)
+    for i, chunk in enumerate(chunks):
+        chunk.metadata["chunk_id"] = f"pdf:0:{i}"
 
     # 2. Embed chunks
-    embeddings = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+    embeddings = get_embedding_service()
     db = FAISS.from_documents(chunks, embeddings)
 
     # 3. Search relevant chunks
-    relevant_docs = db.similarity_search(question)
+    relevant_docs = db.similarity_search(question, k=8)
+    context = build_context(relevant_docs, budget=CONTEXT_TOKEN_BUDGET)
 
     # 4. Generate answer (Replace with your local LLM if needed)
     llm = HuggingFaceHub(
         repo_id="google/flan-t5-base", model_kwargs={"temperature": 0.2, "max_length": 512}
     )
 
-    chain = load_qa_chain(llm, chain_type="stuff")
-    result = chain.run(input_documents=relevant_docs, question=question)
-    return result
+    prompt = QA_PROMPT.format(context=context["text"], question=question)
+    return llm(prompt)
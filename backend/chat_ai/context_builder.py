@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = 1500
+ENCODING_NAME = os.getenv("CHAT_TOKEN_ENCODING", "cl100k_base")
+MIN_OVERLAP_CHARS = 20
+SEPARATOR = "\n\n"
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """
+    Load the tiktoken encoding once. tiktoken downloads the BPE file on first
+    use, so if that fails (offline host) token counts fall back to a
+    4-characters-per-token estimate instead of failing the chat request.
+    """
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(ENCODING_NAME)
+                except Exception as e:
+                    logger.warning(f"tiktoken encoding {ENCODING_NAME} unavailable, estimating tokens: {e}")
+                    _encoding = False
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut ``text`` down to at most ``max_tokens`` tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+def trim_overlap(previous, text):
+    """
+    Drop the start of ``text`` that repeats the end of ``previous`` (the
+    splitter's ``chunk_overlap``), so the shared span is only sent once.
+    """
+    longest = min(len(previous), len(text))
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(text[:size]):
+            return text[size:]
+    return text
+
+
+def _position(doc, rank):
+    """
+    ``(source, page, ordinal)`` of a chunk. Chunk ids are ``doc:page:ordinal``;
+    chunks without one get a unique source so they are never merged.
+    """
+    chunk_id = doc.metadata.get("chunk_id")
+    if chunk_id and chunk_id.count(":") >= 2:
+        source, page, ordinal = chunk_id.rsplit(":", 2)
+        if ordinal.isdigit():
+            return source, page, int(ordinal)
+    return f"rank-{rank}", str(doc.metadata.get("page", 0)), 0
+
+
+def _fingerprint(text):
+    return hashlib.sha1(re.sub(r"\s+", " ", text).strip().lower().encode("utf-8")).hexdigest()
+
+
+def build_context(docs, budget=CONTEXT_TOKEN_BUDGET, separator=SEPARATOR):
+    """
+    Assemble prompt context from ``docs`` (best match first) within ``budget``
+    tokens.
+
+    Duplicate chunks (same text, e.g. one file in two collections) are sent
+    once. Chunks are taken in score order while they fit; a chunk adjacent to
+    one already taken from the same page only costs its non-overlapping part.
+    Runs of adjacent chunks are then merged into a single passage, and
+    passages keep the rank of their best chunk. If even the best chunk alone
+    is over budget it is truncated rather than sending no context at all.
+
+    Returns a dict with the context ``text``, ``tokens`` used, the ``budget``,
+    and how many candidate chunks were ``used`` / ``dropped``.
+    """
+    separator_tokens = count_tokens(separator)
+    selected = {}  # (source, page, ordinal) -> (rank, text)
+    seen = set()
+    used_tokens = 0
+    dropped = 0
+
+    for rank, doc in enumerate(docs):
+        fingerprint = _fingerprint(doc.page_content)
+        if fingerprint in seen:
+            dropped += 1
+            continue
+        seen.add(fingerprint)
+
+        source, page, ordinal = _position(doc, rank)
+        previous = selected.get((source, page, ordinal - 1))
+        following = selected.get((source, page, ordinal + 1))
+        text = doc.page_content
+        if previous is not None:
+            text = trim_overlap(previous[1], text)
+        if following is not None:
+            # Our tail repeats the head of the chunk that comes after us
+            overlap = len(following[1]) - len(trim_overlap(text, following[1]))
+            text = text[:len(text) - overlap]
+        joins_passage = previous is not None or following is not None
+        cost = count_tokens(text) + (separator_tokens if selected and not joins_passage else 0)
+
+        if used_tokens + cost > budget:
+            if not selected:
+                selected[(source, page, ordinal)] = (rank, truncate_to_tokens(text, budget))
+                used_tokens = budget
+            else:
+                dropped += 1
+            continue
+
+        selected[(source, page, ordinal)] = (rank, doc.page_content)
+        used_tokens += cost
+
+    passages = _merge_adjacent(selected)
+    text = separator.join(passage for _, passage in sorted(passages))
+    tokens = count_tokens(text) if text else 0
+    if tokens > budget:
+        # Token boundaries can shift slightly when pieces are joined
+        text = truncate_to_tokens(text, budget)
+        tokens = count_tokens(text)
+    return {
+        "text": text,
+        "tokens": tokens,
+        "budget": budget,
+        "used": len(selected),
+        "dropped": dropped,
+    }
+
+
+def _merge_adjacent(selected):
+    """Merge consecutive ordinals of the same page into ``(best_rank, text)`` passages."""
+    passages = []
+    run = None  # [source, page, last_ordinal, best_rank, text]
+    for (source, page, ordinal), (rank, text) in sorted(selected.items()):
+        if run and run[0] == source and run[1] == page and run[2] == ordinal - 1:
+            run[2] = ordinal
+            run[3] = min(run[3], rank)
+            trimmed = trim_overlap(run[4], text)
+            run[4] += trimmed if trimmed != text else " " + text
+            continue
+        if run:
+            passages.append((run[3], run[4]))
+        run = [source, page, ordinal, rank, text]
+    if run:
+        passages.append((run[3], run[4]))
+    return passages
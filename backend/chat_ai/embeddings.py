@@ -0,0 +1,221 @@
+import hashlib
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite")
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "10"))
+
+# "torch" (sentence-transformers) or "onnx" (chat_ai.onnx_embeddings)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "models/all-MiniLM-L6-v2-onnx")
+EMBEDDING_ONNX_QUANTIZED = os.getenv("EMBEDDING_ONNX_QUANTIZED", "1") == "1"
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+
+
+def cache_key(text, model_name):
+    """Cache key for one chunk: hash of (model name, chunk text)."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent chunk-embedding cache in a single SQLite file.
+
+    Vectors are stored as raw float32 bytes so a lookup is one indexed
+    SELECT and a ``np.frombuffer``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            # SQLite caps the number of bound parameters per statement
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vec, dtype=np.float32).tobytes()) for key, vec in items],
+            )
+            self._conn.commit()
+
+
+class EmbeddingService(Embeddings):
+    """
+    Process-wide embedding service.
+
+    The sentence-transformers model is loaded once on first use. Concurrent
+    ``embed_*`` calls from different request threads are queued and merged
+    into shared ``encode`` batches of up to ``max_batch_size`` texts, waiting
+    at most ``max_wait_ms`` for more work to arrive. Document chunks are
+    looked up in the on-disk cache first so repeated boilerplate is only
+    ever embedded once.
+
+    With ``backend="onnx"`` the same model runs as an exported (optionally
+    int8) ONNX graph; its vectors are cached under their own key since they
+    match the PyTorch ones only to within a small cosine tolerance.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, max_batch_size=EMBEDDING_MAX_BATCH,
+                 max_wait_ms=EMBEDDING_MAX_WAIT_MS, cache_path=EMBEDDING_CACHE_PATH,
+                 backend=EMBEDDING_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        if backend == "onnx":
+            self.cache_namespace = f"{model_name}@onnx" + ("-int8" if EMBEDDING_ONNX_QUANTIZED else "")
+        else:
+            self.cache_namespace = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self.stats = {"cache_hits": 0, "cache_misses": 0, "batches": 0, "encoded": 0}
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    if self.backend == "onnx":
+                        from chat_ai.onnx_embeddings import OnnxEncoder
+                        self._model = OnnxEncoder(
+                            EMBEDDING_ONNX_DIR, quantized=EMBEDDING_ONNX_QUANTIZED, threads=EMBEDDING_ONNX_THREADS
+                        )
+                    else:
+                        from sentence_transformers import SentenceTransformer
+                        logger.info(f"Loading embedding model {self.model_name}")
+                        self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+
+        keys = [cache_key(t, self.cache_namespace) for t in texts]
+        vectors = self.cache.get_many(list(set(keys))) if self.cache else {}
+
+        # Embed each distinct missing chunk once, even if it repeats in this call
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        self.stats["cache_hits"] += len(texts) - len(missing)
+        self.stats["cache_misses"] += len(missing)
+
+        if missing:
+            encoded = self._encode(list(missing.values()))
+            new_items = list(zip(missing.keys(), encoded))
+            vectors.update(new_items)
+            if self.cache:
+                self.cache.put_many(new_items)
+
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+    def _encode(self, texts):
+        """Queue ``texts`` for the batching worker and wait for the vectors."""
+        self._ensure_worker()
+        future = Future()
+        self._requests.put((texts, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._requests.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            # Gather more requests until the batch is full or the wait window closes
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [t for item_texts, _ in batch for t in item_texts]
+            try:
+                encoded = self.model.encode(
+                    texts,
+                    batch_size=self.max_batch_size,
+                    convert_to_numpy=True,
+                    show_progress_bar=False,
+                ).astype(np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["encoded"] += len(texts)
+
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(encoded[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service():
+    """Return the shared EmbeddingService, creating it on first use."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = EmbeddingService()
+    return _service
@@ -0,0 +1,296 @@
+"""
+Streaming text extraction for chat ingestion.
+
+Every format is read as a sequence of ``(page_number, blocks)`` pairs, the
+shape ``pdf_loader.iter_pages`` yields for PDFs (``blocks`` is a list of
+``(bbox, text)``; the bbox is None outside PDFs), so they all go through
+the same chunk -> embed -> index pipeline. A "page" is a PDF page, a
+slide, a batch of spreadsheet or CSV rows, a batch of paragraphs or lines,
+or one image frame. Extractors read their input incrementally and hold at
+most one page at a time, so memory stays flat however many rows a
+spreadsheet has.
+"""
+import csv
+import logging
+import os
+from html.parser import HTMLParser
+
+from chat_ai.pdf_loader import iter_pages, page_count
+
+logger = logging.getLogger(__name__)
+
+ROWS_PER_PAGE = 100
+PARAGRAPHS_PER_PAGE = 40
+LINES_PER_PAGE = 80
+READ_SIZE = 64 * 1024
+MAX_CELL_CHARS = 2000  # a runaway cell should not turn into one giant chunk
+
+
+def file_type(filename):
+    """Lower-case extension of ``filename`` (``"report.XLSX"`` -> ``"xlsx"``)."""
+    return os.path.splitext(filename)[1].lstrip(".").lower()
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    return str(value).strip()[:MAX_CELL_CHARS]
+
+
+def row_text(header, row):
+    """``"Column: value; ..."`` for one table row, skipping empty cells."""
+    cells = [_cell(v) for v in row]
+    if header:
+        parts = [f"{h}: {c}" if h else c for h, c in zip(header, cells) if c]
+        parts.extend(c for c in cells[len(header):] if c)
+    else:
+        parts = [c for c in cells if c]
+    return "; ".join(parts)
+
+
+def _row_pages(rows, title, first_page):
+    """
+    Batch table ``rows`` (the first non-empty one is the header) into pages
+    of ``ROWS_PER_PAGE``, each opened by a ``"<title> rows a-b"`` block so
+    every chunk knows where it came from.
+    """
+    header = None
+    page_number = first_page
+    batch = []
+    first_row = None
+    for row_number, row in enumerate(rows, start=1):
+        if header is None:
+            if any(_cell(v) for v in row):
+                header = [_cell(v) for v in row]
+            continue
+        text = row_text(header, row)
+        if not text:
+            continue
+        if first_row is None:
+            first_row = row_number
+        batch.append((None, text))
+        if len(batch) == ROWS_PER_PAGE:
+            yield page_number, [(None, f"{title} rows {first_row}-{row_number}")] + batch
+            page_number += 1
+            batch, first_row = [], None
+    if batch:
+        yield page_number, [(None, f"{title} rows {first_row}-{row_number}")] + batch
+
+
+def iter_xlsx(path):
+    """openpyxl in read-only mode: rows are parsed from the sheet XML as they are read."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        page_number = 0
+        for sheet in workbook.worksheets:
+            for page in _row_pages(sheet.iter_rows(values_only=True), sheet.title, page_number):
+                page_number = page[0] + 1
+                yield page
+    finally:
+        workbook.close()
+
+
+def iter_xls(path):
+    """Legacy .xls through pandas, one sheet at a time (the format caps sheets at 65536 rows)."""
+    import pandas as pd
+
+    with pd.ExcelFile(path) as workbook:
+        page_number = 0
+        for sheet_name in workbook.sheet_names:
+            frame = workbook.parse(sheet_name, header=None, dtype=str)
+            rows = frame.itertuples(index=False, name=None)
+            for page in _row_pages(rows, sheet_name, page_number):
+                page_number = page[0] + 1
+                yield page
+            del frame
+
+
+def iter_csv(path):
+    """The csv module over the open file: one row parsed at a time."""
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        sample = f.read(READ_SIZE)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        yield from _row_pages(csv.reader(f, dialect), os.path.basename(path), 0)
+
+
+def _batched(blocks, size):
+    page_number, batch = 0, []
+    for block in blocks:
+        batch.append((None, block))
+        if len(batch) == size:
+            yield page_number, batch
+            page_number, batch = page_number + 1, []
+    if batch:
+        yield page_number, batch
+
+
+def _docx_blocks(document):
+    """Paragraph texts and table rows in document order."""
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    for child in document.element.body.iterchildren():
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            text = Paragraph(child, document).text.strip()
+            if text:
+                yield text
+        elif tag == "tbl":
+            for row in Table(child, document).rows:
+                text = " | ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
+                if text:
+                    yield text
+
+
+def iter_docx(path):
+    from docx import Document
+
+    yield from _batched(_docx_blocks(Document(path)), PARAGRAPHS_PER_PAGE)
+
+
+def iter_pptx(path):
+    """One page per slide: text frames, table cells, then speaker notes."""
+    from pptx import Presentation
+
+    for page_number, slide in enumerate(Presentation(path).slides):
+        blocks = []
+        for shape in slide.shapes:
+            if shape.has_text_frame and shape.text_frame.text.strip():
+                blocks.append((None, shape.text_frame.text.strip()))
+            elif getattr(shape, "has_table", False) and shape.has_table:
+                for row in shape.table.rows:
+                    text = " | ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
+                    if text:
+                        blocks.append((None, text))
+        if slide.has_notes_slide:
+            notes = slide.notes_slide.notes_text_frame.text.strip()
+            if notes:
+                blocks.append((None, notes))
+        yield page_number, blocks
+
+
+def iter_image(path):
+    """Tesseract OCR, one page per frame (multi-page TIFFs have several)."""
+    import pytesseract
+    from PIL import Image, ImageSequence
+
+    with Image.open(path) as image:
+        for page_number, frame in enumerate(ImageSequence.Iterator(image)):
+            text = pytesseract.image_to_string(frame.convert("RGB"))
+            yield page_number, [(None, p.strip()) for p in text.split("\n\n") if p.strip()]
+
+
+def _lines(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def iter_text(path):
+    yield from _batched(_lines(path), LINES_PER_PAGE)
+
+
+class _TextCollector(HTMLParser):
+    """Visible text of an HTML document, one block per block-level element."""
+
+    SKIP = {"script", "style", "head", "noscript", "template"}
+    BREAKS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "table"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self._parts = []
+        self._skipping = 0
+
+    def _flush(self):
+        text = " ".join("".join(self._parts).split())
+        if text:
+            self.blocks.append(text)
+        self._parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skipping += 1
+        elif tag in self.BREAKS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self.BREAKS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._parts.append(data)
+
+
+def _html_blocks(path):
+    parser = _TextCollector()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for piece in iter(lambda: f.read(READ_SIZE), ""):
+            parser.feed(piece)
+            yield from parser.blocks
+            parser.blocks = []
+    parser.close()
+    parser._flush()
+    yield from parser.blocks
+
+
+def iter_html(path):
+    yield from _batched(_html_blocks(path), PARAGRAPHS_PER_PAGE)
+
+
+EXTRACTORS = {
+    "pdf": iter_pages,
+    "xlsx": iter_xlsx,
+    "xlsm": iter_xlsx,
+    "xls": iter_xls,
+    "csv": iter_csv,
+    "docx": iter_docx,
+    "pptx": iter_pptx,
+    "txt": iter_text,
+    "md": iter_text,
+    "html": iter_html,
+    "htm": iter_html,
+    "jpg": iter_image,
+    "jpeg": iter_image,
+    "png": iter_image,
+    "tif": iter_image,
+    "tiff": iter_image,
+}
+
+CHAT_FILE_TYPES = frozenset(EXTRACTORS)
+
+
+def iter_document(path, kind=None):
+    """``(page_number, blocks)`` of the file at ``path``; ``kind`` defaults to its extension."""
+    kind = kind or file_type(path)
+    if kind not in EXTRACTORS:
+        raise ValueError(f"Unsupported file type for chat: {kind or 'unknown'}")
+    return EXTRACTORS[kind](path)
+
+
+def count_pages(path, kind=None):
+    """Number of pages ``iter_document`` will yield, when known up front (PDFs and slides)."""
+    kind = kind or file_type(path)
+    if kind == "pdf":
+        return page_count(path)
+    if kind == "pptx":
+        from pptx import Presentation
+
+        return len(Presentation(path).slides)
+    return None
+
+
+def extract_text(path, kind=None):
+    """All text of a file as one string (for small inputs; chat ingestion streams instead)."""
+    return "\n".join(text for _, blocks in iter_document(path, kind) for _, text in blocks)
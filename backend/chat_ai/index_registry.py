@@ -0,0 +1,231 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from chat_ai.vectorstore import ChunkStore
+
+logger = logging.getLogger(__name__)
+
+INDEX_ROOT = "faiss_index"
+COLLECTIONS_DIR = "collections"
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024  # 512MB of resident indexes
+
+COLLECTION_NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    Return the SHA-256 hex digest of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexRegistry:
+    """
+    Chat indexes: one per document plus named multi-document collections.
+
+    Document indexes are keyed by the SHA-256 of the uploaded file and live
+    under ``<root>/<doc_id>/``; collections live under
+    ``<root>/collections/<name>/`` and grow or shrink one document at a time.
+    Loaded indexes are kept in an LRU that is trimmed whenever the estimated
+    resident size goes over ``memory_budget`` bytes; evicted indexes are
+    simply reloaded from disk on their next use.
+    """
+
+    def __init__(self, embeddings, root=INDEX_ROOT, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.embeddings = embeddings
+        self.root = root
+        self.memory_budget = memory_budget
+        self._loaded = OrderedDict()  # index path -> (store, size)
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+        self._write_locks = {}
+        os.makedirs(os.path.join(self.root, COLLECTIONS_DIR), exist_ok=True)
+
+    def index_path(self, doc_id):
+        if not is_valid_doc_id(doc_id):
+            raise ValueError(f"Invalid document id: {doc_id}")
+        return os.path.join(self.root, doc_id)
+
+    def collection_path(self, name):
+        if not is_valid_collection_name(name):
+            raise ValueError(f"Invalid collection name: {name}")
+        return os.path.join(self.root, COLLECTIONS_DIR, name)
+
+    def exists(self, doc_id):
+        """True if an index for ``doc_id`` has been persisted."""
+        return ChunkStore.exists(self.index_path(doc_id))
+
+    def build(self, doc_id, documents):
+        """
+        Embed ``documents`` and persist them as the index for ``doc_id``.
+
+        If the index already exists (same bytes uploaded before) nothing is
+        embedded. Returns True when a new index was built.
+        """
+        return self._build(doc_id, lambda store: store.add_documents(doc_id, documents))
+
+    def build_from_vectors(self, doc_id, items):
+        """
+        Same as ``build`` for chunks embedded by the caller, given as
+        ``(int_id, Document, vector)`` triples from ``prepare_chunks``.
+        """
+        return self._build(doc_id, lambda store: store.add_vectors(items))
+
+    def build_from_batches(self, doc_id, batches):
+        """
+        Same as ``build_from_vectors`` for an iterable of triple batches,
+        consumed one batch at a time while the index is being written.
+        """
+        return self._build(doc_id, lambda store: store.add_vector_batches(batches))
+
+    def _build(self, doc_id, fill):
+        path = self.index_path(doc_id)
+
+        # Concurrent uploads of the same file wait for the first build
+        with self._write_lock(path):
+            if self.exists(doc_id):
+                logger.debug(f"Index for {doc_id} already exists, skipping embedding")
+                return False
+
+            # Build in a temp dir first so a crash never leaves a half-written index
+            tmp_dir = tempfile.mkdtemp(prefix=f".{doc_id}_", dir=self.root)
+            try:
+                store = ChunkStore(tmp_dir, self.embeddings)
+                fill(store)
+                store.close()
+                shutil.rmtree(path, ignore_errors=True)
+                os.replace(tmp_dir, path)
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+
+            store = ChunkStore(path, self.embeddings)
+            self._remember(path, store)
+            logger.info(f"Built index for {doc_id} ({store.ntotal} chunks)")
+            return True
+
+    def get(self, doc_id):
+        """
+        Return the store for ``doc_id``, loading it from disk if needed.
+        Returns None if the document has never been indexed.
+        """
+        return self._get(self.index_path(doc_id))
+
+    def get_collection(self, name):
+        """Return the store for collection ``name``, or None if it does not exist."""
+        return self._get(self.collection_path(name))
+
+    def add_to_collection(self, name, doc_id):
+        """
+        Append an already-indexed document to a collection. Its vectors are
+        copied from the document's own index, so nothing is re-embedded and
+        existing collection vectors are left untouched.
+        Returns the number of chunks added.
+        """
+        source = self.get(doc_id)
+        if source is None:
+            raise KeyError(f"Document {doc_id} has not been indexed")
+
+        path = self.collection_path(name)
+        with self._write_lock(path):
+            store = self._get(path) or ChunkStore(path, self.embeddings)
+            if doc_id in store.document_ids():
+                return 0
+            items = source.get_vectors(doc_id)
+            store.add_vectors(items)
+            self._remember(path, store)
+            logger.info(f"Added {doc_id} to collection {name} ({len(items)} chunks)")
+            return len(items)
+
+    def remove_from_collection(self, name, doc_id):
+        """Delete a document's chunks from a collection. Returns chunks removed."""
+        path = self.collection_path(name)
+        with self._write_lock(path):
+            store = self._get(path)
+            if store is None:
+                return 0
+            removed = store.delete_document(doc_id)
+            self._remember(path, store)
+            return removed
+
+    def delete(self, doc_id):
+        """Drop a document's index from memory and disk."""
+        path = self.index_path(doc_id)
+        with self._lock:
+            entry = self._forget(path)
+            if entry is not None:
+                entry[0].close()
+            shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resident": [os.path.relpath(p, self.root) for p in self._loaded.keys()],
+                "resident_bytes": self._resident_bytes,
+                "memory_budget": self.memory_budget,
+            }
+
+    def _get(self, path):
+        with self._lock:
+            entry = self._loaded.get(path)
+            if entry is not None:
+                self._loaded.move_to_end(path)
+                return entry[0]
+
+            if not ChunkStore.exists(path):
+                return None
+
+            # Cheap regardless of corpus size (the index is mmapped and chunk
+            # text stays in SQLite until a search needs it), so it is done
+            # under the lock to guarantee one open store per directory
+            store = ChunkStore(path, self.embeddings)
+            self._remember(path, store)
+            return store
+
+    def _write_lock(self, path):
+        with self._lock:
+            return self._write_locks.setdefault(path, threading.Lock())
+
+    def _remember(self, path, store):
+        size = store.nbytes()
+        with self._lock:
+            self._forget(path)
+            self._loaded[path] = (store, size)
+            self._resident_bytes += size
+            self._evict()
+
+    def _forget(self, path):
+        entry = self._loaded.pop(path, None)
+        if entry is not None:
+            self._resident_bytes -= entry[1]
+        return entry
+
+    def _evict(self):
+        # Always keep the most recently used index, even if it alone exceeds the budget
+        while self._resident_bytes > self.memory_budget and len(self._loaded) > 1:
+            path, (_, size) = self._loaded.popitem(last=False)
+            self._resident_bytes -= size
+            logger.debug(f"Evicted index {path} ({size} bytes)")
+
+
+def is_valid_doc_id(doc_id):
+    """Document ids are lowercase SHA-256 hex digests."""
+    return (
+        isinstance(doc_id, str)
+        and len(doc_id) == 64
+        and all(c in "0123456789abcdef" for c in doc_id)
+    )
+
+
+def is_valid_collection_name(name):
+    return isinstance(name, str) and bool(COLLECTION_NAME_RE.match(name))
@@ -0,0 +1,157 @@
+import logging
+import queue
+import threading
+from collections import defaultdict
+
+from chat_ai.extractors import count_pages, iter_document
+from chat_ai.pdf_loader import make_splitter, split_page
+from chat_ai.vectorstore import prepare_chunks
+
+logger = logging.getLogger(__name__)
+
+PAGE_QUEUE_SIZE = 16  # parsed pages waiting to be chunked
+BATCH_QUEUE_SIZE = 4  # chunk batches waiting to be embedded
+EMBED_BATCH_SIZE = 64
+INDEXING_SHARE = 0.05  # part of the progress bar kept for writing the index
+
+_DONE = object()
+
+
+def _put(q, item, stop):
+    """Blocking put that gives up once ``stop`` is set (a later stage failed)."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    """Blocking get that returns ``_DONE`` once ``stop`` is set (an earlier stage failed)."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def ingest_document(job, path, doc_id, registry, kind=None, collection=None, chunk_size=1000, chunk_overlap=200):
+    """
+    Index the file at ``path`` (any ``CHAT_FILE_TYPES`` format, by default
+    from its extension) as ``doc_id``, reporting progress on ``job``.
+
+    Three overlapping stages connected by bounded queues:
+
+    - parse: streaming extraction (``iter_document``; PDF pages in parallel
+      over page ranges, spreadsheets and CSVs in row batches, ...)
+    - chunk: per-page splitting into batches of ``EMBED_BATCH_SIZE`` chunks
+    - embed: this thread, embedding each batch as soon as it is ready and
+      handing it straight to the index being written
+
+    so the first pages are being embedded while later ones are still parsed,
+    a slow stage applies back-pressure instead of buffering the whole
+    document, and neither the text nor the vectors of the whole document
+    are ever held in memory at once.
+    """
+    total_pages = count_pages(path, kind)
+    job.update(stage="parsing", pages_total=total_pages, pages_parsed=0, chunks_created=0, chunks_embedded=0)
+
+    pages = queue.Queue(maxsize=PAGE_QUEUE_SIZE)
+    batches = queue.Queue(maxsize=BATCH_QUEUE_SIZE)
+    stop = threading.Event()
+    errors = []
+    counts = {"pages_parsed": 0, "chunks_created": 0, "chunks_embedded": 0}
+
+    def parse():
+        try:
+            for page in iter_document(path, kind):
+                if not _put(pages, page, stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(pages, _DONE, stop)
+
+    def chunk():
+        splitter = make_splitter(chunk_size, chunk_overlap)
+        ordinals = defaultdict(int)  # chunk ordinals per page, shared across batches
+        batch = []
+        try:
+            while True:
+                item = _get(pages, stop)
+                if item is _DONE:
+                    break
+                page_number, blocks = item
+                batch.extend(prepare_chunks(doc_id, split_page(splitter, path, page_number, blocks), ordinals))
+                counts["pages_parsed"] += 1
+                job.update(pages_parsed=counts["pages_parsed"], chunks_created=counts["chunks_created"] + len(batch))
+                if len(batch) >= EMBED_BATCH_SIZE:
+                    counts["chunks_created"] += len(batch)
+                    if not _put(batches, batch, stop):
+                        return
+                    batch = []
+            if batch:
+                counts["chunks_created"] += len(batch)
+                _put(batches, batch, stop)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(batches, _DONE, stop)
+
+    def embedded():
+        while True:
+            batch = _get(batches, stop)
+            if batch is _DONE:
+                break
+            job.check_cancelled()
+            job.update(stage="embedding")
+            vectors = registry.embeddings.embed_documents([d.page_content for _, d in batch])
+            counts["chunks_embedded"] += len(batch)
+            yield [(i, d, v) for (i, d), v in zip(batch, vectors)]
+
+            progress = {"chunks_embedded": counts["chunks_embedded"]}
+            if total_pages:
+                # Extrapolate the final chunk count from the pages parsed so far
+                parsed = max(counts["pages_parsed"], 1)
+                expected = max(counts["chunks_created"] * total_pages / parsed, counts["chunks_embedded"])
+                progress["fraction"] = (1 - INDEXING_SHARE) * counts["chunks_embedded"] / expected
+            job.update(**progress)
+
+        if errors:
+            raise errors[0]
+        if not counts["chunks_embedded"]:
+            raise ValueError("No extractable text found in document")
+        job.update(stage="indexing", pages_parsed=counts["pages_parsed"], chunks_created=counts["chunks_created"])
+
+    workers = [
+        threading.Thread(target=parse, name=f"ingest-parse-{doc_id[:8]}", daemon=True),
+        threading.Thread(target=chunk, name=f"ingest-chunk-{doc_id[:8]}", daemon=True),
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        registry.build_from_batches(doc_id, embedded())
+    finally:
+        # Unblocks the stages if indexing stopped early (failure, or an
+        # identical upload that finished first)
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    if collection:
+        registry.add_to_collection(collection, doc_id)
+    job.update(stage="done")
+    logger.info(f"Ingested {doc_id}: {counts['pages_parsed']} pages, {counts['chunks_embedded']} chunks")
+
+    return {
+        "document_id": doc_id,
+        "collection": collection,
+        "pages": counts["pages_parsed"],
+        "chunks": counts["chunks_embedded"],
+    }
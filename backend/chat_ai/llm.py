@@ -0,0 +1,120 @@
+import logging
+import os
+import random
+import threading
+
+logger = logging.getLogger(__name__)
+
+CHAT_LLM_PROVIDER = os.getenv("CHAT_LLM_PROVIDER", "gemini")
+
+
+class TransientLLMError(Exception):
+    """An upstream failure worth retrying (rate limit, overload, timeout)."""
+
+
+def response_text(response):
+    """Pull the answer text out of a Gemini response (or streamed chunk)."""
+    try:
+        if getattr(response, "text", None):
+            return response.text
+    except ValueError:
+        # .text raises when a chunk has no text parts (e.g. safety stop)
+        pass
+    if getattr(response, "candidates", None):
+        parts = response.candidates[0].content.parts
+        return "".join(getattr(p, "text", "") for p in parts)
+    return ""
+
+
+class GeminiProvider:
+    """Thin wrapper around one shared ``genai.GenerativeModel``."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def generate(self, prompt):
+        return response_text(self.model.generate_content(prompt))
+
+    def stream(self, prompt, cancel_event=None):
+        """
+        Yield partial answer text as Gemini produces it.
+
+        Closing the generator (client went away) or setting ``cancel_event``
+        stops reading and cancels the upstream stream.
+        """
+        response = self.model.generate_content(prompt, stream=True)
+        try:
+            for chunk in response:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                text = response_text(chunk)
+                if text:
+                    yield text
+        finally:
+            # The SDK keeps the gRPC stream on a private attribute; cancel it so
+            # an abandoned request stops generating (and billing) tokens.
+            upstream = getattr(response, "_iterator", None)
+            if upstream is not None and hasattr(upstream, "cancel"):
+                try:
+                    upstream.cancel()
+                except Exception:
+                    pass
+
+
+class FakeLLMProvider:
+    """
+    Offline stand-in for Gemini that streams a canned answer word by word.
+
+    ``first_token_delay`` and ``token_delay`` (seconds) simulate upstream
+    latency so streaming, cancellation and timeouts can be exercised locally,
+    and ``error_rate`` (0..1) fails that share of calls with a
+    ``TransientLLMError`` before the first token, for retry and load tests.
+    """
+
+    def __init__(self, answer=None, token_delay=0.05, first_token_delay=0.0, error_rate=0.0):
+        self.answer = answer
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.error_rate = error_rate
+
+    def _tokens(self, prompt):
+        answer = self.answer
+        if answer is None:
+            question = prompt.rsplit("Question:", 1)[-1].strip()
+            answer = f"This is a fake answer to: {question}"
+        words = answer.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def generate(self, prompt):
+        return "".join(self.stream(prompt))
+
+    def stream(self, prompt, cancel_event=None):
+        cancel_event = cancel_event or threading.Event()
+        if self.first_token_delay and cancel_event.wait(self.first_token_delay):
+            return
+        if self.error_rate and random.random() < self.error_rate:
+            raise TransientLLMError("Simulated upstream error")
+        for i, token in enumerate(self._tokens(prompt)):
+            if i and self.token_delay and cancel_event.wait(self.token_delay):
+                return
+            if cancel_event.is_set():
+                return
+            yield token
+
+
+def get_llm_provider(model=None, provider=CHAT_LLM_PROVIDER):
+    """
+    Pick the chat LLM backend. ``CHAT_LLM_PROVIDER=fake`` swaps Gemini for
+    the offline FakeLLMProvider (delays via ``FAKE_LLM_TOKEN_DELAY_MS`` and
+    ``FAKE_LLM_FIRST_TOKEN_DELAY_MS``, failures via ``FAKE_LLM_ERROR_RATE``).
+    """
+    if provider == "fake":
+        return FakeLLMProvider(
+            token_delay=float(os.getenv("FAKE_LLM_TOKEN_DELAY_MS", "50")) / 1000.0,
+            first_token_delay=float(os.getenv("FAKE_LLM_FIRST_TOKEN_DELAY_MS", "0")) / 1000.0,
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+        )
+    if model is None:
+        raise ValueError("A GenerativeModel is required for the gemini provider")
+    return GeminiProvider(model)
+
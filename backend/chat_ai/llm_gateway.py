@@ -0,0 +1,318 @@
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from chat_ai.llm import TransientLLMError
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # upstream calls in flight
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))  # calls waiting for a slot before we shed load
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+# google.api_core exception names (429/500/503/504) worth retrying; matched by
+# name so the SDK stays a lazy import
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "InternalServerError",
+    "ServiceUnavailable", "DeadlineExceeded", "GatewayTimeout",
+}
+
+
+class GatewayBusy(Exception):
+    """The LLM queue is full, or a request waited too long for a slot."""
+
+
+def is_retryable(error):
+    if isinstance(error, (TransientLLMError, ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """"Full jitter" exponential backoff, so retries of a failed burst spread out."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class FairLimiter:
+    """
+    Semaphore of ``limit`` slots whose waiters queue per client and are
+    served round-robin across clients, so one client's burst cannot starve
+    everyone else. At most ``max_queue`` waiters in total; beyond that
+    ``acquire`` fails fast with ``GatewayBusy``.
+    """
+
+    def __init__(self, limit, max_queue):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self._queues = OrderedDict()  # client -> deque of waiter events, in serving order
+        self._lock = threading.Lock()
+
+    def acquire(self, client, timeout):
+        with self._lock:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise GatewayBusy("Too many queued LLM requests")
+            waiter = threading.Event()
+            self._queues.setdefault(client, deque()).append(waiter)
+            self.waiting += 1
+
+        if waiter.wait(timeout):
+            return
+        with self._lock:
+            if waiter.is_set():
+                return  # granted just as we timed out
+            queue = self._queues[client]
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[client]
+            self.waiting -= 1
+        raise GatewayBusy("Timed out waiting for an LLM slot")
+
+    def release(self):
+        with self._lock:
+            if not self._queues:
+                self.active -= 1
+                return
+            # Hand the slot straight to the next client in the rotation,
+            # which then moves to the back
+            client, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            del self._queues[client]
+            if queue:
+                self._queues[client] = queue
+            self.waiting -= 1
+            waiter.set()
+
+
+class _Call:
+    """One in-flight ``generate`` shared by every caller with the same prompt."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Broadcast:
+    """
+    One in-flight upstream stream shared by every subscriber with the same
+    prompt. Tokens are buffered so late subscribers replay from the start;
+    the upstream is cancelled once the last subscriber goes away.
+    """
+
+    def __init__(self):
+        self.tokens = []
+        self.finished = False
+        self.error = None
+        self.subscribers = 1
+        self.cancel = threading.Event()
+        self.cond = threading.Condition()
+
+    def subscribe(self):
+        with self.cond:
+            if self.cancel.is_set() or self.finished:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self.cond:
+            self.subscribers -= 1
+            if not self.subscribers and not self.finished:
+                self.cancel.set()
+
+    def push(self, token):
+        with self.cond:
+            self.tokens.append(token)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.finished = True
+            self.error = error
+            self.cond.notify_all()
+
+
+class LLMGateway:
+    """
+    Front door for every upstream LLM call (``GeminiProvider`` or the fake).
+
+    - coalescing: identical prompts already in flight join the running call
+      (or stream) instead of starting another one
+    - concurrency: at most ``max_concurrency`` upstream calls at a time; the
+      rest wait in a ``FairLimiter`` queue, round-robin per client, and are
+      shed with ``GatewayBusy`` when it is full or they wait too long
+    - retries: retryable errors (429/5xx/timeouts) are retried with jittered
+      exponential backoff; a stream only before its first token
+    """
+
+    def __init__(self, provider, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE,
+                 queue_timeout=LLM_QUEUE_TIMEOUT, max_retries=LLM_MAX_RETRIES):
+        self.provider = provider
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.limiter = FairLimiter(max_concurrency, max_queue)
+        self._calls = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "coalesced": 0, "upstream_calls": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    @staticmethod
+    def _key(prompt):
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _acquire(self, client):
+        try:
+            self.limiter.acquire(client, self.queue_timeout)
+        except GatewayBusy:
+            self._count("rejected")
+            raise
+
+    def generate(self, prompt, client=None):
+        """The full answer to ``prompt``; ``client`` identifies the caller for fair queueing."""
+        key = self._key(prompt)
+        with self._lock:
+            self._counts["requests"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._counts["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            self._acquire(client)
+            try:
+                call.result = self._with_retries(lambda: self.provider.generate(prompt))
+            finally:
+                self.limiter.release()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _with_retries(self, fn):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._count("upstream_calls")
+                return fn()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    self._count("failures")
+                    raise
+                delay = backoff_delay(attempt)
+                self._count("retries")
+                logger.warning(f"LLM call failed ({e}), retry {attempt + 1} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def stream(self, prompt, cancel_event=None, client=None):
+        """
+        Yield the answer to ``prompt`` as it is generated. Closing the
+        generator or setting ``cancel_event`` unsubscribes; the upstream
+        stream stops once no subscriber is left.
+        """
+        key = self._key(prompt)
+        with self._lock:
+            self._counts["requests"] += 1
+            flight = self._streams.get(key)
+            leader = flight is None or not flight.subscribe()
+            if leader:
+                flight = self._streams[key] = _Broadcast()
+            else:
+                self._counts["coalesced"] += 1
+
+        if leader:
+            try:
+                self._acquire(client)
+            except GatewayBusy as e:
+                with self._lock:
+                    if self._streams.get(key) is flight:
+                        del self._streams[key]
+                flight.finish(e)
+                raise
+            threading.Thread(
+                target=self._pump, args=(key, flight, prompt), name="llm-stream", daemon=True
+            ).start()
+
+        position = 0
+        try:
+            while True:
+                with flight.cond:
+                    while position == len(flight.tokens) and not flight.finished:
+                        if cancel_event is not None and cancel_event.is_set():
+                            return
+                        flight.cond.wait(0.1)
+                    new = flight.tokens[position:]
+                    finished, error = flight.finished, flight.error
+                position += len(new)
+                yield from new
+                if finished and position == len(flight.tokens):
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            flight.unsubscribe()
+
+    def _pump(self, key, flight, prompt):
+        """Run one upstream stream (holding a limiter slot) into ``flight``."""
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self._count("upstream_calls")
+                    for token in self.provider.stream(prompt, cancel_event=flight.cancel):
+                        flight.push(token)
+                    break
+                except Exception as e:
+                    # Once tokens went out a retry would repeat them
+                    if flight.tokens or attempt == self.max_retries or not is_retryable(e):
+                        raise
+                    delay = backoff_delay(attempt)
+                    self._count("retries")
+                    logger.warning(f"LLM stream failed ({e}), retry {attempt + 1} in {delay:.2f}s")
+                    if flight.cancel.wait(delay):
+                        break
+            flight.finish()
+        except Exception as e:
+            self._count("failures")
+            flight.finish(e)
+        finally:
+            self.limiter.release()
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts.update(
+            in_flight=self.limiter.active,
+            queued=self.limiter.waiting,
+            max_concurrency=self.limiter.limit,
+            max_queue=self.limiter.max_queue,
+        )
+        return counts
@@ -0,0 +1,54 @@
+import heapq
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+SEARCH_WORKERS = int(os.getenv("CHAT_SEARCH_WORKERS", "16"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="chat-search")
+    return _executor
+
+
+def search_stores(stores, embedding, k=4, filters=None):
+    """
+    Top ``k`` ``(Document, distance)`` pairs across several ChunkStores.
+
+    Each store is searched on a shared thread pool (FAISS releases the GIL
+    while searching, so the searches really run side by side), the per-store
+    hits are merged with a heap on distance, and chunk text is then fetched
+    only for the ``k`` winners instead of ``k`` per store. Searches and
+    fetches go through one snapshot per store, so a document being indexed
+    meanwhile cannot tear the results.
+    """
+    with ExitStack() as stack:
+        snapshots = [stack.enter_context(store.snapshot()) for store in stores]
+        snapshots = [s for s in snapshots if s is not None]
+        if not snapshots:
+            return []
+        if len(snapshots) == 1:
+            results = [snapshots[0].search_ids(embedding, k, filters)]
+        else:
+            futures = [_get_executor().submit(s.search_ids, embedding, k, filters) for s in snapshots]
+            results = [future.result() for future in futures]
+
+        best = heapq.nsmallest(
+            k,
+            ((score, n, i) for n, hits in enumerate(results) for i, score in hits),
+        )
+
+        wanted = defaultdict(list)
+        for _, n, i in best:
+            wanted[n].append(i)
+        docs = {n: snapshots[n].get_documents(ids) for n, ids in wanted.items()}
+    return [(docs[n][i], score) for score, n, i in best if i in docs[n]]
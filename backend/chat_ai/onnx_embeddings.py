@@ -0,0 +1,151 @@
+"""
+ONNX Runtime backend for the all-MiniLM-L6-v2 chat embeddings.
+
+Runs an exported (and by default int8-quantized) copy of the same model the
+indexes are built with, without PyTorch at serving time. Export once on a
+machine with ``torch`` and ``transformers`` installed:
+
+    python -m chat_ai.onnx_embeddings --out models/all-MiniLM-L6-v2-onnx
+
+then serve with ``EMBEDDING_BACKEND=onnx`` (needs ``onnxruntime`` and
+``tokenizers``, see requirements-onnx.txt). ``benchmarks/embedding_benchmark.py``
+measures speed and cosine agreement with the PyTorch model, and
+tests/test_onnx_embeddings.py checks the agreement when the model is exported.
+"""
+import argparse
+import logging
+import os
+import sys
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+MAX_SEQ_LENGTH = 256  # sentence-transformers' max_seq_length for this model
+
+
+class OnnxEncoder:
+    """
+    Drop-in for ``SentenceTransformer.encode`` on an exported MiniLM:
+    mean pooling over the attention mask followed by L2 normalization,
+    exactly like the sentence-transformers pipeline of the model.
+
+    Inputs are sorted by token length before batching so each batch is
+    padded only to its own longest text, and results are returned in the
+    original order. ``threads`` sets ONNX Runtime's intra-op thread count
+    (0 lets it use every core).
+    """
+
+    def __init__(self, model_dir, quantized=True, threads=0, max_length=MAX_SEQ_LENGTH):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(
+                f"{model_file} not found, export it with: python -m chat_ai.onnx_embeddings --out {model_dir}"
+            )
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.no_padding()
+        self.pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        logger.info(f"Loaded ONNX embedding model {model_file} ({threads or 'all'} threads)")
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        order = sorted(range(len(encodings)), key=lambda i: len(encodings[i].ids))
+        output = None
+
+        for start in range(0, len(order), batch_size):
+            batch = [encodings[i] for i in order[start:start + batch_size]]
+            width = max(len(e.ids) for e in batch)
+            input_ids = np.full((len(batch), width), self.pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+            for row, encoding in enumerate(batch):
+                input_ids[row, :len(encoding.ids)] = encoding.ids
+                attention_mask[row, :len(encoding.ids)] = 1
+
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+            if output is None:
+                output = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            output[order[start:start + batch_size]] = pooled
+        return output if output is not None else np.empty((0, 0), dtype=np.float32)
+
+
+def cosine_agreement(reference, candidate):
+    """Row-wise cosine similarity between two embedding matrices, summarized."""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    cosines = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {"min": float(cosines.min()), "mean": float(cosines.mean())}
+
+
+def export_onnx(output_dir, model_name=MODEL_NAME, quantize=True, opset=14):
+    """Export ``model_name`` to ONNX (plus an int8 copy) with its tokenizer."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(output_dir)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["An example chunk of a PDF page."], return_tensors="pt")
+    inputs = ["input_ids", "attention_mask", "token_type_ids"]
+    model_file = os.path.join(output_dir, MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in inputs),
+            model_file,
+            input_names=inputs,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in inputs + ["last_hidden_state"]},
+            opset_version=opset,
+        )
+    logger.info(f"Exported {model_name} to {model_file}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_file = os.path.join(output_dir, QUANTIZED_MODEL_FILE)
+        quantize_dynamic(model_file, quantized_file, weight_type=QuantType.QInt8)
+        logger.info(f"Wrote int8 model {quantized_file}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the chat embedding model to ONNX")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 copy")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    export_onnx(args.out, args.model, quantize=not args.no_quantize)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+PAGES_PER_TASK = 50
+PARALLEL_MIN_PAGES = 64  # below this the pool start-up costs more than it saves
+MAX_WORKERS = int(os.getenv("PDF_LOADER_WORKERS", "0")) or os.cpu_count() or 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    # spawn, not fork: the web process has live threads (embedding batcher,
+    # request handlers) that a forked child would inherit in a broken state
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+
+def page_count(path):
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def extract_page_range(path, start, stop):
+    """
+    Extract text blocks of pages ``[start, stop)``. Runs in a worker process,
+    so it only returns plain tuples: ``[(page_number, [(bbox, text), ...]), ...]``
+    with blocks in reading order.
+    """
+    pages = []
+    with fitz.open(path) as doc:
+        for page_number in range(start, min(stop, doc.page_count)):
+            blocks = []
+            # (x0, y0, x1, y1, text, block_no, block_type); type 1 is an image
+            for x0, y0, x1, y1, text, _, block_type in doc[page_number].get_text("blocks", sort=True):
+                text = text.strip()
+                if block_type == 0 and text:
+                    blocks.append(((round(x0, 1), round(y0, 1), round(x1, 1), round(y1, 1)), text))
+            pages.append((page_number, blocks))
+    return pages
+
+
+def iter_pages(path, workers=MAX_WORKERS):
+    """
+    Yield ``(page_number, blocks)`` in page order, extracted in ranges of
+    ``PAGES_PER_TASK`` pages. For large documents the ranges run in parallel
+    and each is yielded as soon as it and the ones before it are done.
+    """
+    total = page_count(path)
+    ranges = [(start, min(start + PAGES_PER_TASK, total)) for start in range(0, total, PAGES_PER_TASK)]
+    if workers <= 1 or total < PARALLEL_MIN_PAGES:
+        for start, stop in ranges:
+            yield from extract_page_range(path, start, stop)
+        return
+
+    results = _get_pool().map(
+        extract_page_range, [path] * len(ranges), [r[0] for r in ranges], [r[1] for r in ranges]
+    )
+    for pages in results:
+        yield from pages
+
+
+def make_splitter(chunk_size=1000, chunk_overlap=200):
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+
+
+def split_page(splitter, source, page_number, blocks):
+    """
+    Split one page's ``blocks`` into chunk Documents carrying ``source``,
+    ``page`` and the ``bbox`` of every text block they were cut from, under
+    ``blocks`` (empty for formats without layout).
+    """
+    if not blocks:
+        return []
+
+    # Character offset at which each block starts in the page text
+    offsets = []
+    position = 0
+    for _, text in blocks:
+        offsets.append(position)
+        position += len(text) + 1
+    page_text = "\n".join(text for _, text in blocks)
+
+    chunks = splitter.create_documents([page_text], metadatas=[{"source": source, "page": page_number}])
+    for chunk in chunks:
+        start = chunk.metadata.pop("start_index", -1)
+        end = start + len(chunk.page_content)
+        chunk.metadata["blocks"] = [
+            list(bbox) for (bbox, text), offset in zip(blocks, offsets)
+            if bbox is not None and start >= 0 and offset < end and offset + len(text) > start
+        ]
+    return chunks
+
+
+def load_pdf_chunks(path, chunk_size=1000, chunk_overlap=200, workers=MAX_WORKERS):
+    """
+    Drop-in replacement for ``PyPDFLoader(path).load()`` followed by
+    ``RecursiveCharacterTextSplitter.split_documents``, built on PyMuPDF.
+
+    Each page is split on its own (as before, chunks never span pages), so
+    at most one page of text is held as a string at a time.
+    """
+    splitter = make_splitter(chunk_size, chunk_overlap)
+    chunks = []
+    for page_number, blocks in iter_pages(path, workers):
+        chunks.extend(split_page(splitter, path, page_number, blocks))
+    return chunks
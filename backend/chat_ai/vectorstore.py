@@ -0,0 +1,1199 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishing is only serialized within one process
+    fcntl = None
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite"
+DELTA_CHUNKS_FILE = "delta.sqlite"
+DELTA_INDEX_FILE = "delta.faiss"
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+WRITE_LOCK_FILE = "write.lock"
+STALE_WRITE_SECONDS = 3600  # temp dirs of unfinished writes older than this are crash leftovers
+COMPACT_THRESHOLD = 0.2  # compact once 20% of stored vectors are tombstones
+# Small writes only copy a delta; it is folded into a new full version once it
+# holds this share of the base's chunks (and more than the minimum)
+DELTA_FOLD_FRACTION = float(os.getenv("CHAT_INDEX_DELTA_FRACTION", "0.1"))
+DELTA_FOLD_MIN_CHUNKS = 2000
+
+# Vector encoding for new indexes: "flat" (exact float32), "sq8" (int8 scalar
+# quantization, 4x smaller), "hnsw" (graph search over float32 vectors),
+# "ivfpq" (inverted lists + product quantization, ~32x smaller and
+# sub-linear search, for large collections) or "auto".
+#
+# "auto" picks the structure from the number of live vectors:
+#
+#   < AUTO_HNSW_MIN_VECTORS (10k)   flat   exact; scanning 10k MiniLM vectors
+#                                          takes ~1ms, nothing to tune
+#   < AUTO_IVF_MIN_VECTORS (250k)   hnsw   ~log(n) per query and ~0.95+ recall
+#                                          at efSearch 64, but keeps full
+#                                          float32 vectors plus graph links
+#   otherwise                       ivfpq  ~50 bytes per vector, so millions
+#                                          of chunks still fit in memory
+#
+# and re-encodes a store in the background once it grows into the next tier.
+INDEX_TYPE = os.getenv("CHAT_INDEX_TYPE", "auto").lower()
+AUTO_HNSW_MIN_VECTORS = int(os.getenv("CHAT_INDEX_HNSW_MIN_VECTORS", "10000"))
+AUTO_IVF_MIN_VECTORS = int(os.getenv("CHAT_INDEX_IVF_MIN_VECTORS", "250000"))
+IVF_NPROBE = int(os.getenv("CHAT_INDEX_NPROBE", "16"))
+HNSW_M = 32  # graph links per vector
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = int(os.getenv("CHAT_INDEX_EF_SEARCH", "64"))  # candidate list size per query
+PQ_MIN_TRAINING = 256 * 39  # FAISS wants ~39 points per centroid of the 256-entry PQ codebooks
+TRAINING_SAMPLE = 50000
+MIGRATION_ATTEMPTS = 3  # background re-encodes retried when the store changed meanwhile
+RECALL_SAMPLE = 200
+RECALL_K = 10
+RECALL_FILE = "recall.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    chunk_key TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    page INTEGER,
+    doc_type TEXT
+);
+CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks (doc_id);
+CREATE TABLE IF NOT EXISTS tombstones (id INTEGER PRIMARY KEY);
+"""
+
+# Filterable columns, added to sidecars created before they existed
+FILTER_COLUMNS = {"page": "INTEGER", "doc_type": "TEXT"}
+CHUNK_COLUMNS = "id, chunk_key, doc_id, text, metadata, embedding, page, doc_type"
+LIVE_VIEW = "CREATE TEMP VIEW live AS SELECT * FROM chunks WHERE id NOT IN (SELECT id FROM tombstones)"
+
+
+def _version_name(number):
+    return f"{number:08d}"
+
+
+class _StoreChanged(Exception):
+    """Another writer published a version after the one a write was prepared against."""
+
+
+def chunk_key(doc_id, page, ordinal):
+    """Stable, human-readable chunk id: document hash + page + chunk ordinal."""
+    return f"{doc_id}:{page}:{ordinal}"
+
+
+def chunk_int_id(key):
+    """Map a chunk key to the positive int64 id stored in the FAISS IDMap."""
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def prepare_chunks(doc_id, documents, ordinals=None):
+    """
+    Assign chunk keys (page + ordinal within the page) to ``documents`` and
+    return ``(int_id, Document)`` pairs. Pass the same ``ordinals`` dict to
+    successive calls when one document arrives in several batches.
+    """
+    ordinals = defaultdict(int) if ordinals is None else ordinals
+    prepared = []
+    for doc in documents:
+        page = doc.metadata.get("page", 0)
+        key = chunk_key(doc_id, page, ordinals[page])
+        ordinals[page] += 1
+        metadata = dict(doc.metadata, doc_id=doc_id, chunk_id=key)
+        prepared.append((chunk_int_id(key), Document(page_content=doc.page_content, metadata=metadata)))
+    return prepared
+
+
+def resolve_index_type(index_type, count):
+    """
+    The concrete index type ``index_type`` means for ``count`` vectors:
+    applies the "auto" thresholds, and falls back from "ivfpq" to "sq8"
+    while there are too few vectors to train PQ codebooks.
+    """
+    if index_type == "auto":
+        if count < AUTO_HNSW_MIN_VECTORS:
+            return "flat"
+        index_type = "hnsw" if count < AUTO_IVF_MIN_VECTORS else "ivfpq"
+    if index_type == "ivfpq" and count < PQ_MIN_TRAINING:
+        return "sq8"
+    return index_type
+
+
+def index_description(index_type, dim, count):
+    """``faiss.index_factory`` string for ``index_type`` holding ``count`` vectors."""
+    index_type = resolve_index_type(index_type, count)
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M},Flat"
+    if index_type == "ivfpq":
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        # 8 dimensions per sub-quantizer (48 x 1 byte per MiniLM vector)
+        m = next(m for m in (dim // 8, dim // 4, dim // 2, dim) if m and dim % m == 0)
+        return f"IVF{nlist},PQ{m}"
+    if index_type != "flat":
+        logger.warning(f"Unknown index type {index_type!r}, using flat")
+    return "Flat"
+
+
+def index_kind(index):
+    """The index type ("flat", "sq8", "hnsw" or "ivfpq") of a built index."""
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivfpq"
+    inner = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap2) else index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "sq8"
+    return "flat"
+
+
+def supports_remove(index):
+    """HNSW graphs cannot drop vectors; those stores are re-encoded instead."""
+    return index_kind(index) != "hnsw"
+
+
+def try_extract_hnsw(index):
+    """The ``faiss.HNSW`` graph of an (id-mapped) HNSW index, like ``faiss.try_extract_index_ivf``."""
+    inner = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap2) else index)
+    return inner.hnsw if isinstance(inner, faiss.IndexHNSW) else None
+
+
+def create_index(vectors, index_type=INDEX_TYPE):
+    """New empty index of ``index_type`` accepting our int64 ids, trained on ``vectors`` if needed."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    description = index_description(index_type, vectors.shape[1], len(vectors))
+    inner = faiss.index_factory(vectors.shape[1], description, faiss.METRIC_L2)
+    if not inner.is_trained:
+        sample = vectors
+        if len(vectors) > TRAINING_SAMPLE:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), TRAINING_SAMPLE, replace=False)]
+        inner.train(sample)
+    hnsw = try_extract_hnsw(inner)
+    if hnsw is not None:
+        hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    # IVF indexes store our ids natively; IndexIDMap2's id remapping on
+    # remove_ids assumes an index that shifts positions, which IVF does not
+    index = inner if faiss.try_extract_index_ivf(inner) is not None else faiss.IndexIDMap2(inner)
+    return configure_search(index)
+
+
+def configure_search(index):
+    """Apply search-time parameters (IVF lists probed, HNSW candidates per query)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = IVF_NPROBE
+    hnsw = try_extract_hnsw(index)
+    if hnsw is not None:
+        hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def filter_values(metadata):
+    """``(page, doc_type)`` columns of a chunk; the type defaults to the source file's extension."""
+    doc_type = metadata.get("doc_type") or os.path.splitext(metadata.get("source", ""))[1].lstrip(".").lower()
+    return metadata.get("page"), doc_type or None
+
+
+def read_index_mmap(path):
+    """
+    Open a FAISS index memory-mapped and read-only, so vector pages are
+    loaded lazily and shared between worker processes via the page cache.
+    """
+    try:
+        return configure_search(faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY))
+    except RuntimeError as e:
+        logger.warning(f"mmap load failed for {path}, reading into memory: {e}")
+        return configure_search(faiss.read_index(path))
+
+
+def pack_text(text):
+    """zlib-compress a sidecar text/JSON value."""
+    return zlib.compress(text.encode("utf-8"))
+
+
+def unpack_text(value):
+    """Inverse of ``pack_text``; rows written before compression are plain TEXT."""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
+
+def migrate_schema(conn):
+    """Add the filter columns to a sidecar created before they existed."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+    missing = [name for name in FILTER_COLUMNS if name not in columns]
+    for name in missing:
+        conn.execute(f"ALTER TABLE chunks ADD COLUMN {name} {FILTER_COLUMNS[name]}")
+    if missing:
+        rows = conn.execute("SELECT id, metadata FROM chunks").fetchall()
+        conn.executemany(
+            "UPDATE chunks SET page = ?, doc_type = ? WHERE id = ?",
+            [(*filter_values(json.loads(unpack_text(metadata))), i) for i, metadata in rows],
+        )
+    conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc_page ON chunks (doc_id, page)")
+
+
+def _existing_ids(conn, ids, table="chunks"):
+    found = set()
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        placeholders = ",".join("?" * len(batch))
+        rows = conn.execute(f"SELECT id FROM {table} WHERE id IN ({placeholders})", batch)
+        found.update(row[0] for row in rows)
+    return found
+
+
+def _live_vectors(conn):
+    """``(ids, vectors)`` of every live chunk (the ``live`` view), from the raw embeddings in the sidecar."""
+    rows = conn.execute("SELECT id, embedding FROM live ORDER BY id").fetchall()
+    if not rows:
+        return np.empty(0, dtype=np.int64), None
+    return _id_vectors(rows)
+
+
+def _chunk_rows(items):
+    """Sidecar rows (``CHUNK_COLUMNS``) for ``(int_id, Document, vector)`` triples."""
+    return [
+        (i, d.metadata["chunk_id"], d.metadata["doc_id"], pack_text(d.page_content),
+         pack_text(json.dumps(d.metadata)), np.asarray(v, dtype=np.float32).tobytes(),
+         *filter_values(d.metadata))
+        for i, d, v in items
+    ]
+
+
+def _id_vectors(pairs):
+    """``(ids, vectors)`` arrays from ``(id, embedding blob)`` pairs."""
+    pairs = list(pairs)
+    ids = np.array([i for i, _ in pairs], dtype=np.int64)
+    return ids, np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in pairs])
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:  # other filesystem, or links not supported
+        shutil.copyfile(src, dst)
+
+
+def _search(index, query_vector, k, params=None):
+    """``[(int_id, distance), ...]`` from one FAISS index."""
+    scores, ids = index.search(query_vector, k, params=params)
+    return [(int(i), float(score)) for score, i in zip(scores[0], ids[0]) if i != -1]
+
+
+class Snapshot:
+    """
+    One published version of a store: its mmapped index plus a read-only
+    connection to its sidecar, and the version's delta (see ``_DeltaDraft``)
+    if it has one. A version never changes once published, so searches run
+    without any lock and a reader sees the same chunks from its first
+    search to its last document fetch.
+
+    Reference counted: the store holds one reference while the version is
+    current and every reader holds one while using it. A superseded
+    ("retired") version's files are deleted when its last reader is done.
+    """
+
+    def __init__(self, path, name, previous=None):
+        self.path = path
+        self.name = name
+        db_file = os.path.abspath(os.path.join(path, CHUNKS_FILE))
+        self._conn = sqlite3.connect(
+            f"file:{quote(db_file)}?mode=ro&immutable=1", uri=True, check_same_thread=False
+        )
+        self._conn_lock = threading.Lock()
+        tombstones = {row[0] for row in self._conn.execute("SELECT id FROM main.tombstones")}
+        self.count = self._conn.execute("SELECT COUNT(*) FROM main.chunks").fetchone()[0]
+
+        # Live chunks: the base's, minus those tombstoned there or by the delta, plus the delta's
+        live = f"SELECT {CHUNK_COLUMNS} FROM main.chunks WHERE id NOT IN (SELECT id FROM main.tombstones)"
+        delta_file = os.path.abspath(os.path.join(path, DELTA_CHUNKS_FILE))
+        self.has_delta = os.path.exists(delta_file)
+        self.delta_count = 0
+        self.delta_index = None
+        if self.has_delta:
+            self._conn.execute("ATTACH DATABASE ? AS delta", (f"file:{quote(delta_file)}?mode=ro&immutable=1",))
+            tombstones.update(row[0] for row in self._conn.execute("SELECT id FROM delta.tombstones"))
+            self.delta_count = self._conn.execute("SELECT COUNT(*) FROM delta.chunks").fetchone()[0]
+            self.delta_index = read_index_mmap(os.path.join(path, DELTA_INDEX_FILE))
+            live += (" AND id NOT IN (SELECT id FROM delta.tombstones)"
+                     f" UNION ALL SELECT {CHUNK_COLUMNS} FROM delta.chunks")
+        self._conn.execute(f"CREATE TEMP VIEW live AS {live}")
+        # Base chunks whose vectors in ``index`` are dead
+        self.tombstones = frozenset(tombstones)
+        self._tombstone_ids = np.array(sorted(tombstones), dtype=np.int64)
+
+        index_file = os.path.join(path, INDEX_FILE)
+        self.index = None
+        self._index_inode = os.stat(index_file).st_ino if os.path.exists(index_file) else None
+        if self._index_inode is not None:
+            # Hard-linked unchanged from ``previous`` (a delta write): share its read-only index
+            shared = previous.index if previous is not None and previous._index_inode == self._index_inode else None
+            self.index = shared if shared is not None else read_index_mmap(index_file)
+
+        self._refs = 1
+        self._refs_lock = threading.Lock()
+        self._retired = False
+
+    def acquire(self):
+        """Take a reader reference; False if the snapshot has already been released."""
+        with self._refs_lock:
+            if not self._refs:
+                return False
+            self._refs += 1
+            return True
+
+    def release(self):
+        with self._refs_lock:
+            self._refs -= 1
+            if self._refs:
+                return
+        self._conn.close()
+        self.index = None
+        self.delta_index = None
+        if self._retired:
+            shutil.rmtree(self.path, ignore_errors=True)
+            logger.debug(f"Reclaimed index version {self.path}")
+
+    def retire(self):
+        """Drop the store's reference to a superseded version."""
+        self._retired = True
+        self.release()
+
+    @property
+    def ntotal(self):
+        """Number of live (non-tombstoned) chunks."""
+        return self.count - len(self.tombstones) + self.delta_count
+
+    def document_ids(self):
+        with self._conn_lock:
+            rows = self._conn.execute("SELECT DISTINCT doc_id FROM live").fetchall()
+        return {row[0] for row in rows}
+
+    def has_document(self, doc_id):
+        with self._conn_lock:
+            return self._conn.execute("SELECT 1 FROM live WHERE doc_id = ? LIMIT 1", (doc_id,)).fetchone() is not None
+
+    def existing_ids(self, ids):
+        """Those of ``ids`` that are live chunks."""
+        with self._conn_lock:
+            return _existing_ids(self._conn, ids, "live")
+
+    def live_vectors(self):
+        with self._conn_lock:
+            return _live_vectors(self._conn)
+
+    def get_vectors(self, doc_id):
+        """Return ``(int_id, Document, vector)`` for every live chunk of ``doc_id``."""
+        with self._conn_lock:
+            rows = self._conn.execute(
+                "SELECT id, text, metadata, embedding FROM live WHERE doc_id = ?", (doc_id,)
+            ).fetchall()
+        return [
+            (i, Document(page_content=unpack_text(text), metadata=json.loads(unpack_text(metadata))),
+             np.frombuffer(blob, dtype=np.float32))
+            for i, text, metadata, blob in rows
+        ]
+
+    def get_documents(self, ids):
+        """Fetch chunk documents by id from the sidecar, as a dict."""
+        docs = {}
+        with self._conn_lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, text, metadata FROM live WHERE id IN ({placeholders})", batch
+                )
+                for i, text, metadata in rows:
+                    docs[i] = Document(page_content=unpack_text(text), metadata=json.loads(unpack_text(metadata)))
+        return docs
+
+    def filter_ids(self, doc_ids=None, page_from=None, page_to=None, doc_type=None):
+        """
+        Live chunk ids matching every given condition (pages are 0-based and
+        inclusive, as in chunk metadata).
+        """
+        clauses, params = ["1"], []
+        if doc_ids:
+            clauses.append(f"doc_id IN ({','.join('?' * len(doc_ids))})")
+            params.extend(doc_ids)
+        if page_from is not None:
+            clauses.append("page >= ?")
+            params.append(page_from)
+        if page_to is not None:
+            clauses.append("page <= ?")
+            params.append(page_to)
+        if doc_type:
+            clauses.append("doc_type = ?")
+            params.append(doc_type.lower())
+        with self._conn_lock:
+            rows = self._conn.execute(f"SELECT id FROM live WHERE {' AND '.join(clauses)}", params)
+            return np.fromiter((row[0] for row in rows), dtype=np.int64)
+
+    def search_ids(self, embedding, k=4, filters=None):
+        """
+        ``[(int_id, distance), ...]`` of the ``k`` nearest live chunks, from
+        the index and the delta's index merged by distance.
+
+        ``filters`` (keyword arguments of ``filter_ids``) are applied inside
+        FAISS through an ID selector, so the k results are the best matching
+        chunks rather than whatever survives filtering the global top k.
+        """
+        if self.ntotal == 0:
+            return []
+        query_vector = np.asarray([embedding], dtype=np.float32)
+        has_delta = self.delta_index is not None and self.delta_index.ntotal > 0
+        hits = []
+
+        if filters:
+            allowed = self.filter_ids(**filters)
+            if not len(allowed):
+                return []
+            if self.index is not None:
+                # A chunk the delta replaced is live, but not its old vector here
+                base_allowed = np.setdiff1d(allowed, self._tombstone_ids)
+                if len(base_allowed):
+                    hits += _search(self.index, query_vector, min(k, len(base_allowed)),
+                                    self._search_params(self.index, base_allowed))
+            if has_delta:
+                hits += _search(self.delta_index, query_vector, min(k, self.delta_index.ntotal),
+                                self._search_params(self.delta_index, allowed))
+            return sorted(hits, key=lambda hit: hit[1])[:k]
+
+        if self.index is not None and self.index.ntotal:
+            # Over-fetch so tombstoned hits can be dropped without losing results
+            fetch = min(k + len(self.tombstones), self.index.ntotal)
+            hits += [hit for hit in _search(self.index, query_vector, fetch) if hit[0] not in self.tombstones][:k]
+        if has_delta:
+            hits += _search(self.delta_index, query_vector, min(k, self.delta_index.ntotal))
+        return sorted(hits, key=lambda hit: hit[1])[:k]
+
+    @staticmethod
+    def _search_params(index, allowed):
+        selector = faiss.IDSelectorBatch(allowed)
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            # Explicit params replace the index's own nprobe
+            return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+        hnsw = try_extract_hnsw(index)
+        if hnsw is not None:
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+        return faiss.SearchParameters(sel=selector)
+
+
+class _Draft:
+    """
+    The next version of a store, written in full in a private directory: a
+    copy of the base version's sidecar with its delta (or ``delta``, a
+    connection to a ``_DeltaDraft``'s) folded in and, once a write needs
+    it, an in-memory copy of its index. Rows go to the sidecar as they
+    come; the index changes they imply are applied in one go, in ``save``.
+
+    A store's first vectors only go to the sidecar; its index is created in
+    ``save``, once their count (which "auto" picks the type from) is known
+    and a quantizer can be trained on all of them rather than on the first
+    batch of a streamed build.
+    """
+
+    def __init__(self, path, base, index_type, delta=None):
+        self.path = path
+        self.base = base
+        self.index_type = index_type
+        self.conn = sqlite3.connect(os.path.join(path, CHUNKS_FILE))
+        if base is not None:
+            with base._conn_lock:
+                base._conn.backup(self.conn)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(LIVE_VIEW)
+        self.tombstones = {row[0] for row in self.conn.execute("SELECT id FROM tombstones")}
+        self.count = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        self.index = None  # set once the index itself changes
+        self._pending = {}  # id -> embedding of rows not in the index yet
+        self._stale = set()  # ids whose vector in the index was replaced
+
+        if delta is not None:
+            self._fold(delta, "main")
+        elif base is not None and base.has_delta:
+            with base._conn_lock:
+                self._fold(base._conn, "delta")
+
+    def _fold(self, conn, schema):
+        """Apply a delta's tombstones and rows (database ``schema`` of ``conn``)."""
+        dead = [row[0] for row in conn.execute(f"SELECT id FROM {schema}.tombstones")]
+        self.conn.executemany("INSERT OR IGNORE INTO tombstones (id) VALUES (?)", [(i,) for i in dead])
+        self.tombstones.update(dead)
+        rows = conn.execute(f"SELECT {CHUNK_COLUMNS} FROM {schema}.chunks").fetchall()
+        if rows:
+            self._add_rows(rows)
+
+    def current_index(self):
+        return self.index if self.index is not None else (self.base.index if self.base is not None else None)
+
+    def writable_index(self):
+        """In-memory copy of the base index we can modify."""
+        if self.index is None:
+            self.index = configure_search(faiss.read_index(os.path.join(self.base.path, INDEX_FILE)))
+        return self.index
+
+    def add(self, items):
+        """Insert ``(int_id, Document, vector)`` triples."""
+        self._add_rows(_chunk_rows(items))
+
+    def _add_rows(self, rows):
+        ids = [row[0] for row in rows]
+        # Re-adding an existing chunk: its old vector leaves the index
+        stale = _existing_ids(self.conn, ids)
+        self.conn.executemany(f"INSERT OR REPLACE INTO chunks ({CHUNK_COLUMNS}) VALUES ({', '.join('?' * 8)})", rows)
+        self.conn.executemany("DELETE FROM tombstones WHERE id = ?", [(i,) for i in stale])
+        self.tombstones.difference_update(stale)
+        self.count += len(ids) - len(stale)
+        self._stale.update(stale)
+        self._pending.update((row[0], row[5]) for row in rows)
+
+    def _update_index(self):
+        """Apply the queued index changes: remove replaced vectors, add new ones."""
+        if not self._pending and not self._stale:
+            return
+        if self._stale and not supports_remove(self.current_index()):
+            self.reencode()
+            return
+        index = self.writable_index()
+        if self._stale:
+            index.remove_ids(np.array(sorted(self._stale), dtype=np.int64))
+        if self._pending:
+            ids, vectors = _id_vectors(self._pending.items())
+            index.add_with_ids(vectors, ids)
+        self._pending.clear()
+        self._stale.clear()
+
+    def delete_document(self, doc_id):
+        """Tombstone every live chunk of ``doc_id``; returns how many."""
+        ids = [row[0] for row in self.conn.execute("SELECT id FROM live WHERE doc_id = ?", (doc_id,))]
+        self.conn.executemany("INSERT OR IGNORE INTO tombstones (id) VALUES (?)", [(i,) for i in ids])
+        self.tombstones.update(ids)
+        return len(ids)
+
+    def install(self, index, count):
+        """Replace the index with a fresh one holding only the live vectors."""
+        self.index = index
+        self.conn.execute("DELETE FROM chunks WHERE id IN (SELECT id FROM tombstones)")
+        self.conn.execute("DELETE FROM tombstones")
+        self.count = count
+        self.tombstones.clear()
+        self._pending.clear()
+        self._stale.clear()
+        logger.info(f"Rebuilt index as {index_kind(index)} ({count} vectors)")
+
+    def reencode(self):
+        """Re-encode every live vector into a fresh index of ``index_type``, trained on the full set."""
+        ids, vectors = _live_vectors(self.conn)
+        if not len(ids):
+            return
+        index = create_index(vectors, self.index_type)
+        index.add_with_ids(vectors, ids)
+        self.install(index, len(ids))
+
+    def compact(self):
+        """Physically remove tombstoned vectors from the index and the sidecar."""
+        if not self.tombstones:
+            return
+        if self.current_index() is None or not supports_remove(self.current_index()):
+            self.reencode()
+            return
+        self._update_index()
+        ids = sorted(self.tombstones)
+        removed = self.writable_index().remove_ids(np.array(ids, dtype=np.int64))
+        self.conn.execute("DELETE FROM chunks WHERE id IN (SELECT id FROM tombstones)")
+        self.conn.execute("DELETE FROM tombstones")
+        self.count -= len(ids)
+        self.tombstones.clear()
+        logger.debug(f"Compacted {removed} tombstoned chunks")
+
+    def save(self):
+        """
+        Commit the sidecar and write the index; an unchanged index is
+        hard-linked from the base version instead of copied.
+        """
+        if self.current_index() is None:
+            if self.count:
+                self.reencode()  # a store's first vectors: type and training from all of them
+        else:
+            self._update_index()
+        self.conn.commit()
+        self.conn.close()
+        index_file = os.path.join(self.path, INDEX_FILE)
+        if self.index is not None:
+            faiss.write_index(self.index, index_file)
+        elif self.base is not None and self.base.index is not None:
+            _link_or_copy(os.path.join(self.base.path, INDEX_FILE), index_file)
+
+
+class _DeltaDraft:
+    """
+    The next version of a store as a small change to the base version's
+    own base: ``chunks.sqlite`` and ``index.faiss`` are hard-linked
+    unchanged, and only the delta is copied and modified. The delta is
+    ``delta.sqlite`` (chunks added since the base was written, and, as
+    tombstones, the base chunks they replace or that were deleted) plus
+    ``delta.faiss``, a flat index of the delta's vectors. Adding a document
+    to a large collection then costs I/O proportional to the delta, not
+    the corpus.
+
+    ``save`` folds the delta into a full new version (a ``_Draft``) once it
+    holds more than ``DELTA_FOLD_FRACTION`` of the base's chunks, or when a
+    delete asked to ``compact``; each fold costs O(corpus), which bounds it
+    to once per that much growth.
+    """
+
+    def __init__(self, path, base, index_type):
+        self.path = path
+        self.base = base
+        self.index_type = index_type
+        self.conn = sqlite3.connect(os.path.join(path, DELTA_CHUNKS_FILE))
+        if base.has_delta:
+            with base._conn_lock:
+                base._conn.backup(self.conn, name="delta")
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(SCHEMA)
+        self.tombstones = set(base.tombstones)  # base chunks hidden by the base or the delta
+        self.count = base.count
+        if base.has_delta:
+            self.index = faiss.read_index(os.path.join(base.path, DELTA_INDEX_FILE))
+        else:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(base.index.d))
+        self.fold = False
+
+    def add(self, items):
+        """Insert ``(int_id, Document, vector)`` triples."""
+        rows = _chunk_rows(items)
+        ids, vectors = _id_vectors((row[0], row[5]) for row in rows)
+        with self.base._conn_lock:
+            replaced = _existing_ids(self.base._conn, ids.tolist(), "main.chunks") - self.tombstones
+        self.conn.executemany("INSERT OR IGNORE INTO tombstones (id) VALUES (?)", [(i,) for i in replaced])
+        self.tombstones.update(replaced)
+        self.conn.executemany(f"INSERT OR REPLACE INTO chunks ({CHUNK_COLUMNS}) VALUES ({', '.join('?' * 8)})", rows)
+        self.index.remove_ids(ids)  # re-added delta chunks: drop the old vectors
+        self.index.add_with_ids(vectors, ids)
+
+    def delete_document(self, doc_id):
+        """Tombstone the base's live chunks of ``doc_id`` and drop the delta's; returns how many."""
+        with self.base._conn_lock:
+            base_ids = [
+                row[0] for row in self.base._conn.execute("SELECT id FROM main.chunks WHERE doc_id = ?", (doc_id,))
+                if row[0] not in self.tombstones
+            ]
+        delta_ids = [row[0] for row in self.conn.execute("SELECT id FROM chunks WHERE doc_id = ?", (doc_id,))]
+        self.conn.executemany("INSERT OR IGNORE INTO tombstones (id) VALUES (?)", [(i,) for i in base_ids])
+        self.tombstones.update(base_ids)
+        self.conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+        if delta_ids:
+            self.index.remove_ids(np.array(delta_ids, dtype=np.int64))
+        return len(base_ids) + len(delta_ids)
+
+    def compact(self):
+        """Tombstones live in the base: fold in ``save`` and compact the full version."""
+        self.fold = True
+
+    def save(self):
+        delta_count = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        self.conn.commit()
+        if self.fold or delta_count > max(DELTA_FOLD_MIN_CHUNKS, DELTA_FOLD_FRACTION * self.count):
+            full = _Draft(self.path, self.base, self.index_type, delta=self.conn)
+            if self.fold:
+                full.compact()
+            full.save()
+            self.conn.close()
+            os.remove(os.path.join(self.path, DELTA_CHUNKS_FILE))
+            logger.debug(f"Folded a {delta_count}-chunk delta into {self.path}")
+            return
+        self.conn.close()
+        faiss.write_index(self.index, os.path.join(self.path, DELTA_INDEX_FILE))
+        for filename in (CHUNKS_FILE, INDEX_FILE):
+            _link_or_copy(os.path.join(self.base.path, filename), os.path.join(self.path, filename))
+
+
+class ChunkStore:
+    """
+    On-disk chunk vectorstore bound to one directory.
+
+    Vectors live in ``index.faiss`` (a flat, int8, HNSW or IVF-PQ index
+    keyed by chunk id, see ``INDEX_TYPE``) opened with the FAISS mmap
+    flags; chunk text and metadata (zlib-compressed) and the raw float32
+    embedding live in a ``chunks.sqlite`` sidecar and are fetched by id only
+    for search hits. Keeping the raw embeddings lets ``rebuild`` re-encode a
+    store with another index type without re-embedding anything.
+    Opening a store therefore costs the same regardless of corpus size, and
+    nothing is ever unpickled.
+
+    Both files are versioned copy-on-write under ``versions/<n>/``, with
+    ``CURRENT`` naming the live version. A write builds the next version in
+    a temp directory, renames it into place and atomically replaces
+    ``CURRENT``. Adds and deletes hard-link the previous version's files and
+    copy only a small delta of the chunks changed since they were written
+    (see ``_DeltaDraft``), folded into a full new version once it outgrows
+    ``DELTA_FOLD_FRACTION`` of the store; compaction and re-encodes always
+    write a full version. Readers work on the ``Snapshot``
+    they started with (see ``snapshot``), so indexing never blocks or tears
+    a search; superseded versions are deleted once their last reader is
+    done. Writes to one store are serialized, across processes too, by a
+    ``flock`` on ``write.lock``.
+
+    Every chunk is stored under the int64 id derived from its stable chunk
+    key, so documents can be appended without touching existing vectors and
+    deleted by id. Deletes only tombstone ids (filtered out at search time);
+    the vectors are physically removed in one ``remove_ids`` pass (a full
+    re-encode for HNSW, which cannot remove) once tombstones exceed
+    ``compact_threshold`` of the index.
+    """
+
+    def __init__(self, path, embeddings, compact_threshold=COMPACT_THRESHOLD, index_type=INDEX_TYPE):
+        self.path = path
+        self.embeddings = embeddings
+        self.compact_threshold = compact_threshold
+        self.index_type = index_type
+        self._lock = threading.Lock()  # guards the current snapshot pointer
+        self._write_lock = threading.RLock()
+        self._migrating = False
+        self._current = None
+        self._current_mtime = None
+        self._versions_dir = os.path.join(path, VERSIONS_DIR)
+
+        os.makedirs(self._versions_dir, exist_ok=True)
+        self._adopt_legacy()
+        self._refresh()
+        self._prune_versions()
+
+        recall_file = os.path.join(path, RECALL_FILE)
+        self.recall = None
+        if os.path.exists(recall_file):
+            with open(recall_file) as f:
+                self.recall = json.load(f)
+
+    @staticmethod
+    def exists(path):
+        if os.path.exists(os.path.join(path, CURRENT_FILE)):
+            return True
+        # Written before stores were versioned; adopted on open
+        return (
+            os.path.exists(os.path.join(path, CHUNKS_FILE))
+            and os.path.exists(os.path.join(path, INDEX_FILE))
+        )
+
+    def _adopt_legacy(self):
+        """Move a store written before versioning (files at the top level) into its first version."""
+        legacy_db = os.path.join(self.path, CHUNKS_FILE)
+        if os.path.exists(os.path.join(self.path, CURRENT_FILE)) or not os.path.exists(legacy_db):
+            return
+        conn = sqlite3.connect(legacy_db)
+        conn.executescript(SCHEMA)
+        migrate_schema(conn)
+        conn.commit()
+        conn.execute("PRAGMA journal_mode=DELETE")  # folds the WAL back into the database file
+        conn.close()
+
+        name = _version_name(1)
+        version_dir = os.path.join(self._versions_dir, name)
+        os.makedirs(version_dir, exist_ok=True)
+        for filename in (CHUNKS_FILE, INDEX_FILE):
+            if os.path.exists(os.path.join(self.path, filename)):
+                os.replace(os.path.join(self.path, filename), os.path.join(version_dir, filename))
+        self._write_current(name)
+        logger.info(f"Moved {self.path} to versioned layout")
+
+    def _prune_versions(self):
+        """Delete versions superseded in earlier processes, and temp dirs of crashed writes."""
+        current = self._current.name if self._current is not None else _version_name(0)
+        cutoff = time.time() - STALE_WRITE_SECONDS
+        for entry in os.scandir(self._versions_dir):
+            if entry.name.startswith("."):
+                stale = entry.stat().st_mtime < cutoff  # newer ones may be a write in progress
+            else:
+                stale = entry.name < current  # newer ones may have just been published elsewhere
+            if stale:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _write_current(self, name):
+        current_file = os.path.join(self.path, CURRENT_FILE)
+        with open(current_file + ".tmp", "w") as f:
+            f.write(name)
+        os.replace(current_file + ".tmp", current_file)
+
+    def _refresh(self, force=False):
+        """Open the version named by ``CURRENT`` if it is not the one in use (e.g. another process wrote)."""
+        current_file = os.path.join(self.path, CURRENT_FILE)
+        for _ in range(3):
+            try:
+                mtime = os.stat(current_file).st_mtime_ns
+                if mtime == self._current_mtime and not force:
+                    return
+                with open(current_file) as f:
+                    name = f.read().strip()
+                with self._lock:
+                    if self._current is not None and self._current.name == name:
+                        self._current_mtime = mtime
+                        return
+                snapshot = Snapshot(os.path.join(self._versions_dir, name), name, previous=self._current)
+            except FileNotFoundError:
+                return
+            except (sqlite3.Error, RuntimeError):
+                continue  # replaced and reclaimed between reading CURRENT and opening it (sqlite / faiss)
+            self._swap(snapshot, mtime)
+            return
+
+    def _swap(self, snapshot, mtime):
+        with self._lock:
+            self._current_mtime = mtime
+            if self._current is not None and self._current.name == snapshot.name:
+                old, retire = snapshot, False  # opened twice by racing refreshes; keep the first
+            else:
+                (old, self._current), retire = (self._current, snapshot), True
+        if old is not None and retire:
+            old.retire()
+        elif old is not None:
+            old.release()
+
+    @contextmanager
+    def snapshot(self):
+        """
+        The current version, held for the duration of the ``with`` block
+        (None while the store is empty): every search and fetch through it
+        sees the same chunks, whatever is written meanwhile.
+        """
+        self._refresh()
+        with self._lock:
+            snapshot = self._current
+            if snapshot is not None and not snapshot.acquire():
+                snapshot = None
+        try:
+            yield snapshot
+        finally:
+            if snapshot is not None:
+                snapshot.release()
+
+    def close(self):
+        with self._lock:
+            snapshot, self._current = self._current, None
+        if snapshot is not None:
+            snapshot.release()
+
+    @property
+    def version(self):
+        """
+        Token that changes whenever the store's contents change (the name of
+        the current version, so it survives the store being evicted and
+        reopened). Caches built on search results key on it.
+        """
+        self._refresh()
+        snapshot = self._current
+        return snapshot.name if snapshot is not None else _version_name(0)
+
+    @property
+    def ntotal(self):
+        """Number of live (non-tombstoned) chunks."""
+        snapshot = self._current
+        return snapshot.ntotal if snapshot is not None else 0
+
+    def nbytes(self):
+        """
+        Estimated private memory: the id map of the mmapped index (vector
+        pages belong to the page cache) plus HNSW graph links.
+        """
+        snapshot = self._current
+        if snapshot is None or snapshot.index is None:
+            return 0
+        per_vector = 16
+        if index_kind(snapshot.index) == "hnsw":
+            per_vector += HNSW_M * 2 * 4  # level-0 neighbour lists
+        delta = snapshot.delta_index.ntotal * 16 if snapshot.delta_index is not None else 0
+        return snapshot.index.ntotal * per_vector + delta
+
+    def describe(self):
+        """Configured and actual index type, size and the last recall measurement."""
+        with self.snapshot() as snapshot:
+            return {
+                "index_type": self.index_type,
+                "index": index_kind(snapshot.index) if snapshot is not None and snapshot.index is not None else None,
+                "version": snapshot.name if snapshot is not None else None,
+                "vectors": snapshot.ntotal if snapshot is not None else 0,
+                "tombstones": len(snapshot.tombstones) if snapshot is not None else 0,
+                "delta": snapshot.delta_count if snapshot is not None else 0,
+                "migrating": self._migrating,
+                "recall": self.recall,
+            }
+
+    def document_ids(self):
+        with self.snapshot() as snapshot:
+            return snapshot.document_ids() if snapshot is not None else set()
+
+    def get_vectors(self, doc_id):
+        """Return ``(int_id, Document, vector)`` for every live chunk of ``doc_id``."""
+        with self.snapshot() as snapshot:
+            return snapshot.get_vectors(doc_id) if snapshot is not None else []
+
+    def get_documents(self, ids):
+        """Fetch chunk documents by id from the sidecar, as a dict."""
+        with self.snapshot() as snapshot:
+            return snapshot.get_documents(ids) if snapshot is not None else {}
+
+    def filter_ids(self, doc_ids=None, page_from=None, page_to=None, doc_type=None):
+        with self.snapshot() as snapshot:
+            if snapshot is None:
+                return np.empty(0, dtype=np.int64)
+            return snapshot.filter_ids(doc_ids, page_from, page_to, doc_type)
+
+    def search_ids(self, embedding, k=4, filters=None):
+        """``Snapshot.search_ids`` on the current version."""
+        with self.snapshot() as snapshot:
+            return snapshot.search_ids(embedding, k, filters) if snapshot is not None else []
+
+    @contextmanager
+    def _publish_lock(self):
+        """
+        Exclusive across processes (and ``ChunkStore`` instances) on this
+        directory, from reading ``CURRENT`` until it names the new version:
+        two writers must never pick the same next version name.
+        """
+        with self._write_lock, open(os.path.join(self.path, WRITE_LOCK_FILE), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, apply, expected_version=None, incremental=False):
+        """
+        Copy-on-write: build the next version from the current one with
+        ``apply(draft)`` in a temp directory, then publish it. Returns what
+        ``apply`` returns. With ``expected_version``, raises ``_StoreChanged``
+        instead if the current version is another one by then.
+        ``incremental`` writes (adds and deletes) only write a delta once the
+        store has an index.
+        """
+        with self._publish_lock():
+            self._refresh(force=True)
+            with self.snapshot() as base:
+                if expected_version is not None and (base.name if base is not None else None) != expected_version:
+                    raise _StoreChanged()
+                name = _version_name(int(base.name) + 1 if base is not None else 1)
+                tmp_dir = tempfile.mkdtemp(prefix=".write-", dir=self._versions_dir)
+                try:
+                    if incremental and base is not None and base.index is not None:
+                        draft = _DeltaDraft(tmp_dir, base, self.index_type)
+                    else:
+                        draft = _Draft(tmp_dir, base, self.index_type)
+                    result = apply(draft)
+                    draft.save()
+                    version_dir = os.path.join(self._versions_dir, name)
+                    # Newer than CURRENT while we hold the lock: left by a crash before CURRENT moved
+                    shutil.rmtree(version_dir, ignore_errors=True)
+                    os.replace(tmp_dir, version_dir)
+                except BaseException:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    raise
+
+            self._write_current(name)
+            current_file = os.path.join(self.path, CURRENT_FILE)
+            self._swap(Snapshot(version_dir, name, previous=base), os.stat(current_file).st_mtime_ns)
+            return result
+
+    def add_documents(self, doc_id, documents):
+        """
+        Embed and append the chunks of one document. Chunks that are already
+        live in the store are skipped. Returns the number of chunks added.
+        """
+        prepared = prepare_chunks(doc_id, documents)
+        with self.snapshot() as snapshot:
+            if snapshot is not None:
+                existing = snapshot.existing_ids([i for i, _ in prepared])
+                prepared = [(i, d) for i, d in prepared if i not in existing]
+        if not prepared:
+            return 0
+
+        vectors = self.embeddings.embed_documents([d.page_content for _, d in prepared])
+        self.add_vectors([(i, d, v) for (i, d), v in zip(prepared, vectors)])
+        return len(prepared)
+
+    def add_vectors(self, items):
+        """Append already-embedded ``(int_id, Document, vector)`` triples."""
+        if items:
+            self.add_vector_batches([items])
+
+    def add_vector_batches(self, batches):
+        """
+        ``add_vectors`` for an iterable of batches, written as one version.
+        Batches are consumed one at a time (rows go straight to the sidecar),
+        so a large document can be indexed while it is still being embedded.
+        """
+        self._write(lambda draft: [draft.add(items) for items in batches if items], incremental=True)
+        self._maybe_migrate()
+
+    def delete_document(self, doc_id):
+        """Tombstone every chunk of ``doc_id``. Returns the number of chunks deleted."""
+        with self.snapshot() as snapshot:
+            if snapshot is None or not snapshot.has_document(doc_id):
+                return 0
+
+        def apply(draft):
+            deleted = draft.delete_document(doc_id)
+            if draft.count and len(draft.tombstones) / draft.count > self.compact_threshold:
+                draft.compact()
+            return deleted
+
+        return self._write(apply, incremental=True)
+
+    def compact(self):
+        """Physically remove tombstoned vectors from the index and the sidecar."""
+        with self.snapshot() as snapshot:
+            if snapshot is None or not snapshot.tombstones:
+                return
+        self._write(lambda draft: draft.compact())
+
+    def rebuild(self, index_type=None):
+        """
+        Re-encode every live vector into a fresh index of ``index_type``
+        (default: the store's), trained on the full set. Used to switch a
+        store between index types, or to retrain a quantized index after its
+        collection has grown well past its first documents.
+        """
+        self.index_type = index_type or self.index_type
+        if self.ntotal:
+            self._write(lambda draft: draft.reencode())
+
+    def _maybe_migrate(self):
+        """
+        With ``index_type="auto"``, start re-encoding the store in the
+        background once it has grown into another size tier. Searches keep
+        using the current version until the re-encoded one is published.
+        """
+        with self._lock:
+            snapshot = self._current
+            if self.index_type != "auto" or snapshot is None or snapshot.index is None or self._migrating:
+                return
+            target = resolve_index_type("auto", snapshot.ntotal)
+            if target == index_kind(snapshot.index):
+                return
+            self._migrating = True
+        logger.info(f"{self.path} reached {snapshot.ntotal} vectors, re-encoding as {target}")
+        threading.Thread(target=self._run_migration, name="index-migration", daemon=True).start()
+
+    def _run_migration(self):
+        try:
+            for _ in range(MIGRATION_ATTEMPTS):
+                with self.snapshot() as snapshot:
+                    if snapshot is None:
+                        return
+                    base = snapshot.name
+                    ids, vectors = snapshot.live_vectors()
+                if not len(ids):
+                    return
+
+                # The expensive part (training, graph construction) holds no lock
+                index = create_index(vectors, "auto")
+                index.add_with_ids(vectors, ids)
+
+                try:
+                    self._write(lambda draft: draft.install(index, len(ids)), expected_version=base)
+                except _StoreChanged:
+                    logger.info(f"{self.path} changed while re-encoding, retrying")
+                    continue
+                break
+            else:
+                logger.warning(f"Gave up re-encoding {self.path} after {MIGRATION_ATTEMPTS} attempts")
+                return
+            self.measure_recall()
+        except Exception:
+            logger.exception(f"Background re-encode of {self.path} failed")
+        finally:
+            self._migrating = False
+
+    def measure_recall(self, sample_size=RECALL_SAMPLE, k=RECALL_K):
+        """
+        Recall@k of the index against exact search, on ``sample_size`` stored
+        vectors used as queries. Each query's own chunk is left out of both
+        result lists, so it stands in for an unseen question rather than
+        trivially finding itself. The result is kept in ``self.recall`` and
+        in ``recall.json`` next to the index.
+        """
+        with self.snapshot() as snapshot:
+            if snapshot is None or snapshot.index is None:
+                return None
+            ids, vectors = snapshot.live_vectors()
+            if len(ids) <= k:
+                return None
+
+            rng = np.random.default_rng(0)
+            sample = rng.choice(len(ids), min(sample_size, len(ids)), replace=False)
+            _, exact = faiss.knn(vectors[sample], vectors, k + 1)
+
+            found = total = 0
+            for row, position in enumerate(sample):
+                truth = set([int(ids[j]) for j in exact[row] if j != position and j != -1][:k])
+                hits = {i for i, _ in snapshot.search_ids(vectors[position], k + 1) if i != ids[position]}
+                found += len(truth & hits)
+                total += len(truth)
+            kind = index_kind(snapshot.index)
+
+        recall = {
+            "k": k,
+            "recall": round(found / total, 4) if total else None,
+            "sample": len(sample),
+            "index": kind,
+            "vectors": len(ids),
+            "ef_search": HNSW_EF_SEARCH if kind == "hnsw" else None,
+            "nprobe": IVF_NPROBE if kind == "ivfpq" else None,
+            "measured_at": time.time(),
+        }
+        recall_file = os.path.join(self.path, RECALL_FILE)
+        with open(recall_file + ".tmp", "w") as f:
+            json.dump(recall, f)
+        os.replace(recall_file + ".tmp", recall_file)
+        self.recall = recall
+        logger.info(f"Recall@{k} of {self.path} ({kind}): {recall['recall']}")
+        return recall
+
+    def similarity_search_with_score(self, query, k=4):
+        if self.ntotal == 0:
+            return []
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k)
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filters=None):
+        """Search with an already-computed query embedding."""
+        with self.snapshot() as snapshot:
+            if snapshot is None:
+                return []
+            hits = snapshot.search_ids(embedding, k, filters)
+            docs = snapshot.get_documents([i for i, _ in hits])
+        return [(docs[i], score) for i, score in hits if i in docs]
+
+    def similarity_search(self, query, k=4):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filters=None):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filters)]
@@ -1,9 +1,9 @@
 import fitz  # PyMuPDF
 
-def compress_pdf(input_path, output_path, image_quality=50):
+def compress_pdf(input_path, output_path, image_quality=50, progress=None):
     doc = fitz.open(input_path)
 
-    for page in doc:
+    for page_num, page in enumerate(doc):
         images = page.get_images(full=True)
         for img in images:
             xref = img[0]
@@ -15,6 +15,8 @@ def compress_pdf(input_path, output_path, image_quality=50):
                 pix = None
             except Exception as e:
                 print("⚠️ Skipping image compression:", e)
+        if progress:
+            progress(page_num + 1, doc.page_count)
 
     doc.save(output_path, deflate=True)
     doc.close()
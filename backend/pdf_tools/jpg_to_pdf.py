@@ -1,11 +1,11 @@
 from PIL import Image
 from fpdf import FPDF
 import os
+import uuid
 
 PDF_OUTPUT_FOLDER = "pdf_output"
-os.makedirs(PDF_OUTPUT_FOLDER, exist_ok=True)  # ✅ make sure folder exists
 
-def jpg_to_pdf(image_paths):
+def jpg_to_pdf(image_paths, output_folder=PDF_OUTPUT_FOLDER):
     pdf = FPDF()
 
     for img_path in image_paths:
@@ -21,9 +21,10 @@ def jpg_to_pdf(image_paths):
         # Insert image (fit page with margins)
         pdf.image(img_path, x=10, y=10, w=pdf.w - 20)
 
-    # ✅ Always overwrite with new PDF
-    pdf_filename = "merged_images.pdf"
-    pdf_path = os.path.join(PDF_OUTPUT_FOLDER, pdf_filename)
+    # ✅ Unique name: concurrent requests must not overwrite each other's PDF
+    os.makedirs(output_folder, exist_ok=True)
+    pdf_filename = f"merged_images_{uuid.uuid4().hex}.pdf"
+    pdf_path = os.path.join(output_folder, pdf_filename)
 
     pdf.output(pdf_path)
     return pdf_path
@@ -15,7 +15,7 @@ pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tessera
 POPPLER_PATH = r"C:\Users\takd2\Release-25.07.0-0 (1)\poppler-25.07.0\Library\bin"  # <-- change if needed
 # images = convert_from_path(pdf_path, poppler_path=POPPLER_PATH)
 
-def ocr_pdf(input_pdf_path, output_txt_path):
+def ocr_pdf(input_pdf_path, output_txt_path, progress=None):
     import fitz  # PyMuPDF
     import pytesseract
     from PIL import Image
@@ -28,6 +28,8 @@ def ocr_pdf(input_pdf_path, output_txt_path):
         img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
         text = pytesseract.image_to_string(img)
         text_content.append(text)
+        if progress:
+            progress(page_num + 1, len(doc))
 
     doc.close()
 
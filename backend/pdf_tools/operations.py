@@ -0,0 +1,289 @@
+"""
+The pdf_tools operations behind the tool routes, under one signature so
+the job queue can run any of them in a worker process:
+
+    run(name, input_path, output_dir, params, progress=None)
+
+``params`` are the route's form fields (strings), ``progress(done, total)``
+is called after each page where the tool works page by page, and the
+result is ``{"path", "filename", "mimetype"}`` of the single output file
+(plus ``timings``, ``[{"name", "ms"}, ...]``, from operations that time
+their stages). Missing or malformed params raise ``InvalidInput``, which
+the routes and the job queue report as a client error.
+Everything is imported inside the operation, so a worker only loads the
+libraries of the operations it actually runs.
+
+Operations also declare the params they read (with their defaults) and a
+``version``, which together with the input's hash make up the result cache
+key: bump the version whenever an operation's output changes for the same
+input. Non-deterministic operations are registered with ``cacheable=False``.
+"""
+import os
+import zipfile
+
+from utils.jobs import InvalidInput
+
+PDF = "application/pdf"
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PPTX = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+OPERATIONS = {}
+OPERATIONS_VERSION = 1  # bump to invalidate every cached result
+
+
+def operation(name, params=None, version=1, cacheable=True):
+    """Register ``fn`` as operation ``name``; ``params`` maps each param it reads to its default."""
+    def register(fn):
+        fn.params = params or {}
+        fn.version = f"{OPERATIONS_VERSION}.{version}"
+        fn.cacheable = cacheable
+        OPERATIONS[name] = fn
+        return fn
+    return register
+
+
+def cache_spec(name, params):
+    """
+    ``(version, normalized params)`` identifying a run of operation ``name``,
+    or None if its results must not be cached. Params the operation doesn't
+    read are dropped and defaults filled in, so equivalent requests agree.
+    """
+    fn = OPERATIONS[name]
+    if not fn.cacheable:
+        return None
+    normalized = {}
+    for key, default in fn.params.items():
+        value = params.get(key, default)
+        normalized[key] = None if value is None else str(value).strip()
+    return fn.version, normalized
+
+
+def _stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _result(path, filename, mimetype=PDF):
+    return {"path": path, "filename": filename, "mimetype": mimetype}
+
+
+def _no_progress(done=None, total=None, **info):
+    pass
+
+
+def _param(params, key, cast=str, default=None):
+    """``params[key]`` (or ``default``) converted with ``cast``; missing or malformed is the client's error."""
+    value = params.get(key, default)
+    if value is None:
+        raise InvalidInput(f"{key} is required")
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise InvalidInput(f"Invalid {key}: {value!r}")
+
+
+def run(name, input_path, output_dir, params=None, progress=None):
+    """Run operation ``name`` on ``input_path``, writing its output under ``output_dir``."""
+    fn = OPERATIONS.get(name)
+    if fn is None:
+        raise InvalidInput(f"Unknown operation: {name}")
+    os.makedirs(output_dir, exist_ok=True)
+    return fn(input_path, output_dir, params or {}, progress or _no_progress)
+
+
+@operation("ocr-pdf")
+def _ocr(input_path, output_dir, params, progress):
+    from pdf_tools.ocr_pdf import ocr_pdf
+
+    output_path = os.path.join(output_dir, f"{_stem(input_path)}_ocr.txt")
+    ocr_pdf(input_path, output_path, progress=progress)
+    return _result(output_path, os.path.basename(output_path), "text/plain")
+
+
+@operation("pdf-to-word")
+def _pdf_to_word(input_path, output_dir, params, progress):
+    from pdf2docx import Converter
+
+    # pdf2docx converts in one call; progress only marks start and end
+    progress(0, 1)
+    output_path = os.path.join(output_dir, f"{_stem(input_path)}.docx")
+    cv = Converter(input_path)
+    try:
+        cv.convert(output_path, start=0, end=None)  # full document
+    finally:
+        cv.close()
+    progress(1, 1)
+    return _result(output_path, os.path.basename(output_path), DOCX)
+
+
+@operation("pdf-to-excel")
+def _pdf_to_excel(input_path, output_dir, params, progress):
+    from pdf_tools.pdf_to_word_excel import pdf_to_excel
+
+    output_path = pdf_to_excel(input_path, output_folder=output_dir, progress=progress)
+    return _result(output_path, f"converted_{_stem(input_path)}.xlsx", XLSX)
+
+
+@operation("compress", params={"image_quality": 50})
+def _compress(input_path, output_dir, params, progress):
+    from pdf_tools.compress import compress_pdf
+
+    output_path = os.path.join(output_dir, f"compressed_{os.path.basename(input_path)}")
+    compress_pdf(input_path, output_path, image_quality=_param(params, "image_quality", int, 50), progress=progress)
+    return _result(output_path, os.path.basename(output_path))
+
+
+@operation("pdf-to-pptx")
+def _pdf_to_pptx(input_path, output_dir, params, progress):
+    from pdf_tools.pdf_to_pptx import convert_pdf_to_pptx
+
+    output_path = convert_pdf_to_pptx(input_path, output_folder=output_dir, progress=progress)
+    return _result(output_path, os.path.basename(output_path), PPTX)
+
+
+@operation("pdf-to-images", params={"dpi": 150})
+def _pdf_to_images(input_path, output_dir, params, progress):
+    from pdf_tools.pdf_to_jpg import pdf_to_images
+
+    pages_dir = os.path.join(output_dir, "pages")
+    os.makedirs(pages_dir, exist_ok=True)
+    image_paths = pdf_to_images(input_path, dpi=_param(params, "dpi", int, 150), output_folder=pages_dir,
+                                progress=progress)
+    zip_path = os.path.join(output_dir, "pdf_images.zip")
+    with zipfile.ZipFile(zip_path, "w") as zipf:
+        for image_path in image_paths:
+            zipf.write(image_path, os.path.basename(image_path))
+            os.remove(image_path)
+    return _result(zip_path, "pdf_images.zip", "application/zip")
+
+
+@operation("word-to-pdf")
+def _word_to_pdf(input_path, output_dir, params, progress):
+    from pdf_tools.word_to_pdf import word_to_pdf
+
+    output_path = word_to_pdf(input_path, output_dir)
+    return _result(output_path, os.path.basename(output_path))
+
+
+@operation("optimize")
+def _optimize(input_path, output_dir, params, progress):
+    from pdf_tools.optimize import optimize_pdf
+
+    return _result(optimize_pdf(input_path, output_dir), f"optimized_{os.path.basename(input_path)}")
+
+
+@operation("repair-pdf")
+def _repair(input_path, output_dir, params, progress):
+    from pdf_tools.repair_pdf import repair_pdf
+
+    return _result(repair_pdf(input_path, output_dir), f"repaired_{os.path.basename(input_path)}")
+
+
+@operation("encrypt-pdf", cacheable=False)  # fresh random salt every run
+def _encrypt(input_path, output_dir, params, progress):
+    from pdf_tools.pdf_security import encrypt_pdf
+
+    return _result(encrypt_pdf(input_path, _param(params, "password"), output_dir), f"encrypted_{os.path.basename(input_path)}")
+
+
+@operation("decrypt-pdf", params={"password": None})
+def _decrypt(input_path, output_dir, params, progress):
+    from pdf_tools.pdf_security import decrypt_pdf
+
+    return _result(decrypt_pdf(input_path, _param(params, "password"), output_dir), f"decrypted_{os.path.basename(input_path)}")
+
+
+@operation("unlock-pdf", params={"password": None})
+def _unlock(input_path, output_dir, params, progress):
+    from pdf_tools.unlock_pdf import unlock_pdf
+
+    return _result(unlock_pdf(input_path, _param(params, "password"), output_dir), f"unlocked_{os.path.basename(input_path)}")
+
+
+@operation("rotate", params={"pages": None, "angle": None})
+def _rotate(input_path, output_dir, params, progress):
+    from pdf_tools.rotate import rotate_pdf
+
+    output_path = rotate_pdf(input_path, _param(params, "pages"), _param(params, "angle", int), output_dir)
+    return _result(output_path, f"rotated_{os.path.basename(input_path)}")
+
+
+@operation("page-numbers", params={
+    "position": "bottom-right", "font_size": 12, "start_page": 1, "number_format": "1",
+})
+def _page_numbers(input_path, output_dir, params, progress):
+    from pdf_tools.page_numbers import add_page_numbers
+
+    output_path = os.path.join(output_dir, f"numbered_{os.path.basename(input_path)}")
+    add_page_numbers(
+        input_path,
+        output_path,
+        position=params.get("position", "bottom-right"),
+        font_size=_param(params, "font_size", int, 12),
+        start_page=_param(params, "start_page", int, 1),
+        number_format=params.get("number_format", "1"),
+    )
+    return _result(output_path, os.path.basename(output_path))
+
+
+@operation("split", params={"pages": None})
+def _split(input_path, output_dir, params, progress):
+    from pdf_tools.split import split_pdf_pages
+
+    return _result(split_pdf_pages(input_path, _param(params, "pages"), output_dir), f"split_{os.path.basename(input_path)}")
+
+
+@operation("extract-pages", params={"pages": None})
+def _extract_pages(input_path, output_dir, params, progress):
+    from pdf_tools.extract_pages import extract_pages_from_pdf
+
+    return _result(extract_pages_from_pdf(input_path, _param(params, "pages"), output_dir), "extracted.pdf")
+
+
+@operation("remove-pages", params={"pages": None})
+def _remove_pages(input_path, output_dir, params, progress):
+    from pdf_tools.remove_pages import remove_pages_from_pdf
+
+    return _result(remove_pages_from_pdf(input_path, _param(params, "pages"), output_dir), "removed_pages.pdf")
+
+
+@operation("crop-pdf", params={"x0": None, "y0": None, "x1": None, "y1": None})
+def _crop(input_path, output_dir, params, progress):
+    from pdf_tools.crop_pdf import crop_pdf
+
+    crop_box = tuple(_param(params, k, float) for k in ("x0", "y0", "x1", "y1"))
+    return _result(crop_pdf(input_path, crop_box, output_dir), f"cropped_{os.path.basename(input_path)}")
+
+
+@operation("redact-pdf", params={"keywords": ""})
+def _redact(input_path, output_dir, params, progress):
+    import fitz  # PyMuPDF
+
+    words = [k.strip() for k in params.get("keywords", "").split(",") if k.strip()]
+    if not words:
+        raise InvalidInput("Keywords are required")
+    output_path = os.path.join(output_dir, f"redacted_{_stem(input_path)}.pdf")
+    with fitz.open(input_path) as doc:
+        for page in doc:
+            for word in words:
+                for rect in page.search_for(word):
+                    page.add_redact_annot(rect, fill=(0, 0, 0))  # black box
+            page.apply_redactions()
+            progress(page.number + 1, doc.page_count)
+        doc.save(output_path)
+    return _result(output_path, "redacted.pdf")
+
+
+@operation("pipeline", params={"steps": None, "watermark_sha256": ""})
+def _pipeline(input_path, output_dir, params, progress):
+    """
+    ``steps``: JSON from ``pipeline.parse_steps``. A watermark step's file
+    is passed as ``watermark_path``; it is left out of the cache key, which
+    has the file's hash (``watermark_sha256``) instead.
+    """
+    from pdf_tools.pipeline import parse_steps, run_pipeline
+
+    output_path = os.path.join(output_dir, f"processed_{os.path.basename(input_path)}")
+    files = {"watermark": params["watermark_path"]} if params.get("watermark_path") else {}
+    timings = run_pipeline(input_path, output_path, parse_steps(params["steps"]), files, progress=progress)
+    return dict(_result(output_path, os.path.basename(output_path)), timings=timings)
@@ -1,11 +1,16 @@
 import fitz  # PyMuPDF
 import os
 IMAGES_OUTPUT_FOLDER = "pdf_images"
-os.makedirs(IMAGES_OUTPUT_FOLDER, exist_ok=True)
 
 
-def pdf_to_images(pdf_file, dpi=150):
-    doc = fitz.open(stream=pdf_file, filetype="pdf")
+def pdf_to_images(pdf_file, dpi=150, output_folder=IMAGES_OUTPUT_FOLDER, progress=None):
+    """
+    Render every page to ``page_N.jpg`` in ``output_folder``; ``pdf_file`` is
+    a path or the PDF bytes. The names repeat from run to run, so give each
+    run its own folder.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    doc = fitz.open(pdf_file) if isinstance(pdf_file, str) else fitz.open(stream=pdf_file, filetype="pdf")
     image_paths = []
 
     for page_num in range(len(doc)):
@@ -15,10 +20,12 @@ def pdf_to_images(pdf_file, dpi=150):
         pix = page.get_pixmap(matrix=mat)
 
         image_filename = f"page_{page_num+1}.jpg"
-        image_path = os.path.join(IMAGES_OUTPUT_FOLDER, image_filename)
+        image_path = os.path.join(output_folder, image_filename)
 
         pix.save(image_path)
         image_paths.append(image_path)
+        if progress:
+            progress(page_num + 1, len(doc))
 
     doc.close()
     return image_paths
\ No newline at end of file
@@ -3,12 +3,10 @@ import fitz  # PyMuPDF
 from pptx import Presentation
 from pptx.util import Inches
 from io import BytesIO
-from PIL import Image
 
 PPTX_OUTPUT_FOLDER = "pptx_output"
-os.makedirs(PPTX_OUTPUT_FOLDER, exist_ok=True)
 
-def convert_pdf_to_pptx(pdf_path):
+def convert_pdf_to_pptx(pdf_path, output_folder=PPTX_OUTPUT_FOLDER, progress=None):
     try:
         # Open the PDF
         pdf_document = fitz.open(pdf_path)
@@ -27,26 +25,24 @@ def convert_pdf_to_pptx(pdf_path):
             pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # higher res
             img_bytes = pix.tobytes("png")
 
-            # Save image temporarily
-            img = Image.open(BytesIO(img_bytes))
-            img_path = os.path.join(PPTX_OUTPUT_FOLDER, f"page_{page_num+1}.png")
-            img.save(img_path)
-
-            # Add slide with image
+            # Add slide with image (straight from memory, no shared page_N.png on disk)
             slide = prs.slides.add_slide(blank_slide_layout)
             slide.shapes.add_picture(
-                img_path,
+                BytesIO(img_bytes),
                 0,
                 0,
                 width=prs.slide_width,
                 height=prs.slide_height,
             )
+            if progress:
+                progress(page_num + 1, len(pdf_document))
 
         # Save PPTX file
+        os.makedirs(output_folder, exist_ok=True)
         base = os.path.basename(pdf_path)
         name, _ = os.path.splitext(base)
         pptx_filename = f"{name}.pptx"
-        pptx_path = os.path.join(PPTX_OUTPUT_FOLDER, pptx_filename)
+        pptx_path = os.path.join(output_folder, pptx_filename)
         prs.save(pptx_path)
 
         return pptx_path
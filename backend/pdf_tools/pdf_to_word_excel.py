@@ -21,7 +21,7 @@ def pdf_to_word(pdf_path, output_folder="uploads"):
 
 
 
-def pdf_to_excel(pdf_path, output_folder="uploads"):
+def pdf_to_excel(pdf_path, output_folder="uploads", progress=None):
     # Create a unique Excel filename
     excel_path = os.path.join(output_folder, f"{uuid.uuid4()}_output.xlsx")
 
@@ -33,6 +33,8 @@ def pdf_to_excel(pdf_path, output_folder="uploads"):
             for table in tables:
                 df = pd.DataFrame(table[1:], columns=table[0])  # Use first row as header
                 all_tables.append(df)
+            if progress:
+                progress(i + 1, len(pdf.pages))
 
     if not all_tables:
         raise ValueError("No tables found in PDF.")
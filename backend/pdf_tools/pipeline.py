@@ -0,0 +1,281 @@
+"""
+Several page operations on one PDF in a single pass: the document is
+opened once with PyMuPDF, every step edits the same in-memory
+``fitz.Document``, and it is serialized once at the end, instead of each
+tool re-parsing and re-writing the file.
+
+Steps are ``{"op": name, ...params}``, with the same param names as the
+single-operation routes. ``parse_steps`` validates a list of them up front
+(so a bad step is rejected before any work), and ``run_pipeline`` applies
+them and reports how long each one took.
+"""
+import json
+import time
+
+import fitz  # PyMuPDF
+
+from utils.jobs import InvalidInput
+
+MAX_STEPS = 20
+
+STEPS = {}
+
+
+def step(name, params=None):
+    """Register ``fn(doc, params, files)`` as pipeline step ``name``; ``params`` maps each param to its default."""
+    def register(fn):
+        fn.params = params or {}
+        STEPS[name] = fn
+        return fn
+    return register
+
+
+def parse_steps(raw):
+    """
+    Validate a JSON list of steps (a string or already decoded). Returns
+    them normalized: params as stripped strings with defaults filled in,
+    unknown params dropped, so equivalent pipelines compare equal.
+    """
+    try:
+        steps = json.loads(raw) if isinstance(raw, str) else raw
+    except ValueError:
+        raise InvalidInput("steps must be a JSON list")
+    if not isinstance(steps, list) or not steps:
+        raise InvalidInput("steps must be a non-empty JSON list")
+    if len(steps) > MAX_STEPS:
+        raise InvalidInput(f"At most {MAX_STEPS} steps are allowed")
+
+    normalized = []
+    for i, entry in enumerate(steps, start=1):
+        if not isinstance(entry, dict) or entry.get("op") not in STEPS:
+            raise InvalidInput(f"Step {i}: unknown operation {entry.get('op') if isinstance(entry, dict) else entry!r}; "
+                             f"expected one of {', '.join(sorted(STEPS))}")
+        fn = STEPS[entry["op"]]
+        params = {"op": entry["op"]}
+        for key, default in fn.params.items():
+            value = entry.get(key, default)
+            if value is None:
+                raise InvalidInput(f"Step {i} ({entry['op']}): {key} is required")
+            params[key] = str(value).strip()
+        normalized.append(params)
+    return normalized
+
+
+def run_pipeline(input_path, output_path, steps, files=None, progress=None):
+    """
+    Apply ``steps`` (from ``parse_steps``) to the PDF at ``input_path`` and
+    save the result to ``output_path``. ``files`` maps names steps refer to
+    (the watermark file) to paths. Returns per-stage timings in ms:
+    ``[{"name": "open", "ms": ...}, {"name": "rotate", "ms": ...}, ..., {"name": "save", "ms": ...}]``.
+    """
+    files = files or {}
+    timings = []
+    total = len(steps)
+
+    start = time.perf_counter()
+    doc = fitz.open(input_path)
+    timings.append({"name": "open", "ms": _ms_since(start)})
+    try:
+        compress = False
+        for done, params in enumerate(steps, start=1):
+            start = time.perf_counter()
+            STEPS[params["op"]](doc, params, files)
+            compress = compress or params["op"] == "compress"
+            timings.append({"name": params["op"], "ms": _ms_since(start)})
+            if progress:
+                progress(done, total)
+
+        start = time.perf_counter()
+        # Drop objects earlier steps orphaned (removed pages, replaced images);
+        # after a compress step also merge duplicates
+        doc.save(output_path, garbage=4 if compress else 1, deflate=True)
+        timings.append({"name": "save", "ms": _ms_since(start)})
+    finally:
+        doc.close()
+    return timings
+
+
+def _ms_since(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _number(params, key, cast=float):
+    """A step's numeric param; not a number is the client's error."""
+    try:
+        return cast(params[key])
+    except ValueError:
+        raise InvalidInput(f"{params['op']}: {key} must be a number, got {params[key]!r}")
+
+
+def _to_roman(n):
+    """Lower-case roman numeral: 4 -> "iv"."""
+    numerals = [(1000, "m"), (900, "cm"), (500, "d"), (400, "cd"), (100, "c"), (90, "xc"),
+                (50, "l"), (40, "xl"), (10, "x"), (9, "ix"), (5, "v"), (4, "iv"), (1, "i")]
+    text = ""
+    for value, numeral in numerals:
+        count, n = divmod(n, value)
+        text += numeral * count
+    return text
+
+
+def _page_indices(pages_str, page_count):
+    """0-based page indices for ``"1,3-4"`` style input; "all" or empty means every page."""
+    if not pages_str or pages_str.lower() == "all":
+        return list(range(page_count))
+    indices = []
+    for part in pages_str.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                first, last = (int(p) for p in part.split("-", 1))
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise InvalidInput(f"Invalid page range: {part}")
+        if first < 1 or last > page_count or first > last:
+            raise InvalidInput(f"Page range {part} is outside 1-{page_count}")
+        indices.extend(range(first - 1, last))
+    return sorted(set(indices))
+
+
+@step("rotate", params={"pages": "all", "angle": None})
+def _rotate(doc, params, files):
+    angle = _number(params, "angle", int)
+    if angle not in (90, 180, 270):
+        raise InvalidInput("Rotation angle must be 90, 180, or 270 degrees.")
+    for i in _page_indices(params["pages"], doc.page_count):
+        page = doc[i]
+        page.set_rotation((page.rotation + angle) % 360)
+
+
+@step("watermark", params={"text": "", "opacity": "0.3", "font_size": "48"})
+def _watermark(doc, params, files):
+    """
+    Text watermark (``text``), or the uploaded ``watermark`` file (PDF or
+    image) centered on each page. Positions here and in page-numbers are
+    computed on the page as displayed; ``derotation_matrix`` maps them onto
+    pages an earlier step rotated.
+    """
+    opacity = _number(params, "opacity")
+    watermark_path = files.get("watermark")
+    if params["text"]:
+        for page in doc:
+            rect = page.rect
+            page.insert_textbox(
+                fitz.Rect(0, rect.height / 2 - 40, rect.width, rect.height / 2 + 40) * page.derotation_matrix,
+                params["text"], fontsize=_number(params, "font_size"), color=(0.5, 0.5, 0.5),
+                align=fitz.TEXT_ALIGN_CENTER, rotate=page.rotation, fill_opacity=opacity, stroke_opacity=opacity,
+            )
+    elif watermark_path is None:
+        raise InvalidInput("watermark needs text or an uploaded watermark file")
+    elif watermark_path.lower().endswith((".png", ".jpg", ".jpeg")):
+        with open(watermark_path, "rb") as f:
+            image = f.read()
+        xref = 0
+        for page in doc:
+            # 30% of the page width, centered, like pdf_tools.watermark
+            rect = page.rect
+            w = rect.width * 0.3
+            x, y = (rect.width - w) / 2, (rect.height - w) / 2
+            # The image is embedded once and referenced from every page
+            xref = page.insert_image(fitz.Rect(x, y, x + w, y + w) * page.derotation_matrix,
+                                     stream=image if not xref else None, xref=xref, rotate=page.rotation)
+    else:
+        with fitz.open(watermark_path) as wm_doc:
+            wm_rect = wm_doc[0].rect
+            for page in doc:
+                # 40% of the page width, centered
+                rect = page.rect
+                zoom = rect.width * 0.4 / wm_rect.width
+                w, h = wm_rect.width * zoom, wm_rect.height * zoom
+                x, y = (rect.width - w) / 2, (rect.height - h) / 2
+                page.show_pdf_page(fitz.Rect(x, y, x + w, y + h) * page.derotation_matrix, wm_doc, 0,
+                                   rotate=page.rotation)
+
+
+@step("page-numbers", params={
+    "position": "bottom-right", "font_size": "12", "start_page": "1", "number_format": "1",
+})
+def _page_numbers(doc, params, files):
+    font_size = _number(params, "font_size")
+    start_page = _number(params, "start_page", int)
+    for page_num, page in enumerate(doc, start=1):
+        if page_num < start_page:
+            continue
+        if params["number_format"] == "i":
+            text = _to_roman(page_num)
+        elif params["number_format"] == "A":
+            text = chr(64 + page_num)
+        else:
+            text = str(page_num)
+
+        # Same placement as pdf_tools.page_numbers, measured from the top-left
+        width, height = page.rect.width, page.rect.height
+        x, y = {
+            "top-left": (50, 30),
+            "top-right": (width - 100, 30),
+            "bottom-left": (50, height - 30),
+            "center": (width / 2, height - 30),
+        }.get(params["position"], (width - 100, height - 30))
+        page.insert_text(fitz.Point(x, y) * page.derotation_matrix, text, fontsize=font_size, fontname="helv",
+                         rotate=page.rotation)
+
+
+@step("compress", params={"image_quality": "50"})
+def _compress(doc, params, files):
+    # Re-encode each embedded image once as JPEG, where that is smaller; the
+    # final save then deduplicates and deflates everything else
+    quality = _number(params, "image_quality", int)
+    done = set()
+    for page in doc:
+        for image in page.get_images(full=True):
+            xref, smask = image[0], image[1]
+            if xref in done or smask:  # JPEG can't keep a soft mask
+                continue
+            done.add(xref)
+            try:
+                pix = fitz.Pixmap(doc, xref)
+                if pix.alpha:
+                    continue
+                if pix.n > 3:  # CMYK to RGB
+                    pix = fitz.Pixmap(fitz.csRGB, pix)
+                data = pix.tobytes("jpeg", jpg_quality=quality)
+            except Exception:  # an image format Pixmap can't decode: leave it alone
+                continue
+            if len(data) < len(doc.xref_stream_raw(xref)):
+                page.replace_image(xref, stream=data)
+
+
+@step("remove-pages", params={"pages": None})
+def _remove_pages(doc, params, files):
+    remove = set(_page_indices(params["pages"], doc.page_count))
+    keep = [i for i in range(doc.page_count) if i not in remove]
+    if not keep:
+        raise InvalidInput("Cannot remove every page")
+    doc.select(keep)
+
+
+@step("extract-pages", params={"pages": None})
+def _extract_pages(doc, params, files):
+    doc.select(_page_indices(params["pages"], doc.page_count))
+
+
+@step("crop-pdf", params={"x0": None, "y0": None, "x1": None, "y1": None})
+def _crop(doc, params, files):
+    box = fitz.Rect(*(_number(params, k) for k in ("x0", "y0", "x1", "y1")))
+    for page in doc:
+        page.set_cropbox(box)
+
+
+@step("redact-pdf", params={"keywords": None})
+def _redact(doc, params, files):
+    words = [k.strip() for k in params["keywords"].split(",") if k.strip()]
+    if not words:
+        raise InvalidInput("Keywords are required")
+    for page in doc:
+        for word in words:
+            for rect in page.search_for(word):
+                page.add_redact_annot(rect, fill=(0, 0, 0))  # black box
+        page.apply_redactions()
@@ -9,7 +9,7 @@ import subprocess
 OUTPUT_FOLDER = os.path.join(os.getcwd(), "converted")
 # os.makedirs(PDF_OUTPUT_FOLDER, exist_ok=True)
 
-def convert_pptx_to_pdf(pptx_path):
+def convert_pptx_to_pdf(pptx_path, output_folder=OUTPUT_FOLDER):
     """
     Convert PPTX to PDF using LibreOffice (Windows path).
     """
@@ -18,11 +18,11 @@ def convert_pptx_to_pdf(pptx_path):
 
         subprocess.run([
             libreoffice_path, "--headless", "--convert-to", "pdf",
-            "--outdir", OUTPUT_FOLDER, pptx_path
+            "--outdir", output_folder, pptx_path
         ], check=True)
 
         pdf_filename = os.path.splitext(os.path.basename(pptx_path))[0] + ".pdf"
-        pdf_path = os.path.join(OUTPUT_FOLDER, pdf_filename)
+        pdf_path = os.path.join(output_folder, pdf_filename)
         if not os.path.exists(pdf_path):
             raise FileNotFoundError("Conversion failed, PDF not found.")
 
@@ -21,6 +21,8 @@ def remove_pages_from_pdf(input_path, pages_str, output_folder="uploads"):
     remove_indices = set()
     for part in pages_str.split(","):
         part = part.strip()
+        if not part:
+            continue
         if "-" in part:
             start, end = map(int, part.split("-"))
             remove_indices.update(range(start - 1, end))
@@ -0,0 +1,33 @@
+import logging
+import os
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Path to LibreOffice (adjust if needed, or set LIBREOFFICE_PATH)
+# Windows default:
+LIBREOFFICE_PATH = os.getenv("LIBREOFFICE_PATH", r"C:\Program Files\LibreOffice\program\soffice.exe")
+# Linux/macOS default:
+# LIBREOFFICE_PATH = "/usr/bin/libreoffice"
+
+
+def word_to_pdf(input_path, output_folder):
+    """
+    Convert Word file (doc/docx) to PDF using LibreOffice headless mode.
+    """
+    try:
+        result = subprocess.run([
+            LIBREOFFICE_PATH, "--headless", "--convert-to", "pdf",
+            "--outdir", output_folder, input_path
+        ], capture_output=True, text=True, check=True)
+
+        logger.debug(f"LibreOffice stdout: {result.stdout}")
+        if result.stderr:
+            logger.debug(f"LibreOffice stderr: {result.stderr}")
+
+        filename = os.path.splitext(os.path.basename(input_path))[0] + ".pdf"
+        return os.path.join(output_folder, filename)
+
+    except subprocess.CalledProcessError as e:
+        logger.error(f"LibreOffice failed (exit {e.returncode}): stdout={e.stdout!r} stderr={e.stderr!r}")
+        raise RuntimeError(f"LibreOffice conversion failed: {(e.stderr or '').strip() or f'exit code {e.returncode}'}") from e
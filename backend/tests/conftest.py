@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Tests import the backend modules the way app.py does (``chat_ai.llm``, ``utils.jobs``)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Offline LLM with no artificial latency; read when chat_ai.llm is first imported
+os.environ.setdefault("CHAT_LLM_PROVIDER", "fake")
+os.environ.setdefault("FAKE_LLM_TOKEN_DELAY_MS", "0")
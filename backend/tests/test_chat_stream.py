@@ -0,0 +1,99 @@
+import json
+import time
+
+import pytest
+
+import app as backend
+from chat_ai.llm import FakeLLMProvider
+from chat_ai.llm_gateway import LLMGateway
+
+
+def parse_sse(body):
+    """``[(event, payload), ...]`` from an SSE body, checking each message's framing."""
+    assert body.endswith("\n\n")
+    events = []
+    for message in body[:-2].split("\n\n"):
+        lines = message.split("\n")
+        assert len(lines) == 2, message
+        assert lines[0].startswith("event: ") and lines[1].startswith("data: "), message
+        events.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+    return events
+
+
+class RecordingProvider(FakeLLMProvider):
+    """Fake provider that keeps the cancel event of every stream it serves."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.cancel_events = []
+
+    def stream(self, prompt, cancel_event=None):
+        self.cancel_events.append(cancel_event)
+        return super().stream(prompt, cancel_event=cancel_event)
+
+
+@pytest.fixture
+def client():
+    backend.app.config["TESTING"] = True
+    return backend.app.test_client()
+
+
+def use_provider(monkeypatch, provider):
+    monkeypatch.setattr(backend, "llm_gateway", LLMGateway(provider, max_retries=0))
+
+
+def test_stream_sends_tokens_then_done(client):
+    response = client.post("/chat/stream", json={"message": "what is streaming"})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+    events = parse_sse(response.get_data(as_text=True))
+
+    names = [name for name, _ in events]
+    assert names[-1] == "done"
+    assert set(names[:-1]) == {"token"}
+    answer = "".join(payload["text"] for _, payload in events[:-1])
+    assert answer == "This is a fake answer to: what is streaming"
+    assert events[-1][1]["response"] == answer
+    assert events[-1][1]["cached"] is False
+
+
+def test_stream_reports_upstream_error(client, monkeypatch):
+    use_provider(monkeypatch, FakeLLMProvider(token_delay=0, error_rate=1.0))
+
+    response = client.post("/chat/stream", json={"message": "fail please"})
+
+    assert response.status_code == 200
+    events = parse_sse(response.get_data(as_text=True))
+    assert [name for name, _ in events] == ["error"]
+    assert events[0][1]["error"] == "Simulated upstream error"
+
+
+def test_stream_without_message_is_rejected(client):
+    response = client.post("/chat/stream", json={})
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "No message provided"}
+
+
+def test_client_disconnect_cancels_upstream(client, monkeypatch):
+    provider = RecordingProvider(answer=" ".join(["word"] * 200), token_delay=0.05)
+    use_provider(monkeypatch, provider)
+
+    response = client.post("/chat/stream", json={"message": "long answer"}, buffered=False)
+    body = iter(response.response)
+    first = next(body).decode()
+    assert first.startswith("event: token\n")
+    response.close()
+
+    # The gateway unsubscribes the only listener, which cancels the upstream stream
+    (cancel_event,) = provider.cancel_events
+    assert cancel_event.wait(2)
+    gateway = backend.llm_gateway
+    for _ in range(40):
+        if not gateway.stats()["in_flight"]:
+            break
+        time.sleep(0.05)
+    assert gateway.stats()["in_flight"] == 0
+    assert gateway.stats()["upstream_calls"] == 1
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+sentence_transformers = pytest.importorskip("sentence_transformers")
+
+from benchmarks.embedding_benchmark import synthetic_chunks
+from chat_ai.embeddings import EMBEDDING_ONNX_DIR, MODEL_NAME
+from chat_ai.onnx_embeddings import MODEL_FILE, QUANTIZED_MODEL_FILE, OnnxEncoder, cosine_agreement
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ONNX_DIR = os.path.join(BACKEND_DIR, EMBEDDING_ONNX_DIR)
+
+# Mixed lengths so batches are padded differently and results must be put back in order
+TEXTS = ["Invoice", "Total amount due on the contract."] + synthetic_chunks(48)
+
+
+@pytest.fixture(scope="module")
+def reference():
+    model = sentence_transformers.SentenceTransformer(MODEL_NAME)
+    return model.encode(TEXTS, batch_size=16, convert_to_numpy=True)
+
+
+@pytest.mark.parametrize("quantized, tolerance", [(False, 0.999), (True, 0.99)])
+def test_onnx_matches_sentence_transformers(reference, quantized, tolerance):
+    model_file = os.path.join(ONNX_DIR, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+    if not os.path.exists(model_file):
+        pytest.skip(f"{model_file} not exported (python -m chat_ai.onnx_embeddings --out {EMBEDDING_ONNX_DIR})")
+
+    vectors = OnnxEncoder(ONNX_DIR, quantized=quantized).encode(TEXTS, batch_size=16)
+
+    assert vectors.shape == reference.shape
+    assert cosine_agreement(reference, vectors)["min"] >= tolerance
@@ -0,0 +1,247 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from werkzeug.datastructures import FileStorage
+
+logger = logging.getLogger(__name__)
+
+FILE_STORE_PATH = os.getenv("FILE_STORE_PATH", "file_store")
+# Blobs nobody uploaded, used or produced for this long are deleted
+FILE_STORE_TTL_SECONDS = float(os.getenv("FILE_STORE_TTL_HOURS", "24")) * 3600
+PRUNE_INTERVAL_SECONDS = 300
+READ_SIZE = 1024 * 1024
+
+_FILE_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_valid_file_id(file_id):
+    return bool(file_id) and _FILE_ID.match(file_id) is not None
+
+
+def hash_path(path):
+    """SHA-256 hex digest of a file's content: its id in the store."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StoredFile:
+    """Metadata of one blob; ``file_id`` is the SHA-256 of its bytes."""
+
+    __slots__ = ("file_id", "size", "filename", "mimetype", "created_at", "path")
+
+    def __init__(self, file_id, size, filename, mimetype, created_at, path):
+        self.file_id = file_id
+        self.size = size
+        self.filename = filename
+        self.mimetype = mimetype
+        self.created_at = created_at
+        self.path = path
+
+    def to_dict(self):
+        return {
+            "file_id": self.file_id,
+            "size": self.size,
+            "filename": self.filename,
+            "mimetype": self.mimetype,
+            "created_at": self.created_at,
+        }
+
+
+class FileStore:
+    """
+    Content-addressed file store: uploads and tool outputs are kept once per
+    distinct content under ``root/blobs/<ab>/<sha256>``, so a file uploaded
+    once can go through any number of operations by id. Blobs are
+    immutable; the sqlite index keeps the name and type they were stored
+    under and when they were last used, for TTL expiry.
+    """
+
+    def __init__(self, root=FILE_STORE_PATH, ttl=FILE_STORE_TTL_SECONDS):
+        self.root = root
+        self.ttl = ttl
+        self._blobs = os.path.join(root, "blobs")
+        self._tmp = os.path.join(root, "tmp")
+        os.makedirs(self._blobs, exist_ok=True)
+        os.makedirs(self._tmp, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "files.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files (file_id TEXT PRIMARY KEY, size INTEGER, filename TEXT,"
+            " mimetype TEXT, created_at REAL, last_used_at REAL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def blob_path(self, file_id):
+        return os.path.join(self._blobs, file_id[:2], file_id)
+
+    def put_stream(self, stream, filename=None, mimetype=None):
+        """
+        Store everything read from ``stream``, hashing it while it is spooled
+        to disk. Returns ``(StoredFile, created)``; ``created`` is False when
+        the same content was already stored.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for block in iter(lambda: stream.read(READ_SIZE), b""):
+                    digest.update(block)
+                    out.write(block)
+                    size += len(block)
+            return self._publish(tmp_path, digest.hexdigest(), size, filename, mimetype)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_path(self, path, filename=None, mimetype=None):
+        """Store the file at ``path`` (hard-linked when possible, else copied)."""
+        file_id = hash_path(path)
+        filename = filename or os.path.basename(path)
+        if os.path.exists(self.blob_path(file_id)):
+            return self._publish(None, file_id, os.path.getsize(path), filename, mimetype)
+
+        tmp_path = os.path.join(self._tmp, f"{file_id}.{threading.get_ident()}")
+        try:
+            _link_or_copy(path, tmp_path)
+            return self._publish(tmp_path, file_id, os.path.getsize(path), filename, mimetype)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def adopt(self, path, file_id, filename=None, mimetype=None):
+        """
+        Move the file at ``path`` into the store as ``file_id``, which the
+        caller computed while writing it. ``path`` must be on the store's
+        filesystem; it is left in place if the content was already stored.
+        """
+        return self._publish(path, file_id, os.path.getsize(path), filename, mimetype)
+
+    def _publish(self, tmp_path, file_id, size, filename, mimetype):
+        blob_path = self.blob_path(file_id)
+        created = not os.path.exists(blob_path)
+        if created and tmp_path is not None:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, blob_path)  # atomic; a racing writer has the same bytes
+        filename = filename or file_id
+        mimetype = mimetype or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, size, filename, mimetype, now, now),
+            )
+            self._conn.execute("UPDATE files SET last_used_at = ? WHERE file_id = ?", (now, file_id))
+            self._conn.commit()
+        self._maybe_prune()
+        return self.get(file_id, touch=False), created
+
+    def get(self, file_id, touch=True):
+        """The ``StoredFile`` for ``file_id``, or None if unknown or expired."""
+        if not is_valid_file_id(file_id):
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, filename, mimetype, created_at FROM files WHERE file_id = ?", (file_id,)
+            ).fetchone()
+            if row is not None and touch:
+                self._conn.execute("UPDATE files SET last_used_at = ? WHERE file_id = ?", (time.time(), file_id))
+                self._conn.commit()
+        path = self.blob_path(file_id)
+        if row is None or not os.path.exists(path):
+            return None
+        return StoredFile(file_id, *row, path)
+
+    def link_to(self, file_id, dst):
+        """Make the blob available at ``dst`` without copying it, where the filesystem allows."""
+        _link_or_copy(self.blob_path(file_id), dst)
+
+    def delete(self, file_id):
+        """Remove a blob; returns False if it was not stored."""
+        if not is_valid_file_id(file_id):
+            return False
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,)).rowcount
+            self._conn.commit()
+        try:
+            os.remove(self.blob_path(file_id))
+        except FileNotFoundError:
+            pass
+        return bool(deleted)
+
+    def stats(self):
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        return {"files": count, "bytes": size}
+
+    def _maybe_prune(self):
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = now
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT file_id FROM files WHERE last_used_at < ?", (now - self.ttl,)
+            )]
+        for file_id in expired:
+            self.delete(file_id)
+        if expired:
+            logger.info(f"File store: expired {len(expired)} blobs")
+
+
+class StoredUpload(FileStorage):
+    """
+    A stored blob standing in for a multipart upload, so routes that read
+    ``request.files`` take ``file_id=...`` unchanged. ``save`` to a path
+    hard-links the blob instead of writing a copy, and the blob is only
+    opened once something reads ``stream``: a batch of hundreds of
+    file_ids doesn't hold a descriptor for each.
+    """
+
+    def __init__(self, store, stored):
+        self._stream = None  # before FileStorage's __getattr__ can look for it
+        super().__init__(filename=stored.filename, content_type=stored.mimetype)
+        self._stream = None  # drop the empty BytesIO FileStorage defaults to
+        self.store = store
+        self.stored = stored
+
+    @property
+    def stream(self):
+        if self._stream is None:
+            self._stream = open(self.stored.path, "rb")
+        return self._stream
+
+    @stream.setter
+    def stream(self, value):
+        self._stream = value
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+
+    def save(self, dst, buffer_size=16384):
+        if isinstance(dst, (str, os.PathLike)):
+            self.store.link_to(self.stored.file_id, dst)
+        else:
+            super().save(dst, buffer_size)
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:  # other filesystem, or links not supported
+        shutil.copyfile(src, dst)
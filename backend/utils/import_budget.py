@@ -0,0 +1,108 @@
+"""
+Import-time budget report, per subsystem.
+
+Each subsystem's modules are imported in a fresh interpreter with
+``python -X importtime`` and the cumulative times are summed, so the numbers
+match what a cold worker pays. Run it directly to track regressions:
+
+    python -m utils.import_budget --json
+    python -m utils.import_budget --fail-over-ms 1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUBSYSTEMS = {
+    "app": ["app"],
+    "web": ["flask", "flask_cors", "werkzeug", "dotenv"],
+    "chat": [
+        "google.generativeai", "langchain_core.documents", "chat_ai.pdf_loader",
+        "langchain_text_splitters", "faiss", "numpy",
+    ],
+    "embeddings": ["sentence_transformers"],
+    "pdf": ["fitz", "PyPDF2", "reportlab.pdfgen.canvas", "fpdf", "pdf2image", "pdfkit", "pdfplumber"],
+    "office": ["pandas", "docx", "pptx", "pdf2docx", "openpyxl"],
+    "ocr": ["pytesseract", "PIL.Image"],
+}
+
+
+def parse_importtime(stderr):
+    """
+    Parse ``-X importtime`` output into ``{module: cumulative_us}`` for the
+    modules imported at top level (not nested inside another import).
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+        except ValueError:
+            continue
+        # Nested imports are indented under the module that pulled them in
+        if name.startswith("  "):
+            continue
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def measure_subsystem(modules, python=sys.executable):
+    """Import ``modules`` in a fresh interpreter and report the cost in ms."""
+    code = "; ".join(f"import {m}" for m in modules)
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    times = parse_importtime(result.stderr)
+    # Modules already pulled in by an earlier one report only their own extra
+    # cost, so the sum is the subsystem total without interpreter startup
+    module_ms = {m: round(times[m] / 1000, 1) for m in modules if m in times}
+    report = {
+        "total_ms": round(sum(module_ms.values()), 1),
+        "modules": module_ms,
+    }
+    if result.returncode != 0:
+        report["error"] = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"
+    return report
+
+
+def import_budget_report(subsystems=None):
+    names = subsystems or list(SUBSYSTEMS)
+    return {
+        "python": sys.version.split()[0],
+        "subsystems": {name: measure_subsystem(SUBSYSTEMS[name]) for name in names},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time budget per backend subsystem")
+    parser.add_argument("--subsystem", action="append", choices=sorted(SUBSYSTEMS),
+                        help="Only measure this subsystem (repeatable)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--fail-over-ms", type=float,
+                        help="Exit non-zero if importing the app takes longer than this")
+    args = parser.parse_args(argv)
+
+    report = import_budget_report(args.subsystem)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, sub in report["subsystems"].items():
+            status = f"  ({sub['error']})" if "error" in sub else ""
+            print(f"{name:<12}{sub['total_ms']:>10.1f} ms{status}")
+            for module, ms in sorted(sub["modules"].items(), key=lambda kv: -kv[1]):
+                print(f"    {module:<40}{ms:>10.1f} ms")
+
+    app_ms = report["subsystems"].get("app", {}).get("total_ms")
+    if args.fail_over_ms is not None and app_ms is not None and app_ms > args.fail_over_ms:
+        print(f"app import took {app_ms} ms, budget is {args.fail_over_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
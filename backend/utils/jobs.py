@@ -0,0 +1,324 @@
+import functools
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# CPU-bound tool jobs (OCR, conversions, compression) run in worker processes
+PROCESS_WORKERS = int(os.getenv("TOOL_WORKERS", "0")) or os.cpu_count() or 1
+JOB_RETENTION_SECONDS = 3600  # finished jobs stay queryable this long
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that was cancelled while running."""
+
+
+class InvalidInput(ValueError):
+    """Raised by a job's function when it rejects its input or params: a client error, not a bug."""
+
+
+class Job:
+    """
+    One background task. The worker reports progress through ``update``;
+    ``fraction`` (0..1), when set, drives the ETA estimate. Process jobs
+    write their files under ``workdir``, released as soon as the job ends.
+    A job that failed with ``InvalidInput`` has ``invalid_input`` set: its
+    input or params were rejected, a client error rather than a server one.
+    """
+
+    def __init__(self, kind, workdir=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.progress = {}
+        self.fraction = None
+        self.result = None
+        self.error = None
+        self.invalid_input = False
+        self.output_path = None
+        self.workdir = workdir
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def update(self, fraction=None, **progress):
+        with self._lock:
+            self.progress.update(progress)
+            if fraction is not None:
+                self.fraction = max(0.0, min(1.0, fraction))
+
+    def check_cancelled(self):
+        """For thread jobs: stop at the next convenient point once cancelled."""
+        if self.cancel_requested.is_set():
+            raise JobCancelled()
+
+    def eta_seconds(self):
+        """Remaining time, extrapolated from the elapsed time and ``fraction``."""
+        if self.status != RUNNING or not self.fraction or self.started_at is None:
+            return None
+        elapsed = time.time() - self.started_at
+        return round(elapsed * (1 - self.fraction) / self.fraction, 1)
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def wait(self, timeout=None):
+        """Block until the job finished; False if ``timeout`` ran out first."""
+        return self._done.wait(timeout)
+
+    def _start(self):
+        with self._lock:
+            # A late "started" report must not revive a finished job
+            if self.status == QUEUED:
+                self.status = RUNNING
+                self.started_at = time.time()
+
+    def _finish(self, status, result=None, error=None, invalid_input=False):
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.invalid_input = invalid_input
+            if status == DONE:
+                self.fraction = 1.0
+            self.finished_at = time.time()
+            self.status = status
+        self._done.set()
+
+    def to_dict(self):
+        with self._lock:
+            data = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "progress": dict(self.progress),
+                "percent": round(self.fraction * 100, 1) if self.fraction is not None else None,
+                "eta_seconds": self.eta_seconds(),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+        if self.status == DONE:
+            data["result"] = self.result
+            if self.output_path is not None:
+                data["result_url"] = f"/jobs/{self.id}/result"
+        if self.status == FAILED:
+            data["error"] = self.error
+            data["invalid_input"] = self.invalid_input
+        return data
+
+
+class Progress:
+    """
+    Picklable progress callback handed to process-pool jobs:
+    ``progress(done, total, **info)`` after each page. It relays to the
+    parent through a manager queue and raises ``JobCancelled`` once the job
+    was cancelled, so page loops double as cancellation points.
+    """
+
+    def __init__(self, job_id, events, cancelled):
+        self.job_id = job_id
+        self.events = events
+        self.cancelled = cancelled
+
+    def __call__(self, done=None, total=None, **info):
+        if self.job_id in self.cancelled:
+            raise JobCancelled()
+        self.events.put((self.job_id, "progress", (done, total, info)))
+
+
+def _run_in_process(fn, progress, args, kwargs):
+    progress.events.put((progress.job_id, "started", None))
+    return fn(*args, progress=progress, **kwargs)
+
+
+class JobRegistry:
+    """
+    In-process background jobs. ``submit`` runs light, I/O-bound work on a
+    small thread pool; ``submit_process`` runs CPU-bound work in a pool of
+    ``process_workers`` spawned processes so it neither holds the GIL nor
+    ties up request threads. Jobs are kept in memory and dropped
+    ``retention`` seconds after they finish. ``release_workdir(path)``
+    deletes a finished job's workdir (by default, ``shutil.rmtree``).
+    """
+
+    def __init__(self, workers=JOB_WORKERS, retention=JOB_RETENTION_SECONDS, process_workers=PROCESS_WORKERS,
+                 release_workdir=None):
+        self.retention = retention
+        self.process_workers = process_workers
+        self.release_workdir = release_workdir or functools.partial(shutil.rmtree, ignore_errors=True)
+        self._jobs = OrderedDict()
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._processes = None
+        self._manager = None
+        self._events = None
+        self._cancelled = None
+
+    def _add(self, job):
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """
+        Run ``fn(job, *args, **kwargs)`` in the background. Its return value
+        becomes ``job.result``; an exception marks the job failed.
+        """
+        job = Job(kind)
+        self._add(job)
+        self._futures[job.id] = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def submit_process(self, kind, fn, *args, workdir=None, on_done=None, **kwargs):
+        """
+        Run ``fn(*args, progress=..., **kwargs)`` in a worker process. ``fn``
+        and its arguments must be picklable; ``fn`` returns a dict, whose
+        ``path`` entry (the output file, if any) becomes ``job.output_path``
+        and the rest ``job.result``. ``on_done(job, result)``, if given, runs
+        in this process before the job is marked done and returns the dict
+        to use instead (e.g. with ``path`` moved somewhere permanent).
+        ``workdir`` is released when the job ends, however it ends.
+        """
+        self._ensure_processes()
+        job = Job(kind, workdir=workdir)
+        self._add(job)
+        progress = Progress(job.id, self._events, self._cancelled)
+        future = self._processes.submit(_run_in_process, fn, progress, args, kwargs)
+        self._futures[job.id] = future
+        future.add_done_callback(lambda f: self._process_done(job, f, on_done))
+        return job
+
+    def add_finished(self, kind, result, output_path=None):
+        """Register a job that is already done, e.g. one answered from a cache."""
+        job = Job(kind)
+        job.output_path = output_path
+        self._add(job)
+        job._start()
+        job._finish(DONE, result=result)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job: queued jobs never start, running ones stop at their
+        next progress report (thread jobs at their next ``check_cancelled``).
+        Returns the job, or None if unknown.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_requested.set()
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            if not job.finished:  # process jobs are marked by their done callback
+                job._finish(CANCELLED)
+            return job
+        if self._cancelled is not None:
+            self._cancelled[job_id] = True
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_requested.is_set():
+            job._finish(CANCELLED)
+            return
+        job._start()
+        try:
+            job._finish(DONE, result=fn(job, *args, **kwargs))
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception as e:
+            logger.exception(f"{job.kind} job {job.id} failed")
+            job._finish(FAILED, error=str(e), invalid_input=isinstance(e, InvalidInput))
+        finally:
+            self._futures.pop(job.id, None)
+
+    def _ensure_processes(self):
+        if self._processes is not None:
+            return
+        with self._lock:
+            if self._processes is None:
+                # spawn, not fork: the web process has live threads a forked
+                # child would inherit in a broken state
+                context = multiprocessing.get_context("spawn")
+                self._manager = context.Manager()
+                self._events = self._manager.Queue()
+                self._cancelled = self._manager.dict()
+                threading.Thread(target=self._relay_events, name="job-events", daemon=True).start()
+                self._processes = ProcessPoolExecutor(max_workers=self.process_workers, mp_context=context)
+
+    def _relay_events(self):
+        """Apply progress reports from worker processes to their jobs."""
+        while True:
+            try:
+                job_id, event, payload = self._events.get()
+            except (EOFError, OSError):
+                return  # manager shut down
+            job = self.get(job_id)
+            if job is None or job.finished:
+                continue
+            if event == "started":
+                job._start()
+            elif event == "progress":
+                done, total, info = payload
+                if done is not None:
+                    info = dict(info, pages_done=done)
+                if total:
+                    info["pages_total"] = total
+                job.update(fraction=done / total if done is not None and total else None, **info)
+
+    def _process_done(self, job, future, on_done=None):
+        self._futures.pop(job.id, None)
+        self._cancelled.pop(job.id, None)
+        try:
+            result = future.result()
+            if on_done is not None:
+                result = on_done(job, result)
+        except (CancelledError, JobCancelled):
+            job._finish(CANCELLED)
+            return
+        except Exception as e:
+            logger.error(f"{job.kind} job {job.id} failed: {e}")
+            job._finish(FAILED, error=str(e), invalid_input=isinstance(e, InvalidInput))
+            return
+        finally:
+            self._release_workdir(job)  # on_done has moved out what it keeps
+        result = dict(result or {})
+        job.output_path = result.pop("path", None)
+        job._finish(DONE, result=result)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job in [j for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job.id]
+            self._futures.pop(job.id, None)
+            self._release_workdir(job)
+
+    def _release_workdir(self, job):
+        workdir, job.workdir = job.workdir, None
+        if workdir:
+            try:
+                self.release_workdir(workdir)
+            except Exception:
+                logger.exception(f"Could not release workdir of {job.kind} job {job.id}")
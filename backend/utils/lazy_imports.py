@@ -0,0 +1,101 @@
+import importlib
+import sys
+import threading
+import time
+
+# module name -> seconds spent on its first import in this process
+_load_times = {}
+
+
+def _import(name):
+    module = sys.modules.get(name)
+    # A module another thread is still importing is already in sys.modules,
+    # half-initialized; import_module waits on importlib's per-module lock for it
+    if module is not None and not getattr(getattr(module, "__spec__", None), "_initializing", False):
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    _load_times.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+class LazyModule:
+    """
+    Stand-in for ``import name``: the real module is imported the first
+    time one of its attributes is used.
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr):
+        return getattr(_import(self._name), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._name in sys.modules else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+class LazyAttr:
+    """
+    Stand-in for ``from module import attr`` (usually a function or class).
+    Calling it or reading one of its attributes imports ``module``.
+    """
+
+    def __init__(self, module, attr):
+        object.__setattr__(self, "_module", module)
+        object.__setattr__(self, "_attr", attr)
+
+    def _resolve(self):
+        return getattr(_import(self._module), self._attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __repr__(self):
+        return f"<lazy {self._module}.{self._attr}>"
+
+
+class LazyObject:
+    """
+    Module-level object (model, registry, client...) built by ``factory``
+    on first attribute access, exactly once even under concurrent requests.
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _resolve(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    object.__setattr__(self, "_instance", self._factory())
+        return self._instance
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+
+def lazy_module(name):
+    return LazyModule(name)
+
+
+def lazy_import(module, attr):
+    return LazyAttr(module, attr)
+
+
+def lazy_object(factory):
+    return LazyObject(factory)
+
+
+def loaded_modules():
+    """Lazily imported modules loaded so far, with their import time in ms."""
+    return {name: round(seconds * 1000, 1) for name, seconds in _load_times.items()}
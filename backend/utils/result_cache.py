@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "result_cache")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+
+def make_key(input_hash, operation, version, params):
+    """Cache key of one tool run: input content, operation, tool version and normalized parameters."""
+    payload = json.dumps([input_hash, operation, version, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedResult:
+    __slots__ = ("path", "file_id", "filename", "mimetype", "size")
+
+    def __init__(self, path, file_id, filename, mimetype, size):
+        self.path = path
+        self.file_id = file_id
+        self.filename = filename
+        self.mimetype = mimetype
+        self.size = size
+
+
+class ResultCache:
+    """
+    On-disk cache of pdf_tools outputs, keyed by ``make_key``. Outputs are
+    kept under ``root/entries`` (hard-linked from where they were produced
+    when the filesystem allows, so a cached result usually costs no extra
+    space while that copy exists) and the least recently used ones are
+    evicted once their total size exceeds ``max_bytes``.
+
+    Hit, miss and bypass counters, and the output bytes served from the
+    cache instead of being recomputed, are kept per process.
+    """
+
+    def __init__(self, root=RESULT_CACHE_PATH, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries = os.path.join(root, "entries")
+        os.makedirs(self._entries, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "results.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, file_id TEXT, filename TEXT,"
+            " mimetype TEXT, size INTEGER, last_used_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_lru ON results (last_used_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        self._stats = {"hits": 0, "misses": 0, "bypasses": 0, "stores": 0, "evictions": 0, "bytes_saved": 0}
+
+    def _path(self, key):
+        return os.path.join(self._entries, key)
+
+    def get(self, key):
+        """The cached output for ``key``, or None (counted as a miss)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_id, filename, mimetype, size FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or not os.path.exists(self._path(key)):
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE results SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self._stats["hits"] += 1
+            self._stats["bytes_saved"] += row[3]
+        return CachedResult(self._path(key), *row)
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats["bypasses"] += 1
+
+    def put(self, key, path, file_id, filename, mimetype):
+        """Cache the output file at ``path`` (its content hash ``file_id``) under ``key``."""
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return
+        entry_path = self._path(key)
+        tmp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                os.link(path, tmp_path)
+            except OSError:
+                shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, entry_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (key, file_id, filename, mimetype, size, time.time()),
+            )
+            self._bytes += size - (previous[0] if previous else 0)
+            self._stats["stores"] += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            row = self._conn.execute("SELECT key, size FROM results ORDER BY last_used_at LIMIT 1").fetchone()
+            if row is None:
+                break
+            key, size = row
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self._bytes -= size
+            self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            stats["bytes"] = self._bytes
+        stats["max_bytes"] = self.max_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,237 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "4096")) * 1024 * 1024
+# Unfinished uploads nobody resumed for this long are deleted
+UPLOAD_EXPIRY_SECONDS = float(os.getenv("UPLOAD_EXPIRY_HOURS", "24")) * 3600
+WRITE_SIZE = 1024 * 1024
+CHECKSUM_ALGORITHMS = ("sha256", "sha1", "md5")
+
+
+class UploadError(Exception):
+    """An upload request that can't be applied; ``status`` is the HTTP status to answer with."""
+
+    status = 400
+
+
+class OffsetMismatch(UploadError):
+    status = 409
+
+
+class ChecksumMismatch(UploadError):
+    status = 460  # tus checksum extension
+
+
+class UploadTooLarge(UploadError):
+    status = 413
+
+
+def parse_metadata(header):
+    """tus ``Upload-Metadata``: comma-separated ``key base64(value)`` pairs."""
+    metadata = {}
+    for pair in (header or "").split(","):
+        parts = pair.strip().split(" ", 1)
+        if not parts[0]:
+            continue
+        try:
+            metadata[parts[0]] = base64.b64decode(parts[1]).decode("utf-8") if len(parts) == 2 else ""
+        except (ValueError, UnicodeDecodeError):
+            raise UploadError(f"Invalid Upload-Metadata value for {parts[0]}")
+    return metadata
+
+
+def parse_checksum(header):
+    """tus ``Upload-Checksum: <algorithm> <base64 digest>`` → ``(algorithm, digest bytes)``."""
+    try:
+        algorithm, digest = header.strip().split(" ", 1)
+        digest = base64.b64decode(digest)
+    except ValueError:
+        raise UploadError("Invalid Upload-Checksum")
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(f"Unsupported checksum algorithm: {algorithm}")
+    return algorithm, digest
+
+
+class Upload:
+    """State of one upload, persisted as ``info.json`` next to its ``data`` file."""
+
+    def __init__(self, upload_id, directory, length, metadata, created_at, file_id=None):
+        self.id = upload_id
+        self.directory = directory
+        self.length = length
+        self.metadata = metadata
+        self.created_at = created_at
+        self.file_id = file_id  # set once complete and handed to the file store
+
+    @property
+    def data_path(self):
+        return os.path.join(self.directory, "data")
+
+    @property
+    def offset(self):
+        if self.file_id is not None:
+            return self.length
+        try:
+            return os.path.getsize(self.data_path)
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def expires_at(self):
+        return self.created_at + UPLOAD_EXPIRY_SECONDS
+
+    def save(self):
+        tmp_path = os.path.join(self.directory, "info.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"length": self.length, "metadata": self.metadata,
+                       "created_at": self.created_at, "file_id": self.file_id}, f)
+        os.replace(tmp_path, os.path.join(self.directory, "info.json"))
+
+
+class UploadManager:
+    """
+    Resumable uploads in the style of the tus protocol (creation, checksum,
+    termination and expiration extensions). Every ``PATCH`` appends the
+    request body at the upload's current offset, streaming it to disk in
+    ``WRITE_SIZE`` pieces, so memory use doesn't grow with the file. The
+    offset is the size of the spooled data, so a client that lost its
+    connection asks for it and carries on from there.
+
+    A running SHA-256 of the data is kept per upload, so the finished file's
+    content hash (its file store id) costs no extra pass over the data. It
+    is kept in memory; after a restart, or in another worker process, it is
+    rebuilt from the data on disk.
+    """
+
+    def __init__(self, root, max_bytes=MAX_UPLOAD_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._hashes = {}  # upload id -> (offset, running sha256)
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def create(self, length, metadata=None):
+        if length < 0:
+            raise UploadError("Invalid Upload-Length")
+        if length > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_bytes} byte limit")
+        self._maybe_prune()
+        upload_id = uuid.uuid4().hex
+        directory = os.path.join(self.root, upload_id)
+        os.makedirs(directory)
+        upload = Upload(upload_id, directory, length, metadata or {}, time.time())
+        open(upload.data_path, "wb").close()
+        upload.save()
+        return upload
+
+    def get(self, upload_id):
+        if not upload_id.isalnum():
+            return None
+        directory = os.path.join(self.root, upload_id)
+        try:
+            with open(os.path.join(directory, "info.json")) as f:
+                info = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        upload = Upload(upload_id, directory, info["length"], info["metadata"], info["created_at"], info["file_id"])
+        if time.time() > upload.expires_at:
+            self.delete(upload_id)
+            return None
+        return upload
+
+    def _upload_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _running_hash(self, upload, offset):
+        state = self._hashes.get(upload.id)
+        if state is not None and state[0] == offset:
+            return state[1]
+        digest = hashlib.sha256()
+        with open(upload.data_path, "rb") as f:
+            for block in iter(lambda: f.read(WRITE_SIZE), b""):
+                digest.update(block)
+        return digest
+
+    def append(self, upload, stream, offset, checksum=None):
+        """
+        Write ``stream`` at ``offset``, which must be the upload's current
+        offset. With ``checksum`` (``(algorithm, digest)`` of this chunk)
+        a mismatching or cut-off chunk is discarded; without one, whatever
+        arrived before a dropped connection is kept. Returns the new offset.
+        """
+        with self._upload_lock(upload.id):
+            current = upload.offset
+            if upload.file_id is not None or offset != current:
+                raise OffsetMismatch(f"Upload-Offset is {current}")
+            running = self._running_hash(upload, current)
+            before = running.copy()
+            chunk_digest = hashlib.new(checksum[0]) if checksum else None
+            remaining = upload.length - current
+            written = 0
+            try:
+                with open(upload.data_path, "ab") as f:
+                    for block in iter(lambda: stream.read(WRITE_SIZE), b""):
+                        if written + len(block) > remaining:
+                            raise UploadTooLarge("Chunk runs past Upload-Length")
+                        f.write(block)
+                        running.update(block)
+                        if chunk_digest is not None:
+                            chunk_digest.update(block)
+                        written += len(block)
+                if chunk_digest is not None and chunk_digest.digest() != checksum[1]:
+                    raise ChecksumMismatch("Checksum mismatch")
+            except Exception as e:
+                if chunk_digest is not None or isinstance(e, UploadTooLarge):
+                    self._truncate(upload, current)
+                    running, written = before, 0
+                # A failed disk write leaves the size off; the hash is then rebuilt from disk
+                self._hashes[upload.id] = (current + written, running)
+                raise
+            self._hashes[upload.id] = (current + written, running)
+            return current + written
+
+    def _truncate(self, upload, size):
+        with open(upload.data_path, "r+b") as f:
+            f.truncate(size)
+
+    def digest(self, upload):
+        """SHA-256 hex digest of a complete upload's data."""
+        return self._running_hash(upload, upload.offset).hexdigest()
+
+    def complete(self, upload, file_id):
+        """Record that the data was handed over (as ``file_id``); the upload stays queryable until it expires."""
+        upload.file_id = file_id
+        upload.save()
+        self._hashes.pop(upload.id, None)
+        if os.path.exists(upload.data_path):
+            os.remove(upload.data_path)
+
+    def delete(self, upload_id):
+        directory = os.path.join(self.root, upload_id)
+        if not os.path.isdir(directory):
+            return False
+        shutil.rmtree(directory, ignore_errors=True)
+        self._hashes.pop(upload_id, None)
+        with self._lock:
+            self._locks.pop(upload_id, None)
+        return True
+
+    def _maybe_prune(self):
+        now = time.time()
+        if now - self._last_prune < 300:
+            return
+        self._last_prune = now
+        for upload_id in os.listdir(self.root):
+            self.get(upload_id)  # deletes it when expired
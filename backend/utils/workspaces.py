@@ -0,0 +1,191 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# WORKSPACE_TMPFS=1 puts scratch files in RAM (/dev/shm) where available
+WORKSPACE_TMPFS = os.getenv("WORKSPACE_TMPFS") == "1"
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT") or os.path.join(
+    "/dev/shm" if WORKSPACE_TMPFS and os.path.isdir("/dev/shm") else tempfile.gettempdir(), "pdf_workspaces"
+)
+WORKSPACE_QUOTA_BYTES = int(os.getenv("WORKSPACE_QUOTA_MB", "10240")) * 1024 * 1024
+# A workspace nobody released (a crashed request, an abandoned job) is reclaimed after this
+WORKSPACE_TTL_SECONDS = float(os.getenv("WORKSPACE_TTL_MINUTES", "60")) * 60
+JANITOR_INTERVAL_SECONDS = 30
+
+
+class QuotaExceeded(Exception):
+    """All workspaces together use more than the disk quota."""
+
+
+class Workspace:
+    """One private scratch directory; ``path`` is created empty and owned by a single request or job."""
+
+    def __init__(self, path, expires_at, size_hint=0):
+        self.path = path
+        self.created_at = time.time()
+        self.expires_at = expires_at
+        self.size_hint = size_hint  # bytes its owner expects to write
+        self.counted = size_hint  # its share of the manager's usage
+
+    def file(self, name):
+        """Path for ``name`` (a bare file name) inside the workspace."""
+        return os.path.join(self.path, os.path.basename(name))
+
+    def subdir(self, name):
+        path = os.path.join(self.path, os.path.basename(name))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+
+class WorkspaceManager:
+    """
+    Hands out isolated scratch directories under one root, so concurrent
+    requests never share a file name, and keeps their total size under
+    ``quota_bytes``.
+
+    Owners ``release`` their workspace when done. One janitor thread sweeps
+    the root every ``JANITOR_INTERVAL_SECONDS``: it measures the disk usage
+    that the quota check reads, and deletes every workspace past its TTL in
+    one pass, including ones a previous process left behind. The expiry is
+    part of each directory's name, so every worker process judges every
+    workspace by its own TTL. Each workspace counts at least the bytes its
+    owner expects to write (``size_hint``) against the quota.
+    """
+
+    def __init__(self, root=WORKSPACE_ROOT, quota_bytes=WORKSPACE_QUOTA_BYTES, ttl=WORKSPACE_TTL_SECONDS):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+        self._workspaces = {}  # path -> Workspace
+        self._usage = 0
+        self._stats = {"created": 0, "released": 0, "reclaimed": 0, "quota_rejections": 0}
+        self._lock = threading.Lock()
+        self._janitor = None
+
+    def check_quota(self, size=0):
+        """Raise ``QuotaExceeded`` if ``size`` more bytes don't fit in the quota, even after a sweep."""
+        self._ensure_janitor()
+        if self._usage + size >= self.quota_bytes:
+            self.sweep()
+            if self._usage + size >= self.quota_bytes:
+                with self._lock:
+                    self._stats["quota_rejections"] += 1
+                raise QuotaExceeded(f"Workspace quota of {self.quota_bytes} bytes is used up")
+
+    def create(self, prefix="ws", ttl=None, size_hint=0):
+        """
+        A fresh workspace for about ``size_hint`` bytes; raises
+        ``QuotaExceeded`` if they don't fit in the quota even after a sweep.
+        """
+        self.check_quota(size_hint)
+        expires_at = int(time.time() + (self.ttl if ttl is None else ttl))
+        path = os.path.join(self.root, f"{prefix}_{expires_at}_{uuid.uuid4().hex}")
+        os.makedirs(path)
+        workspace = Workspace(path, expires_at, size_hint)
+        with self._lock:
+            self._workspaces[path] = workspace
+            self._usage += size_hint
+            self._stats["created"] += 1
+        return workspace
+
+    def release(self, workspace):
+        """Delete a workspace (or its path) now."""
+        path = workspace.path if isinstance(workspace, Workspace) else workspace
+        with self._lock:
+            known = self._workspaces.pop(path, None)
+            if known is not None:
+                self._usage = max(0, self._usage - known.counted)
+                self._stats["released"] += 1
+        shutil.rmtree(path, ignore_errors=True)
+
+    def sweep(self):
+        """Reclaim expired workspaces and re-measure disk usage; returns the number reclaimed."""
+        now = time.time()
+        usage = 0
+        expired = []
+        with self._lock:
+            tracked = dict(self._workspaces)
+        for entry in os.scandir(self.root):
+            workspace = tracked.get(entry.path)
+            if workspace is not None:
+                expires_at = workspace.expires_at
+            else:
+                # Not ours (another worker's or a previous run's): the expiry is in its name
+                expires_at = _expiry_from_name(entry.name)
+                if expires_at is None:
+                    try:
+                        expires_at = entry.stat().st_mtime + self.ttl
+                    except FileNotFoundError:
+                        continue
+            if expires_at < now:
+                expired.append(entry.path)
+            else:
+                size = _tree_size(entry.path)
+                if workspace is not None:
+                    # Its owner may not have written what it reserved yet
+                    size = workspace.counted = max(size, workspace.size_hint)
+                usage += size
+        for path in expired:
+            shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            for path in expired:
+                self._workspaces.pop(path, None)
+            # Workspaces created or released while we measured aren't in ``usage`` yet
+            usage += sum(w.counted for path, w in self._workspaces.items() if path not in tracked)
+            usage -= sum(w.counted for path, w in tracked.items()
+                         if path not in self._workspaces and path not in expired)
+            self._stats["reclaimed"] += len(expired)
+            self._usage = max(0, usage)
+        if expired:
+            logger.info(f"Workspace janitor reclaimed {len(expired)} expired workspaces")
+        return len(expired)
+
+    def _ensure_janitor(self):
+        if self._janitor is not None:
+            return
+        with self._lock:
+            if self._janitor is None:
+                self._janitor = threading.Thread(target=self._run_janitor, name="workspace-janitor", daemon=True)
+                self._janitor.start()
+
+    def _run_janitor(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Workspace sweep failed")
+            time.sleep(JANITOR_INTERVAL_SECONDS)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active"] = len(self._workspaces)
+            stats["bytes"] = self._usage
+        stats.update(root=self.root, quota_bytes=self.quota_bytes, ttl_seconds=self.ttl)
+        return stats
+
+
+def _expiry_from_name(name):
+    """The expiry ``create`` put in a workspace's name (``<prefix>_<expires_at>_<id>``), or None."""
+    parts = name.rsplit("_", 2)
+    if len(parts) == 3 and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+def _tree_size(path):
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
@@ -0,0 +1,85 @@
+import os
+import zipfile
+
+READ_SIZE = 1024 * 1024
+
+
+class _Sink:
+    """Write-only, non-seekable file object collecting what zipfile writes until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """
+    A ZIP archive produced piece by piece for a streamed response: each
+    ``add_*`` yields the archive bytes for that member as they are written,
+    and ``close`` returns the central directory that ends the archive.
+
+    The sink isn't seekable, so zipfile writes sizes and CRCs in data
+    descriptors after each member instead of going back to patch headers;
+    at most ``READ_SIZE`` of a member is held in memory at a time.
+    Members are stored uncompressed by default, since tool outputs (PDF,
+    JPEG, Office files) are compressed already.
+    """
+
+    def __init__(self, compression=zipfile.ZIP_STORED):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=compression, allowZip64=True)
+        self._names = set()
+
+    def unique_name(self, name):
+        """``name``, or ``name (2)``, ``name (3)``... if the archive already has it."""
+        stem, ext = os.path.splitext(name)
+        candidate, n = name, 1
+        while candidate in self._names:
+            n += 1
+            candidate = f"{stem} ({n}){ext}"
+        self._names.add(candidate)
+        return candidate
+
+    def add_file(self, path, arcname):
+        """
+        Yields ``path``'s member. A missing or unreadable file raises before
+        any of its bytes are written, so the caller can skip it and go on.
+        """
+        with open(path, "rb") as src:
+            info = zipfile.ZipInfo.from_file(path, arcname)  # its size tells zipfile whether ZIP64 is needed
+            info.compress_type = self._zip.compression
+            with self._zip.open(info, "w") as dst:
+                for block in iter(lambda: src.read(READ_SIZE), b""):
+                    dst.write(block)
+                    yield from self._pending()
+        yield from self._pending()
+
+    def add_bytes(self, arcname, data):
+        self._zip.writestr(arcname, data)
+        yield from self._pending()
+
+    def _pending(self):
+        # Never an empty chunk: to some servers that ends a chunked response
+        data = self._sink.drain()
+        if data:
+            yield data
+
+    def close(self):
+        self._zip.close()
+        return self._sink.drain()